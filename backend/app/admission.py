@@ -0,0 +1,208 @@
+import os
+import math
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+# Requests doing blocking work at once, across all lanes
+WORKER_SLOTS = int(os.environ.get("WORKER_SLOTS", "8"))
+
+class OverloadedError(Exception):
+    """Raised when a request can't be admitted; carries the HTTP status and Retry-After"""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+class Lane:
+    """Admission settings and live state for one class of requests"""
+
+    def __init__(
+        self,
+        name: str,
+        priority: int,
+        max_active: int,
+        max_queue: int,
+        queue_timeout: float,
+        reserved: int = 0
+    ):
+        self.name = name
+        self.priority = priority  # higher is served first
+        self.reserved = reserved  # slots this lane gets ahead of priority, so it never starves
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiters: deque = deque()
+        self.avg_service_time = 1.0  # seconds, moving average
+
+    @classmethod
+    def from_env(
+        cls,
+        name: str,
+        priority: int,
+        max_active: int,
+        max_queue: int,
+        queue_timeout: float,
+        reserved: int = 0
+    ) -> "Lane":
+        prefix = name.upper()
+        return cls(
+            name,
+            priority,
+            int(os.environ.get(f"{prefix}_MAX_CONCURRENCY", str(max_active))),
+            int(os.environ.get(f"{prefix}_MAX_QUEUE", str(max_queue))),
+            float(os.environ.get(f"{prefix}_QUEUE_TIMEOUT_SECONDS", str(queue_timeout))),
+            int(os.environ.get(f"{prefix}_RESERVED_CONCURRENCY", str(reserved)))
+        )
+
+    def rank(self):
+        """Order in which lanes get free slots: under-reservation first, then priority"""
+        return (self.active < self.reserved, self.priority)
+
+class AdmissionController:
+    """Per-lane concurrency limits and bounded wait queues over shared worker slots.
+
+    A request is admitted when its lane is under its own limit and a shared
+    slot is free. Otherwise it waits in its lane's queue until its deadline.
+    A full queue is rejected at once with 429; a wait that times out gets
+    503. Freed slots go to the waiting lane with the highest priority, and
+    lower-priority lanes get lower limits, so ingestion can't crowd out
+    chat; a lane's reserved slots keep it from starving under sustained
+    load. Retry-After is estimated from the lane's recent service times.
+    """
+
+    def __init__(self, lanes: Dict[str, Lane], slots: int = WORKER_SLOTS):
+        self.lanes = lanes
+        self.slots = slots
+        self.active = 0
+
+    def _can_start(self, lane: Lane) -> bool:
+        return lane.active < lane.max_active and self.active < self.slots
+
+    def _outranked(self, lane: Lane) -> bool:
+        """Whether a waiter in another lane should take the next slot first"""
+        return any(
+            other.waiters and other.rank() > lane.rank() and self._can_start(other)
+            for other in self.lanes.values()
+        )
+
+    def _retry_after(self, lane: Lane) -> int:
+        backlog = len(lane.waiters) + lane.active
+        return max(1, math.ceil(lane.avg_service_time * backlog / max(1, lane.max_active)))
+
+    def _start(self, lane: Lane):
+        lane.active += 1
+        self.active += 1
+
+    def _wake_next(self):
+        """Hand free slots to waiters, best-ranked lane first"""
+        while True:
+            ready = [lane for lane in self.lanes.values() if lane.waiters and self._can_start(lane)]
+            if not ready:
+                return
+            lane = max(ready, key=lambda l: l.rank())
+            future = lane.waiters.popleft()
+            if not future.done():
+                self._start(lane)
+                future.set_result(None)
+
+    async def acquire(self, lane_name: str) -> float:
+        """Wait for a slot in a lane; returns the admission time"""
+        lane = self.lanes[lane_name]
+        if not lane.waiters and self._can_start(lane) and not self._outranked(lane):
+            self._start(lane)
+            return time.monotonic()
+
+        if len(lane.waiters) >= lane.max_queue:
+            raise OverloadedError(429, f"Too many {lane.name} requests queued, retry later", self._retry_after(lane))
+
+        future = asyncio.get_running_loop().create_future()
+        lane.waiters.append(future)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), lane.queue_timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                return time.monotonic()  # admitted just as the deadline passed
+            future.cancel()
+            self._discard(lane, future)
+            raise OverloadedError(503, f"Server busy: {lane.name} request waited too long", self._retry_after(lane))
+        except asyncio.CancelledError:
+            # Client went away while queued; give the slot back if it was granted
+            if future.done() and not future.cancelled():
+                self.release(lane_name, None)
+            else:
+                future.cancel()
+                self._discard(lane, future)
+            raise
+        return time.monotonic()
+
+    def _discard(self, lane: Lane, future):
+        try:
+            lane.waiters.remove(future)
+        except ValueError:
+            pass
+
+    def release(self, lane_name: str, admitted_at: Optional[float]):
+        lane = self.lanes[lane_name]
+        lane.active -= 1
+        self.active -= 1
+        if admitted_at is not None:
+            lane.avg_service_time = 0.8 * lane.avg_service_time + 0.2 * (time.monotonic() - admitted_at)
+        self._wake_next()
+
+    def status(self) -> Dict[str, Dict[str, float]]:
+        return {
+            name: {
+                "active": lane.active,
+                "queued": len(lane.waiters),
+                "max_active": lane.max_active,
+                "reserved": lane.reserved,
+                "max_queue": lane.max_queue,
+                "avg_service_seconds": round(lane.avg_service_time, 3)
+            }
+            for name, lane in self.lanes.items()
+        }
+
+class AdmissionMiddleware:
+    """ASGI middleware that admits requests to the routes mapped to a lane.
+
+    Runs before the request body is read, so an overloaded upload is
+    refused without first receiving the whole file.
+    """
+
+    def __init__(self, app, controller: AdmissionController, routes: Dict[Tuple[str, str], str]):
+        self.app = app
+        self.controller = controller
+        self.routes = routes  # (method, path) -> lane name
+
+    async def __call__(self, scope, receive, send):
+        lane = self.routes.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if lane is None:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            admitted_at = await self.controller.acquire(lane)
+        except OverloadedError as e:
+            logger.warning(f"Rejected {scope['method']} {scope['path']} with {e.status_code}: {e.detail}")
+            response = JSONResponse(
+                {"detail": e.detail},
+                status_code=e.status_code,
+                headers={"Retry-After": str(e.retry_after)}
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(lane, admitted_at)
@@ -3,6 +3,8 @@ from typing import List, Dict, Any
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
 from .embeddings_postgres import EmbeddingManager
+from .collection_names import DEFAULT_COLLECTION
+from .single_flight import SingleFlight, normalize_question
 
 class ChatManager:
     def __init__(self, embedding_manager: EmbeddingManager):
@@ -16,25 +18,45 @@ class ChatManager:
         # Use configurable model with sensible default
         self.model_name = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
         
+        # Optional OpenAI-compatible endpoint, e.g. the local fake server for load tests
+        self.openai_base_url = os.environ.get("OPENAI_BASE_URL") or None
+        
         try:
             self.llm = ChatOpenAI(
                 api_key=self.openai_api_key,
+                base_url=self.openai_base_url,
                 model=self.model_name,
                 temperature=0.7
             )
         except Exception as e:
             raise ValueError(f"Failed to initialize OpenAI model '{self.model_name}': {str(e)}")
+        
+        # Concurrent identical questions against the same document set
+        # share one retrieval and one LLM call
+        self.answer_flight = SingleFlight("chat answer")
     
-    def get_response(self, user_message: str) -> str:
-        """Generate response using RAG approach"""
+    def get_response(self, user_message: str, collection: str = DEFAULT_COLLECTION) -> str:
+        """Generate response using RAG approach, coalescing identical in-flight questions"""
+        # Input validation
+        if not user_message or not user_message.strip():
+            return "Please provide a valid question or message."
+        
+        # The document-set version is part of the key, so a question asked
+        # after an upload or delete never gets an answer from before it
+        try:
+            version = self.embedding_manager.get_collection_version(collection)
+        except Exception as e:
+            return f"Error retrieving relevant documents: {str(e)}"
+        
+        key = (collection, version, normalize_question(user_message))
+        return self.answer_flight.do(key, lambda: self._generate_response(user_message, collection))
+    
+    def _generate_response(self, user_message: str, collection: str) -> str:
+        """Retrieve context and ask the model"""
         try:
-            # Input validation
-            if not user_message or not user_message.strip():
-                return "Please provide a valid question or message."
-            
             # Retrieve relevant document chunks
             try:
-                relevant_chunks = self.embedding_manager.similarity_search(user_message, k=5)
+                relevant_chunks = self.embedding_manager.similarity_search(user_message, k=5, collection=collection)
             except Exception as e:
                 return f"Error retrieving relevant documents: {str(e)}"
             
@@ -54,7 +76,7 @@ class ChatManager:
             
             Instructions:
             - Answer based only on the provided context
-            - Be specific and cite information from the documents when possible
+            - Be specific and cite the document and page when possible
             - If the context doesn't contain enough information, say so
             - Keep your response clear and helpful"""
             
@@ -95,7 +117,17 @@ class ChatManager:
             similarity = chunk.get("similarity", 0)
             content = chunk.get("content", "")
             
-            context_part = f"""Document: {filename}
+            # Page span comes from chunk metadata, not markers in the text
+            metadata = chunk.get("metadata", {})
+            start_page, end_page = metadata.get("start_page"), metadata.get("end_page")
+            if start_page is None:
+                source = filename
+            elif start_page == end_page:
+                source = f"{filename}, page {start_page}"
+            else:
+                source = f"{filename}, pages {start_page}-{end_page}"
+            
+            context_part = f"""Document: {source}
 Relevance: {similarity:.3f}
 Content: {content}
 ---"""
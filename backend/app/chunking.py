@@ -0,0 +1,154 @@
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from .tokens import EMBEDDING_MODEL, estimate_tokens, get_encoding
+
+# Chunk size and overlap, in tokens of the embedding model's tokenizer
+CHUNK_SIZE_TOKENS = int(os.environ.get("CHUNK_SIZE_TOKENS", "300"))
+CHUNK_OVERLAP_TOKENS = int(os.environ.get("CHUNK_OVERLAP_TOKENS", "50"))
+
+# A chunk may end early, at a paragraph, line or sentence break, as long as
+# it keeps at least this share of the token budget
+MIN_BREAK_FILL = 0.75
+
+_WORD_PIECE = re.compile(r"\s*\S+")
+_SENTENCE_END = (".", "!", "?", ";", ":")
+
+class PageSpanChunker:
+    """Split a stream of pages into token-sized chunks that record page spans.
+
+    Every page is tokenized with the embedding model's tokenizer, keeping
+    each token's character offset. Chunks are windows over the combined
+    token stream that may cross page boundaries. A chunk's content is its
+    page text joined with blank lines; there are no inline page markers.
+    Its metadata records start_page/start_offset and end_page/end_offset:
+    1-based page numbers and character offsets into those pages' text.
+    """
+
+    def __init__(
+        self,
+        chunk_tokens: int = CHUNK_SIZE_TOKENS,
+        overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+        model: str = EMBEDDING_MODEL
+    ):
+        if overlap_tokens >= chunk_tokens:
+            raise ValueError("Chunk overlap must be smaller than the chunk size")
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        self.encoding = get_encoding(model)
+
+    def _pieces(self, text: str) -> List[Tuple[int, int]]:
+        """(character offset, token count) of each token in a page's text"""
+        if self.encoding is not None:
+            tokens = self.encoding.encode_ordinary(text)
+            decoded, offsets = self.encoding.decode_with_offsets(tokens)
+            if decoded == text:
+                return [(offset, 1) for offset in offsets]
+
+        # No tokenizer (or text that doesn't round-trip): whitespace-led
+        # words, counted with the same estimate the embedding batcher uses,
+        # so a chunk never exceeds the budget the batcher assumes for it
+        return [
+            (match.start(), estimate_tokens(match.group()))
+            for match in _WORD_PIECE.finditer(text)
+        ]
+
+    def _break_rank(self, pages: List[Tuple[int, str]], stream: List[Tuple[int, int, int]], index: int) -> int:
+        """How good a place it is to end a chunk before stream[index]"""
+        page, offset, _ = stream[index]
+        prev_page, prev_offset, _ = stream[index - 1]
+        if page != prev_page:
+            return 3
+        preceding = pages[page][1][prev_offset:offset]
+        if "\n\n" in preceding:
+            return 3
+        if "\n" in preceding:
+            return 2
+        if preceding.rstrip().endswith(_SENTENCE_END):
+            return 1
+        return 0
+
+    def _choose_end(self, pages: List[Tuple[int, str]], stream: List[Tuple[int, int, int]], start: int, end: int) -> int:
+        """Move a chunk's end back to the best natural break, if one is close"""
+        earliest = start + max(1, int((end - start) * MIN_BREAK_FILL))
+        best, best_rank = end, 0
+        for index in range(end - 1, earliest - 1, -1):
+            rank = self._break_rank(pages, stream, index)
+            if rank > best_rank:
+                best, best_rank = index, rank
+                if rank == 3:
+                    break
+        return best
+
+    def _span(
+        self,
+        pages: List[Tuple[int, str]],
+        stream: List[Tuple[int, int, int]],
+        start: int,
+        end: int
+    ) -> Optional[Dict[str, Any]]:
+        """Text and page span covered by stream[start:end], trimmed of whitespace"""
+        slices = []
+        for index in range(start, end):
+            page, offset, _ = stream[index]
+            if not slices or slices[-1][0] != page:
+                slices.append([page, offset, offset])
+            # A token runs up to the next token on its page, or the page end
+            if index + 1 < len(stream) and stream[index + 1][0] == page:
+                slices[-1][2] = stream[index + 1][1]
+            else:
+                slices[-1][2] = len(pages[page][1])
+
+        # Trim leading and trailing whitespace so the offsets match the content
+        first_text = pages[slices[0][0]][1][slices[0][1]:slices[0][2]]
+        slices[0][1] += len(first_text) - len(first_text.lstrip())
+        last_text = pages[slices[-1][0]][1][slices[-1][1]:slices[-1][2]]
+        slices[-1][2] -= len(last_text) - len(last_text.rstrip())
+        slices = [s for s in slices if s[2] > s[1]]
+        if not slices:
+            return None
+
+        return {
+            "content": "\n\n".join(pages[page][1][begin:finish].strip() for page, begin, finish in slices),
+            "start_page": pages[slices[0][0]][0],
+            "start_offset": slices[0][1],
+            "end_page": pages[slices[-1][0]][0],
+            "end_offset": slices[-1][2],
+            "token_count": sum(stream[index][2] for index in range(start, end))
+        }
+
+    def split_pages(self, pages: List[Tuple[int, str]]) -> List[Dict[str, Any]]:
+        """Chunk (page_number, text) pairs into dicts with content and page span"""
+        # One entry per token: (index into pages, character offset, token count)
+        stream = [
+            (page_index, offset, count)
+            for page_index, (_, text) in enumerate(pages)
+            for offset, count in self._pieces(text)
+        ]
+
+        chunks = []
+        start = 0
+        while start < len(stream):
+            # Fill the token budget, then back off to a natural break
+            end, tokens = start, 0
+            while end < len(stream) and (end == start or tokens + stream[end][2] <= self.chunk_tokens):
+                tokens += stream[end][2]
+                end += 1
+            if end < len(stream):
+                end = self._choose_end(pages, stream, start, end)
+
+            span = self._span(pages, stream, start, end)
+            if span:
+                chunks.append(span)
+            if end >= len(stream):
+                break
+
+            # Step back by up to the overlap budget for the next chunk's start
+            next_start, overlap = end, 0
+            while next_start - 1 > start and overlap + stream[next_start - 1][2] <= self.overlap_tokens:
+                next_start -= 1
+                overlap += stream[next_start][2]
+            start = next_start
+
+        return chunks
@@ -0,0 +1,19 @@
+import re
+
+# Collection used when a request does not name one
+DEFAULT_COLLECTION = "default"
+
+# Names end up in partition table names, so keep them to safe identifiers
+COLLECTION_NAME_PATTERN = re.compile(r"^[a-z0-9_]{1,48}$")
+
+def validate_collection_name(name: str) -> str:
+    """Return the collection name, raising ValueError if it is not allowed"""
+    if not name or not COLLECTION_NAME_PATTERN.match(name):
+        raise ValueError(
+            f"Invalid collection name '{name}': use 1-48 lowercase letters, digits or underscores"
+        )
+    return name
+
+def partition_name(name: str) -> str:
+    """Name of the Postgres partition holding a collection's chunks"""
+    return f"documents_c_{validate_collection_name(name)}"
@@ -0,0 +1,55 @@
+import os
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Seconds between compaction passes when nothing triggers one earlier
+COMPACTION_INTERVAL = float(os.environ.get("COMPACTION_INTERVAL_SECONDS", "300"))
+
+class BackgroundCompactor:
+    """Runs EmbeddingManager.compact() on a daemon thread.
+
+    Deletes only tombstone documents, so the request returns immediately;
+    this thread purges the rows afterwards. trigger() wakes it early, e.g.
+    right after a delete or an upload, instead of waiting for the next
+    interval.
+    """
+
+    def __init__(self, embedding_manager, interval: float = COMPACTION_INTERVAL):
+        self.embedding_manager = embedding_manager
+        self.interval = interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the compaction thread if it is not already running"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="compactor", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Ask the thread to exit and wait for the current pass to finish"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def trigger(self):
+        """Request a compaction pass as soon as possible"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.embedding_manager.compact()
+            except Exception as e:
+                logger.error(f"Background compaction failed: {str(e)}")
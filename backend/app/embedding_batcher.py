@@ -0,0 +1,295 @@
+import os
+import re
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Optional, Tuple
+
+import openai
+
+from .tokens import estimate_tokens, get_encoding
+
+logger = logging.getLogger(__name__)
+
+# Provider limits per embeddings request (OpenAI: 2048 inputs, 300k tokens);
+# the token budget leaves headroom for tokenizer differences
+MAX_BATCH_INPUTS = int(os.environ.get("EMBEDDING_MAX_BATCH_INPUTS", "2048"))
+MAX_BATCH_TOKENS = int(os.environ.get("EMBEDDING_MAX_BATCH_TOKENS", "250000"))
+if "EMBEDDING_BATCH_SIZE" in os.environ:
+    logger.warning(
+        "EMBEDDING_BATCH_SIZE is no longer used; batches are packed up to "
+        "EMBEDDING_MAX_BATCH_INPUTS inputs and EMBEDDING_MAX_BATCH_TOKENS tokens"
+    )
+
+# Concurrent requests: start at the initial value, grow towards the maximum
+# while requests succeed, halve on every rate-limit response
+INITIAL_CONCURRENCY = int(os.environ.get("EMBEDDING_CONCURRENCY", "4"))
+MAX_CONCURRENCY = int(os.environ.get("EMBEDDING_MAX_CONCURRENCY", "16"))
+
+# Retries per batch for rate limits, timeouts and server errors
+MAX_RETRIES = int(os.environ.get("EMBEDDING_MAX_RETRIES", "6"))
+BACKOFF_BASE = float(os.environ.get("EMBEDDING_BACKOFF_BASE_SECONDS", "0.5"))
+BACKOFF_MAX = float(os.environ.get("EMBEDDING_BACKOFF_MAX_SECONDS", "30"))
+REQUEST_TIMEOUT = float(os.environ.get("EMBEDDING_REQUEST_TIMEOUT", "60"))
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+# 400 responses for a request over the provider's token limits, e.g. code
+# "max_tokens_per_request" or "maximum context length is 8192 tokens"
+_TOKEN_LIMIT_CODES = {"max_tokens_per_request", "context_length_exceeded"}
+_TOKEN_LIMIT_MESSAGE = re.compile(r"max(imum)?[ _].*tokens|tokens per request", re.IGNORECASE)
+
+def is_token_limit_error(error: Exception) -> bool:
+    """Whether a failed request was refused for carrying too many tokens"""
+    if not isinstance(error, openai.BadRequestError):
+        return False
+    return getattr(error, "code", None) in _TOKEN_LIMIT_CODES or bool(_TOKEN_LIMIT_MESSAGE.search(str(error)))
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Parse a rate-limit reset header such as '1s', '6m0s' or '120ms' into seconds"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(number) * scale[unit] for number, unit in parts)
+
+def _retry_after(headers) -> Optional[float]:
+    """Seconds the provider asked us to wait, if it said so"""
+    if headers is None:
+        return None
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    return parse_reset_duration(headers.get("retry-after"))
+
+class EmbeddingRun:
+    """Outcome of embedding one list of texts"""
+
+    def __init__(
+        self,
+        vectors: List[Optional[List[float]]],
+        errors: Dict[int, str],
+        seconds: float,
+        requests: int,
+        retries: int
+    ):
+        self.vectors = vectors
+        self.errors = errors  # text index -> error, for texts whose batch failed
+        self.seconds = seconds
+        self.requests = requests
+        self.retries = retries
+
+    @property
+    def chunks_per_second(self) -> float:
+        embedded = len(self.vectors) - len(self.errors)
+        return embedded / self.seconds if self.seconds > 0 else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "chunks": len(self.vectors),
+            "failed_chunks": len(self.errors),
+            "seconds": round(self.seconds, 3),
+            "chunks_per_second": round(self.chunks_per_second, 1),
+            "requests": self.requests,
+            "retries": self.retries
+        }
+
+class EmbeddingBatcher:
+    """Embeds texts in token-packed batches, several requests at a time.
+
+    Batches are filled up to the provider's per-request token and input
+    limits. Requests run concurrently behind an adaptive limit shared by
+    every caller in the process: it grows while requests succeed, halves
+    on a 429, and pauses all new requests until the provider's reset time
+    when a 429 arrives or the x-ratelimit-remaining-* headers say the
+    next batch would not fit. Failed requests are retried with
+    exponential backoff and jitter. A batch refused for exceeding the
+    provider's token limits (the local token counts are only estimates
+    without tiktoken) is split in half until it fits, so only a text too
+    long on its own fails.
+    """
+
+    def __init__(
+        self,
+        client: openai.OpenAI,
+        model: str,
+        max_batch_tokens: int = MAX_BATCH_TOKENS,
+        max_batch_inputs: int = MAX_BATCH_INPUTS,
+        initial_concurrency: int = INITIAL_CONCURRENCY,
+        max_concurrency: int = MAX_CONCURRENCY,
+        max_retries: int = MAX_RETRIES
+    ):
+        self.client = client
+        self.model = model
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_inputs = max_batch_inputs
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+
+        self.encoding = get_encoding(model)
+
+        # Adaptive concurrency state, guarded by _cond
+        self._cond = threading.Condition()
+        self._limit = float(min(max(1, initial_concurrency), self.max_concurrency))
+        self._in_flight = 0
+        self._pause_until = 0.0
+
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """Token count of each text under the model's tokenizer"""
+        if self.encoding is None:
+            return [estimate_tokens(text) for text in texts]
+        return [len(tokens) for tokens in self.encoding.encode_ordinary_batch(texts)]
+
+    def pack_batches(self, texts: List[str]) -> List[Tuple[List[int], int]]:
+        """Group text indices into batches within the token and input limits.
+
+        Returns (indices, token_count) per batch. Order is preserved; a text
+        larger than the token budget is sent on its own.
+        """
+        batches = []
+        current: List[int] = []
+        current_tokens = 0
+        for index, tokens in enumerate(self.count_tokens(texts)):
+            if current and (
+                current_tokens + tokens > self.max_batch_tokens
+                or len(current) >= self.max_batch_inputs
+            ):
+                batches.append((current, current_tokens))
+                current, current_tokens = [], 0
+            current.append(index)
+            current_tokens += tokens
+        if current:
+            batches.append((current, current_tokens))
+        return batches
+
+    def run(self, texts: List[str]) -> EmbeddingRun:
+        """Embed texts, recording per-text errors instead of raising"""
+        started = time.monotonic()
+        vectors: List[Optional[List[float]]] = [None] * len(texts)
+        errors: Dict[int, str] = {}
+        counters = {"requests": 0, "retries": 0}
+
+        def embed_batch(batch: Tuple[List[int], int]):
+            indices, tokens = batch
+            try:
+                result = self._embed_with_retries([texts[i] for i in indices], tokens, counters)
+                for index, vector in zip(indices, result):
+                    vectors[index] = vector
+            except Exception as e:
+                if len(indices) > 1 and is_token_limit_error(e):
+                    middle = len(indices) // 2
+                    logger.warning(
+                        f"Embedding batch of {len(indices)} texts exceeded the token limit; splitting it in two"
+                    )
+                    embed_batch((indices[:middle], tokens * middle // len(indices)))
+                    embed_batch((indices[middle:], tokens - tokens * middle // len(indices)))
+                    return
+                message = f"Error generating embeddings: {str(e)}"
+                for index in indices:
+                    errors[index] = message
+
+        batches = self.pack_batches(texts)
+        if batches:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as pool:
+                list(pool.map(embed_batch, batches))
+
+        run = EmbeddingRun(vectors, errors, time.monotonic() - started, counters["requests"], counters["retries"])
+        if texts:
+            logger.info(
+                f"Embedded {len(texts) - len(errors)}/{len(texts)} chunks in {len(batches)} batches: "
+                f"{run.seconds:.2f}s, {run.chunks_per_second:.1f} chunks/s, "
+                f"{run.requests} requests, {run.retries} retries, concurrency limit {int(self._limit)}"
+            )
+        return run
+
+    def _embed_with_retries(self, batch: List[str], tokens: int, counters: Dict[str, int]) -> List[List[float]]:
+        """Send one batch, retrying transient failures with exponential backoff"""
+        attempt = 0
+        while True:
+            self._acquire()
+            try:
+                with self._cond:
+                    counters["requests"] += 1
+                response = self.client.embeddings.with_raw_response.create(
+                    model=self.model,
+                    input=batch,
+                    timeout=REQUEST_TIMEOUT
+                )
+                self._on_success(response.headers, tokens)
+                data = sorted(response.parse().data, key=lambda item: item.index)
+                return [item.embedding for item in data]
+            except RETRYABLE_ERRORS as e:
+                headers = getattr(getattr(e, "response", None), "headers", None)
+                delay = self._on_failure(e, headers, attempt)
+                if attempt >= self.max_retries:
+                    raise
+                logger.warning(
+                    f"Embedding request failed ({type(e).__name__}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s"
+                )
+            finally:
+                self._release()
+
+            with self._cond:
+                counters["retries"] += 1
+            time.sleep(delay)
+            attempt += 1
+
+    def _acquire(self):
+        """Wait for a request slot under the current limit and any pause"""
+        with self._cond:
+            while True:
+                wait = self._pause_until - time.monotonic()
+                if wait <= 0 and self._in_flight < int(self._limit):
+                    break
+                self._cond.wait(timeout=wait if wait > 0 else None)
+            self._in_flight += 1
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _on_success(self, headers, tokens: int):
+        """Grow the limit additively and honour the remaining-quota headers"""
+        with self._cond:
+            self._limit = min(self.max_concurrency, self._limit + 1 / self._limit)
+
+            # Pause new requests when the next batches would exceed the quota
+            remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+            remaining_requests = headers.get("x-ratelimit-remaining-requests")
+            reset = None
+            if remaining_tokens is not None and remaining_tokens.isdigit() and int(remaining_tokens) < tokens:
+                reset = parse_reset_duration(headers.get("x-ratelimit-reset-tokens"))
+            elif remaining_requests is not None and remaining_requests.isdigit() and int(remaining_requests) < 1:
+                reset = parse_reset_duration(headers.get("x-ratelimit-reset-requests"))
+            if reset:
+                self._pause_until = max(self._pause_until, time.monotonic() + reset)
+            self._cond.notify_all()
+
+    def _on_failure(self, error: Exception, headers, attempt: int) -> float:
+        """Shrink the limit on rate limits and return the delay before retrying"""
+        backoff = min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)) * random.uniform(0.5, 1.0)
+        delay = max(backoff, _retry_after(headers) or 0)
+        with self._cond:
+            if isinstance(error, openai.RateLimitError):
+                self._limit = max(1.0, self._limit / 2)
+                self._pause_until = max(self._pause_until, time.monotonic() + delay)
+            self._cond.notify_all()
+        return delay
@@ -1,11 +1,31 @@
+import io
 import os
 import json
+import math
+import hashlib
+import logging
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from typing import List, Dict, Any
+from psycopg2 import sql
+from psycopg2.extras import RealDictCursor, execute_values
+from typing import List, Dict, Any, BinaryIO, Iterator, Optional, Tuple
 from langchain_openai import OpenAIEmbeddings
+from openai import OpenAI
 import numpy as np
 from pgvector.psycopg2 import register_vector
+from .embedding_batcher import EmbeddingBatcher
+from .single_flight import SingleFlight, normalize_question
+from .near_duplicates import Link, NearDuplicateDetector, dedup_stats, localize_links, space_report
+from .pdf_loader import DOCUMENT_METADATA_KEYS, split_document_metadata
+from .collection_names import DEFAULT_COLLECTION, partition_name, validate_collection_name
+from .snapshot import SNAPSHOT_BATCH_SIZE, SnapshotError, SnapshotReader, SnapshotWriter, canonical_row_id
+
+logger = logging.getLogger(__name__)
+
+def _copy_text(value: Optional[str]) -> str:
+    """Escape a value for COPY's text format"""
+    if value is None:
+        return "\\N"
+    return value.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
 
 class EmbeddingManager:
     def __init__(self):
@@ -14,12 +34,53 @@ class EmbeddingManager:
         if not self.openai_api_key:
             raise ValueError("OPENAI_API_KEY environment variable is required")
         
+        # Optional OpenAI-compatible endpoint, e.g. the local fake server for load tests
+        self.openai_base_url = os.environ.get("OPENAI_BASE_URL") or None
+        
         # Initialize OpenAI embeddings
         self.embeddings = OpenAIEmbeddings(
             api_key=self.openai_api_key,
-            model="text-embedding-3-small"  # Latest embedding model
+            base_url=self.openai_base_url,
+            model="text-embedding-3-small",  # Latest embedding model
+            # Chunks are far below the model's context length; skipping the
+            # tiktoken pre-check also keeps OpenAI-compatible servers working
+            check_embedding_ctx_length=False
         )
         
+        # Document embeddings go through token-packed, concurrent, rate-limit
+        # aware batches; the batcher does its own retries, so the client doesn't
+        self.batcher = EmbeddingBatcher(
+            OpenAI(api_key=self.openai_api_key, base_url=self.openai_base_url, max_retries=0),
+            model=self.embeddings.model
+        )
+        
+        # Deleted documents are tombstoned and purged later by compact().
+        # Searches over-fetch candidates so tombstoned rows can't starve results.
+        self.search_overfetch = int(os.environ.get("SEARCH_OVERFETCH", "4"))
+        self.compaction_batch_size = int(os.environ.get("COMPACTION_BATCH_SIZE", "5000"))
+        self.vacuum_dead_ratio = float(os.environ.get("VACUUM_DEAD_RATIO", "0.2"))
+        self.reindex_dead_ratio = float(os.environ.get("REINDEX_DEAD_RATIO", "0.5"))
+        
+        # ivfflat index per collection partition, built once the collection
+        # has IVFFLAT_MIN_CHUNKS chunks (smaller ones are scanned exactly) and
+        # rebuilt when it has grown or shrunk by IVFFLAT_REBUILD_FACTOR since.
+        # Lists and probes of 0 are fitted to the row count, as pgvector
+        # recommends: rows / 1000 lists up to 1M rows, sqrt(rows) beyond,
+        # and sqrt(lists) probes per query.
+        self.ivfflat_min_chunks = int(os.environ.get("IVFFLAT_MIN_CHUNKS", "10000"))
+        self.ivfflat_lists = int(os.environ.get("IVFFLAT_LISTS", "0"))
+        self.ivfflat_probes = int(os.environ.get("IVFFLAT_PROBES", "0"))
+        self.ivfflat_rebuild_factor = float(os.environ.get("IVFFLAT_REBUILD_FACTOR", "4"))
+        
+        # Collections whose partition is known to exist in this process
+        self._known_collections = set()
+        
+        # Concurrent identical queries share one query embedding call
+        self.query_flight = SingleFlight("query embedding")
+        
+        # Near-duplicate chunks are stored once and referenced by later copies
+        self.dedup = NearDuplicateDetector()
+        
         # PostgreSQL connection parameters
         self.db_params = {
             'host': os.environ.get('POSTGRES_HOST', 'localhost'),
@@ -46,98 +107,657 @@ class EmbeddingManager:
                 # Enable pgvector extension
                 cursor.execute("CREATE EXTENSION IF NOT EXISTS vector")
                 
-                # Create documents table with vector column
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS documents (
-                        id SERIAL PRIMARY KEY,
-                        filename TEXT NOT NULL,
-                        chunk_id INTEGER NOT NULL,
-                        content TEXT NOT NULL,
-                        embedding vector(1536),  -- OpenAI text-embedding-3-small has 1536 dimensions
-                        metadata JSONB NOT NULL,
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                    )
-                """)
+                # Older layouts are renamed aside, then copied into the new tables
+                legacy_layout = self._detach_legacy_documents(cursor)
                 
-                # Create index for filename lookups
-                cursor.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_documents_filename 
-                    ON documents(filename)
-                """)
+                self._create_tables(cursor)
                 
-                # Create vector similarity index for fast similarity search
-                cursor.execute("""
-                    CREATE INDEX IF NOT EXISTS idx_documents_embedding 
-                    ON documents USING ivfflat (embedding vector_cosine_ops)
-                    WITH (lists = 100)
-                """)
+                if legacy_layout:
+                    self._copy_legacy_documents(cursor, legacy_layout)
                 
                 conn.commit()
                 
         except Exception as e:
             raise Exception(f"Error setting up database: {str(e)}")
     
-    def store_document_embeddings(self, text_chunks: List[Dict[str, Any]], filename: str):
-        """Generate embeddings for text chunks and store in PostgreSQL database"""
+    def _create_tables(self, cursor):
+        """Create collections, the document catalog and the partitioned chunk table"""
+        # One row per collection; each owns a partition of the chunk table.
+        # version changes whenever the collection's documents do; indexed_rows
+        # and index_lists describe the partition's ivfflat index when it was
+        # last built (0 without one).
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS collections (
+                name TEXT PRIMARY KEY,
+                version BIGINT NOT NULL DEFAULT 0,
+                indexed_rows BIGINT NOT NULL DEFAULT 0,
+                index_lists INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("ALTER TABLE collections ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0")
+        cursor.execute("ALTER TABLE collections ADD COLUMN IF NOT EXISTS indexed_rows BIGINT NOT NULL DEFAULT 0")
+        cursor.execute("ALTER TABLE collections ADD COLUMN IF NOT EXISTS index_lists INTEGER NOT NULL DEFAULT 0")
+        cursor.execute(
+            "INSERT INTO collections (name) VALUES (%s) ON CONFLICT (name) DO NOTHING",
+            (DEFAULT_COLLECTION,)
+        )
+        
+        # One row per document; listing documents never touches chunk rows
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS document_catalog (
+                id SERIAL PRIMARY KEY,
+                collection TEXT NOT NULL DEFAULT 'default' REFERENCES collections(name) ON DELETE CASCADE,
+                filename TEXT NOT NULL,
+                content_hash TEXT,
+                page_count INTEGER NOT NULL DEFAULT 0,
+                chunk_count INTEGER NOT NULL DEFAULT 0,
+                byte_size BIGINT,
+                metadata JSONB NOT NULL DEFAULT '{}'::jsonb,
+                status TEXT NOT NULL DEFAULT 'active',  -- 'active' or 'deleted' (tombstone)
+                ingested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                deleted_at TIMESTAMP
+            )
+        """)
+        cursor.execute("ALTER TABLE document_catalog ADD COLUMN IF NOT EXISTS deleted_at TIMESTAMP")
+        cursor.execute("""
+            ALTER TABLE document_catalog ADD COLUMN IF NOT EXISTS
+                collection TEXT NOT NULL DEFAULT 'default' REFERENCES collections(name) ON DELETE CASCADE
+        """)
+        
+        # Each ingest is a new generation; only one may be active per filename
+        cursor.execute("DROP INDEX IF EXISTS idx_document_catalog_filename")
+        cursor.execute("DROP INDEX IF EXISTS idx_document_catalog_active_filename")
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_document_catalog_active_collection_filename 
+            ON document_catalog(collection, filename) WHERE status = 'active'
+        """)
+        
+        # Create documents table with vector column, list-partitioned by
+        # collection so a query only scans its own collection's partition
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id SERIAL,
+                collection TEXT NOT NULL,
+                document_id INTEGER NOT NULL REFERENCES document_catalog(id) ON DELETE CASCADE,
+                chunk_id INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                embedding vector(1536),  -- OpenAI text-embedding-3-small has 1536 dimensions
+                metadata JSONB NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (collection, id)
+            ) PARTITION BY LIST (collection)
+        """)
+        
+        # Create index for per-document chunk lookups (inherited by partitions)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_documents_document_id 
+            ON documents(document_id)
+        """)
+        
+        # MinHash signature and LSH band keys of each stored chunk; the GIN
+        # index finds chunks sharing a band with new ones at ingest
+        cursor.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS minhash BYTEA")
+        cursor.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS minhash_bands BIGINT[]")
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_documents_minhash_bands 
+            ON documents USING gin (minhash_bands)
+        """)
+        
+        # Near-duplicate chunks: each document keeps its own reference, with
+        # its page span, to one canonical chunk row in the same collection
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS chunk_refs (
+                id SERIAL PRIMARY KEY,
+                collection TEXT NOT NULL REFERENCES collections(name) ON DELETE CASCADE,
+                document_id INTEGER NOT NULL REFERENCES document_catalog(id) ON DELETE CASCADE,
+                chunk_id INTEGER NOT NULL,
+                canonical_id INTEGER NOT NULL,  -- documents.id of the stored copy
+                similarity REAL NOT NULL,
+                content_bytes INTEGER NOT NULL,
+                metadata JSONB NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_chunk_refs_canonical 
+            ON chunk_refs(collection, canonical_id)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_chunk_refs_document_id 
+            ON chunk_refs(document_id)
+        """)
+        
+        cursor.execute("SELECT name FROM collections")
+        for (name,) in cursor.fetchall():
+            self._create_partition(cursor, name)
+    
+    def _create_partition(self, cursor, collection: str):
+        """Create a collection's chunk partition.
+        
+        Its vector index is left to maintain_indexes(): ivfflat picks its
+        list centroids from the rows present at build time, so an index built
+        on an empty partition would cluster nothing.
+        """
+        partition = partition_name(collection)
+        cursor.execute(
+            sql.SQL("CREATE TABLE IF NOT EXISTS {} PARTITION OF documents FOR VALUES IN ({})").format(
+                sql.Identifier(partition), sql.Literal(collection)
+            )
+        )
+        self._known_collections.add(collection)
+    
+    @staticmethod
+    def _vector_index_name(collection: str) -> str:
+        """Name of a partition's ivfflat index as stored (Postgres cuts names to 63 bytes)"""
+        return f"{partition_name(collection)}_embedding_idx"[:63]
+    
+    def _ivfflat_lists_for(self, rows: int) -> int:
+        """Lists for an index over rows chunks"""
+        if self.ivfflat_lists > 0:
+            return self.ivfflat_lists
+        if rows <= 1_000_000:
+            return max(1, rows // 1000)
+        return int(math.sqrt(rows))
+    
+    def _ivfflat_probes_for(self, lists: int) -> int:
+        """Lists probed per query of an index with the given number of lists"""
+        if self.ivfflat_probes > 0:
+            return min(self.ivfflat_probes, lists)
+        return max(1, math.ceil(math.sqrt(lists)))
+    
+    def _vector_index_statements(self, cursor, collection: str, lists: int) -> List[sql.Composable]:
+        """Statements that build a partition's ivfflat index with the given lists.
+        
+        An index with other lists is replaced by building the new one under
+        a temporary name first, so searches keep an index throughout.
+        """
+        partition = sql.Identifier(partition_name(collection))
+        index = self._vector_index_name(collection)
+        
+        def create(name: str) -> sql.Composable:
+            return sql.SQL("""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS {} 
+                ON {} USING ivfflat (embedding vector_cosine_ops)
+                WITH (lists = {})
+            """).format(sql.Identifier(name), partition, sql.Literal(lists))
+        
+        cursor.execute(
+            "SELECT 1 FROM pg_indexes WHERE schemaname = current_schema() AND indexname = %s",
+            (index,)
+        )
+        if not cursor.fetchone():
+            return [create(index)]
+        
+        cursor.execute("SELECT index_lists FROM collections WHERE name = %s", (collection,))
+        row = cursor.fetchone()
+        if row and row[0] == lists:
+            return [sql.SQL("REINDEX INDEX CONCURRENTLY {}").format(sql.Identifier(index))]
+        
+        replacement = f"documents_embedding_new_{hashlib.md5(collection.encode()).hexdigest()[:16]}"
+        return [
+            sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(sql.Identifier(replacement)),
+            create(replacement),
+            sql.SQL("DROP INDEX CONCURRENTLY {}").format(sql.Identifier(index)),
+            sql.SQL("ALTER INDEX {} RENAME TO {}").format(sql.Identifier(replacement), sql.Identifier(index))
+        ]
+    
+    def _build_vector_indexes(self, chunk_counts: Dict[str, int]):
+        """Build or rebuild the given collections' ivfflat indexes and record their sizes"""
+        lists = {collection: self._ivfflat_lists_for(count) for collection, count in chunk_counts.items()}
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            statements = [
+                statement
+                for collection in chunk_counts
+                for statement in self._vector_index_statements(cursor, collection, lists[collection])
+            ]
+            conn.commit()
+        
+        self._run_maintenance(statements)
+        
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                "UPDATE collections SET indexed_rows = %s, index_lists = %s WHERE name = %s",
+                [(count, lists[collection], collection) for collection, count in chunk_counts.items()]
+            )
+            conn.commit()
+    
+    def _drop_vector_indexes(self, collections: List[str]):
+        """Drop the given collections' ivfflat indexes; their partitions are scanned exactly"""
+        self._run_maintenance([
+            sql.SQL("DROP INDEX CONCURRENTLY IF EXISTS {}").format(sql.Identifier(self._vector_index_name(collection)))
+            for collection in collections
+        ])
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "UPDATE collections SET indexed_rows = 0, index_lists = 0 WHERE name = ANY(%s)",
+                (collections,)
+            )
+            conn.commit()
+    
+    def _detach_legacy_documents(self, cursor) -> Optional[str]:
+        """Rename an older documents table aside so the new layout can be created.
+        
+        Returns "filename" for the original filename-keyed table,
+        "unpartitioned" for the catalog layout before collections, or None
+        when the current layout (or nothing) is in place.
+        """
+        cursor.execute("""
+            SELECT c.relkind,
+                   EXISTS (
+                       SELECT 1 FROM information_schema.columns
+                       WHERE table_schema = current_schema()
+                         AND table_name = 'documents' AND column_name = 'filename'
+                   )
+            FROM pg_class c
+            WHERE c.relname = 'documents' AND c.relnamespace = current_schema()::regnamespace
+        """)
+        row = cursor.fetchone()
+        if row is None or row[0] == 'p':
+            return None
+        
+        # Free the index names for the new table before recreating it
+        cursor.execute("ALTER TABLE documents RENAME TO documents_legacy")
+        cursor.execute("DROP INDEX IF EXISTS idx_documents_filename")
+        cursor.execute("DROP INDEX IF EXISTS idx_documents_document_id")
+        cursor.execute("DROP INDEX IF EXISTS idx_documents_embedding")
+        return "filename" if row[1] else "unpartitioned"
+    
+    def _copy_legacy_documents(self, cursor, legacy_layout: str):
+        """Copy chunks from a detached older table into the default collection"""
+        if legacy_layout == "filename":
+            cursor.execute("""
+                INSERT INTO document_catalog (filename, page_count, chunk_count, metadata, ingested_at)
+                SELECT filename,
+                       COALESCE(MAX((metadata->>'total_pages')::int), 0),
+                       COUNT(*),
+                       jsonb_build_object(
+                           'successful_pages', MAX((metadata->>'successful_pages')::int),
+                           'failed_pages', MAX((metadata->>'failed_pages')::int)
+                       ),
+                       MIN(created_at)
+                FROM documents_legacy
+                GROUP BY filename
+            """)
+            cursor.execute("""
+                INSERT INTO documents (collection, document_id, chunk_id, content, embedding, metadata, created_at)
+                SELECT %s, c.id, l.chunk_id, l.content, l.embedding, l.metadata - %s::text[], l.created_at
+                FROM documents_legacy l
+                JOIN document_catalog c ON c.filename = l.filename
+            """, (DEFAULT_COLLECTION, list(DOCUMENT_METADATA_KEYS)))
+        else:
+            cursor.execute("""
+                INSERT INTO documents (collection, document_id, chunk_id, content, embedding, metadata, created_at)
+                SELECT %s, document_id, chunk_id, content, embedding, metadata, created_at
+                FROM documents_legacy
+            """, (DEFAULT_COLLECTION,))
+        cursor.execute("DROP TABLE documents_legacy")
+    
+    def _ensure_collection(self, collection: str):
+        """Create a collection and its partition on first use.
+        
+        Runs in its own short transaction: creating a partition locks the
+        parent table, which must not be held for the length of an ingest.
+        """
+        validate_collection_name(collection)
+        if collection in self._known_collections:
+            return
+        
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO collections (name) VALUES (%s) ON CONFLICT (name) DO NOTHING",
+                (collection,)
+            )
+            self._create_partition(cursor, collection)
+            conn.commit()
+    
+    def _bump_collection_version(self, cursor, collection: str):
+        """Mark a collection's contents as changed.
+        
+        Call it right before commit: the UPDATE holds the collection's row
+        lock until the transaction ends, so bumping early would serialize
+        concurrent ingests into the same collection.
+        """
+        cursor.execute("UPDATE collections SET version = version + 1 WHERE name = %s", (collection,))
+    
+    def get_collection_version(self, collection: str = DEFAULT_COLLECTION) -> int:
+        """Current version of a collection's document set (0 if it doesn't exist)"""
         try:
-            # First, delete existing chunks for this document
             with self._get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute("DELETE FROM documents WHERE filename = %s", (filename,))
-                conn.commit()
+                cursor.execute("SELECT version FROM collections WHERE name = %s", (collection,))
+                row = cursor.fetchone()
+                return row[0] if row else 0
+        except Exception as e:
+            raise Exception(f"Error reading collection version: {str(e)}")
+    
+    def _replace_document(
+        self,
+        filename: str,
+        text_chunks: List[Dict[str, Any]],
+        embedding_vectors: List[List[float]],
+        content_hash: Optional[str] = None,
+        byte_size: Optional[int] = None,
+        collection: str = DEFAULT_COLLECTION,
+        signatures: Optional[List[Optional[np.ndarray]]] = None,
+        links: Optional[List[Optional[Link]]] = None
+    ) -> Dict[int, int]:
+        """Replace a document's catalog entry and chunks in a single transaction.
+        
+        Chunks with a link are stored as references to their canonical chunk
+        rather than with their own text and embedding. Returns the row id of
+        each chunk stored in full, by its position in text_chunks.
+        """
+        document_metadata, chunk_metadata = split_document_metadata(text_chunks)
+        signatures = signatures or [None] * len(text_chunks)
+        links = links or [None] * len(text_chunks)
+        self._ensure_collection(collection)
+        
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
             
-            # Process chunks in batches
-            batch_size = 10
-            for i in range(0, len(text_chunks), batch_size):
-                batch = text_chunks[i:i + batch_size]
-                
-                # Generate embeddings for batch
-                texts = [chunk["content"] for chunk in batch]
-                embedding_vectors = self.embeddings.embed_documents(texts)
-                
-                # Store in database
-                with self._get_connection() as conn:
-                    cursor = conn.cursor()
-                    for j, chunk in enumerate(batch):
-                        embedding_vector = embedding_vectors[j]
-                        
-                        # Convert metadata to JSONB
-                        metadata = chunk["metadata"]
-                        
-                        cursor.execute("""
-                            INSERT INTO documents (filename, chunk_id, content, embedding, metadata)
-                            VALUES (%s, %s, %s, %s, %s)
-                        """, (
-                            filename,
-                            chunk["metadata"]["chunk_id"],
-                            chunk["content"],
-                            embedding_vector,  # pgvector handles the conversion
-                            json.dumps(metadata)
-                        ))
-                    conn.commit()
-                    
+            # Tombstone the previous generation; compact() purges its chunks
+            cursor.execute("""
+                UPDATE document_catalog SET status = 'deleted', deleted_at = CURRENT_TIMESTAMP
+                WHERE collection = %s AND filename = %s AND status = 'active'
+                RETURNING id
+            """, (collection, filename))
+            previous_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute("""
+                INSERT INTO document_catalog
+                    (collection, filename, content_hash, page_count, chunk_count, byte_size, metadata, status)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, 'active')
+                RETURNING id
+            """, (
+                collection,
+                filename,
+                content_hash,
+                document_metadata.get("total_pages", 0),
+                len(text_chunks),
+                byte_size,
+                json.dumps({
+                    key: document_metadata[key]
+                    for key in ("successful_pages", "failed_pages") if key in document_metadata
+                })
+            ))
+            document_id = cursor.fetchone()[0]
+            
+            canonical = [index for index, link in enumerate(links) if link is None]
+            if canonical:
+                execute_values(cursor, """
+                    INSERT INTO documents
+                        (collection, document_id, chunk_id, content, embedding, metadata, minhash, minhash_bands)
+                    VALUES %s
+                """, [
+                    (
+                        collection,
+                        document_id,
+                        text_chunks[index]["metadata"]["chunk_id"],
+                        text_chunks[index]["content"],
+                        embedding_vectors[index],  # pgvector handles the conversion
+                        json.dumps(chunk_metadata[index]),
+                        psycopg2.Binary(signatures[index].tobytes()) if signatures[index] is not None else None,
+                        self.dedup.band_keys(signatures[index]) if signatures[index] is not None else None
+                    )
+                    for index in canonical
+                ])
+            cursor.execute(
+                "SELECT chunk_id, id FROM documents WHERE collection = %s AND document_id = %s",
+                (collection, document_id)
+            )
+            rows_by_chunk_id = dict(cursor.fetchall())
+            row_ids = {index: rows_by_chunk_id[text_chunks[index]["metadata"]["chunk_id"]] for index in canonical}
+            
+            references = [
+                (
+                    collection,
+                    document_id,
+                    text_chunks[index]["metadata"]["chunk_id"],
+                    row_ids[link[1]] if link[0] == "chunk" else link[1],
+                    link[2],
+                    len(text_chunks[index]["content"].encode("utf-8")),
+                    json.dumps(chunk_metadata[index])
+                )
+                for index, link in enumerate(links) if link is not None
+            ]
+            if references:
+                execute_values(cursor, """
+                    INSERT INTO chunk_refs
+                        (collection, document_id, chunk_id, canonical_id, similarity, content_bytes, metadata)
+                    VALUES %s
+                """, references)
+            
+            # Hold the referenced chunks' documents until commit: a concurrent
+            # delete then either sees these references or is seen below
+            targets = sorted({link[1] for link in links if link is not None and link[0] == "row"})
+            if targets:
+                cursor.execute("""
+                    SELECT d.id FROM document_catalog c
+                    JOIN documents d ON d.document_id = c.id
+                    WHERE d.collection = %s AND d.id = ANY(%s)
+                    FOR SHARE OF c
+                """, (collection, targets))
+                if len(cursor.fetchall()) < len(targets):
+                    raise Exception("Chunks this document duplicates were purged during ingestion; upload it again")
+            self._promote_references(cursor, collection, previous_ids, targets)
+            self._bump_collection_version(cursor, collection)
+            conn.commit()
+        
+        return row_ids
+    
+    def _promote_references(self, cursor, collection: str, document_ids: List[int], canonical_ids: List[int]):
+        """Give references whose canonical chunk was tombstoned a full row again.
+        
+        Covers canonical chunks of the given documents and the given chunk
+        rows. The oldest reference from a live document takes over the
+        canonical chunk's text, embedding and signature under its own page
+        span, and the remaining references are pointed at it.
+        """
+        if not document_ids and not canonical_ids:
+            return
+        
+        cursor.execute("""
+            SELECT DISTINCT ON (r.canonical_id) r.id, r.canonical_id, r.document_id, r.chunk_id, r.metadata
+            FROM chunk_refs r
+            JOIN documents d ON d.collection = r.collection AND d.id = r.canonical_id
+            JOIN document_catalog canonical_doc ON canonical_doc.id = d.document_id
+            JOIN document_catalog reference_doc ON reference_doc.id = r.document_id
+            WHERE r.collection = %s
+              AND (d.document_id = ANY(%s) OR r.canonical_id = ANY(%s))
+              AND canonical_doc.status = 'deleted' AND reference_doc.status = 'active'
+            ORDER BY r.canonical_id, r.id
+        """, (collection, list(document_ids), list(canonical_ids)))
+        
+        for reference_id, canonical_id, document_id, chunk_id, metadata in cursor.fetchall():
+            cursor.execute("""
+                INSERT INTO documents
+                    (collection, document_id, chunk_id, content, embedding, metadata, minhash, minhash_bands)
+                SELECT collection, %s, %s, content, embedding, %s, minhash, minhash_bands
+                FROM documents WHERE collection = %s AND id = %s
+                RETURNING id
+            """, (document_id, chunk_id, json.dumps(metadata), collection, canonical_id))
+            promoted_id = cursor.fetchone()[0]
+            cursor.execute(
+                "UPDATE chunk_refs SET canonical_id = %s WHERE collection = %s AND canonical_id = %s",
+                (promoted_id, collection, canonical_id)
+            )
+            cursor.execute("DELETE FROM chunk_refs WHERE id = %s", (reference_id,))
+    
+    def _link_duplicates(
+        self,
+        texts: List[str],
+        collection: str
+    ) -> Tuple[List[Optional[np.ndarray]], List[Optional[Link]]]:
+        """MinHash signatures of new chunks and their links to canonical chunks"""
+        if not self.dedup.enabled:
+            return [None] * len(texts), [None] * len(texts)
+        
+        signatures = [self.dedup.signature(text) for text in texts]
+        keys = sorted({key for signature in signatures for key in self.dedup.band_keys(signature)})
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT d.id, d.minhash FROM documents d
+                JOIN document_catalog c ON c.id = d.document_id
+                WHERE d.collection = %s AND d.minhash_bands && %s::bigint[] AND c.status = 'active'
+            """, (collection, keys))
+            existing = [(row_id, self.dedup.decode(minhash)) for row_id, minhash in cursor.fetchall()]
+        return signatures, self.dedup.link(signatures, existing)
+    
+    def store_document_embeddings(
+        self,
+        text_chunks: List[Dict[str, Any]],
+        filename: str,
+        content_hash: Optional[str] = None,
+        byte_size: Optional[int] = None,
+        collection: str = DEFAULT_COLLECTION
+    ) -> Dict[str, Any]:
+        """Generate embeddings for text chunks and store in PostgreSQL database.
+        
+        Near-duplicates of stored chunks, or of earlier chunks in the same
+        document, are not embedded; they are stored as references.
+        """
+        try:
+            texts = [chunk["content"] for chunk in text_chunks]
+            signatures, links = self._link_duplicates(texts, collection)
+            unique = [index for index, link in enumerate(links) if link is None]
+            
+            run = self.batcher.run([texts[index] for index in unique])
+            if run.errors:
+                raise Exception(next(iter(run.errors.values())))
+            embedding_vectors = [None] * len(texts)
+            for index, vector in zip(unique, run.vectors):
+                embedding_vectors[index] = vector
+            
+            self._replace_document(
+                filename, text_chunks, embedding_vectors, content_hash, byte_size, collection, signatures, links
+            )
+            return {**run.stats(), **dedup_stats(texts, links)}
         except Exception as e:
             raise Exception(f"Error storing embeddings: {str(e)}")
     
-    def similarity_search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+    def store_documents_embeddings(
+        self,
+        documents: List[Dict[str, Any]],
+        collection: str = DEFAULT_COLLECTION
+    ) -> List[Dict[str, Any]]:
+        """Embed several documents together and store each in its own transaction.
+        
+        Each document is a dict with "filename" and "text_chunks", plus optional
+        "content_hash" and "byte_size". Chunks from all documents are packed
+        into shared embedding batches so every API call is full, while a
+        failure only affects the documents whose chunks were in the failing
+        batch. Near-duplicate chunks, within the batch or of stored chunks,
+        are stored as references instead of being embedded again. Returns
+        one result per document.
+        """
+        texts = []
+        owners = []
+        for doc_index, document in enumerate(documents):
+            for chunk in document["text_chunks"]:
+                texts.append(chunk["content"])
+                owners.append(doc_index)
+        
+        try:
+            signatures, links = self._link_duplicates(texts, collection)
+        except Exception as e:
+            error = f"Error detecting duplicate chunks: {str(e)}"
+            return [{"filename": document["filename"], "status": "failed", "error": error} for document in documents]
+        unique = [index for index, link in enumerate(links) if link is None]
+        
+        run = self.batcher.run([texts[index] for index in unique])
+        embedding_vectors = [None] * len(texts)
+        errors = {}
+        for position, index in enumerate(unique):
+            embedding_vectors[index] = run.vectors[position]
+        for position, error in run.errors.items():
+            errors.setdefault(owners[unique[position]], error)
+        # A duplicate can't be stored if its canonical chunk failed to embed
+        for index, link in enumerate(links):
+            if link is not None and link[0] == "chunk" and embedding_vectors[link[1]] is None:
+                errors.setdefault(owners[index], errors[owners[link[1]]])
+        
+        results = []
+        stored_rows = {}  # chunk index in texts -> row id, for links across documents
+        offset = 0
+        for doc_index, document in enumerate(documents):
+            filename = document["filename"]
+            text_chunks = document["text_chunks"]
+            start, offset = offset, offset + len(text_chunks)
+            
+            if doc_index not in errors:
+                doc_links, doc_vectors = localize_links(links, embedding_vectors, start, offset, stored_rows)
+                try:
+                    row_ids = self._replace_document(
+                        filename,
+                        text_chunks,
+                        doc_vectors,
+                        document.get("content_hash"),
+                        document.get("byte_size"),
+                        collection,
+                        signatures[start:offset],
+                        doc_links
+                    )
+                    stored_rows.update({start + index: row_id for index, row_id in row_ids.items()})
+                except Exception as e:
+                    errors[doc_index] = f"Error storing embeddings: {str(e)}"
+            
+            if doc_index in errors:
+                results.append({"filename": filename, "status": "failed", "error": errors[doc_index]})
+            else:
+                results.append({
+                    "filename": filename,
+                    "status": "processed",
+                    "chunks_processed": len(text_chunks),
+                    "duplicate_chunks": sum(link is not None for link in doc_links)
+                })
+        
+        return results
+    
+    def similarity_search(self, query: str, k: int = 5, collection: str = DEFAULT_COLLECTION) -> List[Dict[str, Any]]:
         """Search for similar document chunks using vector similarity"""
         try:
-            # Generate embedding for query
-            query_embedding = self.embeddings.embed_query(query)
+            # Generate embedding for query, shared with identical in-flight queries
+            query_embedding = self.query_flight.do(
+                normalize_question(query), lambda: self.embeddings.embed_query(query)
+            )
             
             # Convert list to numpy array and then to vector format
             query_vector = np.array(query_embedding).tolist()
             
-            # Use pgvector's cosine similarity operator with explicit cast
+            # Use pgvector's cosine similarity operator with explicit cast.
+            # The collection filter prunes the scan to one partition and its
+            # index; tombstoned generations are filtered out afterwards from
+            # an over-fetched candidate set.
             with self._get_connection() as conn:
                 cursor = conn.cursor(cursor_factory=RealDictCursor)
+                
+                # Probe enough of the partition's lists for good recall
+                cursor.execute("SELECT index_lists FROM collections WHERE name = %s", (collection,))
+                row = cursor.fetchone()
+                if row and row["index_lists"]:
+                    cursor.execute("SET LOCAL ivfflat.probes = %s", (self._ivfflat_probes_for(row["index_lists"]),))
+                
                 cursor.execute("""
-                    SELECT content, metadata, filename, 
-                           1 - (embedding <=> %s::vector) as similarity
-                    FROM documents
-                    ORDER BY embedding <=> %s::vector
+                    SELECT d.content, d.metadata, c.filename, 
+                           1 - d.distance as similarity
+                    FROM (
+                        SELECT content, metadata, document_id,
+                               embedding <=> %s::vector as distance
+                        FROM documents
+                        WHERE collection = %s
+                        ORDER BY embedding <=> %s::vector
+                        LIMIT %s
+                    ) d
+                    JOIN document_catalog c ON c.id = d.document_id
+                    WHERE c.status = 'active'
+                    ORDER BY d.distance
                     LIMIT %s
-                """, (query_vector, query_vector, k))
+                """, (query_vector, collection, query_vector, k * self.search_overfetch, k))
                 
                 results = cursor.fetchall()
                 
@@ -156,55 +776,95 @@ class EmbeddingManager:
         except Exception as e:
             raise Exception(f"Error during similarity search: {str(e)}")
     
-    def get_document_list(self) -> List[str]:
-        """Get list of all processed documents"""
+    def get_document_list(self, collection: str = DEFAULT_COLLECTION) -> List[str]:
+        """Get list of all processed documents in a collection"""
         try:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute("SELECT DISTINCT filename FROM documents ORDER BY filename")
+                cursor.execute("""
+                    SELECT filename FROM document_catalog
+                    WHERE collection = %s AND status = 'active'
+                    ORDER BY filename
+                """, (collection,))
                 return [row[0] for row in cursor.fetchall()]
         except Exception as e:
             raise Exception(f"Error retrieving document list: {str(e)}")
     
-    def delete_document(self, filename: str) -> bool:
-        """Delete a document and all its embeddings from the database"""
+    def list_documents(
+        self,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        collection: str = DEFAULT_COLLECTION
+    ) -> Dict[str, Any]:
+        """Get a page of catalog entries and the total document count"""
         try:
             with self._get_connection() as conn:
-                cursor = conn.cursor()
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute("""
+                    SELECT COUNT(*) AS total FROM document_catalog
+                    WHERE collection = %s AND status = 'active'
+                """, (collection,))
+                total = cursor.fetchone()["total"]
                 
-                # Check if document exists
-                cursor.execute("SELECT COUNT(*) FROM documents WHERE filename = %s", (filename,))
-                count = cursor.fetchone()[0]
+                cursor.execute("""
+                    SELECT id, collection, filename, content_hash, page_count, chunk_count,
+                           byte_size, metadata, status, ingested_at
+                    FROM document_catalog
+                    WHERE collection = %s AND status = 'active'
+                    ORDER BY filename
+                    LIMIT %s OFFSET %s
+                """, (collection, limit, offset))
                 
-                if count == 0:
-                    return False  # Document not found
+                documents = []
+                for row in cursor.fetchall():
+                    row = dict(row)
+                    row["ingested_at"] = row["ingested_at"].isoformat() if row["ingested_at"] else None
+                    documents.append(row)
                 
-                # Delete all chunks for this document
-                cursor.execute("DELETE FROM documents WHERE filename = %s", (filename,))
+                return {"documents": documents, "total": total}
+        except Exception as e:
+            raise Exception(f"Error retrieving document list: {str(e)}")
+    
+    def delete_document(self, filename: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        """Delete a document: tombstone it now, purge its chunks in compact()"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    UPDATE document_catalog SET status = 'deleted', deleted_at = CURRENT_TIMESTAMP
+                    WHERE collection = %s AND filename = %s AND status = 'active'
+                    RETURNING id, chunk_count
+                """, (collection, filename))
+                row = cursor.fetchone()
+                if row is not None:
+                    # Other documents' references to its chunks keep a copy
+                    self._promote_references(cursor, collection, [row[0]], [])
+                    self._bump_collection_version(cursor, collection)
                 conn.commit()
                 
-                # Check if any rows were deleted
-                if cursor.rowcount > 0:
-                    print(f"Successfully deleted {cursor.rowcount} chunks for document: {filename}")
-                    return True
-                else:
-                    return False
+                if row is None:
+                    return False  # Document not found
+                
+                print(f"Successfully deleted {row[1]} chunks for document: {filename}")
+                return True
                     
         except Exception as e:
             raise Exception(f"Error deleting document '{filename}': {str(e)}")
     
-    def delete_all_documents(self) -> int:
-        """Delete all documents and embeddings from the database"""
+    def delete_all_documents(self, collection: str = DEFAULT_COLLECTION) -> int:
+        """Delete all documents in a collection: tombstone them, purge in compact()"""
         try:
             with self._get_connection() as conn:
                 cursor = conn.cursor()
                 
-                # Count documents before deletion
-                cursor.execute("SELECT COUNT(*) FROM documents")
-                count_before = cursor.fetchone()[0]
-                
-                # Delete all documents
-                cursor.execute("DELETE FROM documents")
+                cursor.execute("""
+                    UPDATE document_catalog SET status = 'deleted', deleted_at = CURRENT_TIMESTAMP
+                    WHERE collection = %s AND status = 'active'
+                    RETURNING chunk_count
+                """, (collection,))
+                count_before = sum(row[0] for row in cursor.fetchall())
+                self._bump_collection_version(cursor, collection)
                 conn.commit()
                 
                 print(f"Successfully deleted all documents ({count_before} chunks removed)")
@@ -212,3 +872,510 @@ class EmbeddingManager:
                 
         except Exception as e:
             raise Exception(f"Error deleting all documents: {str(e)}")
+    
+    def list_collections(self) -> List[Dict[str, Any]]:
+        """List collections with their active document and chunk counts"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor(cursor_factory=RealDictCursor)
+                cursor.execute("""
+                    SELECT col.name,
+                           COUNT(c.id) AS documents,
+                           COALESCE(SUM(c.chunk_count), 0) AS chunks,
+                           col.created_at
+                    FROM collections col
+                    LEFT JOIN document_catalog c
+                        ON c.collection = col.name AND c.status = 'active'
+                    GROUP BY col.name, col.created_at
+                    ORDER BY col.name
+                """)
+                return [
+                    {
+                        "name": row["name"],
+                        "documents": row["documents"],
+                        "chunks": int(row["chunks"]),
+                        "created_at": row["created_at"].isoformat() if row["created_at"] else None
+                    }
+                    for row in cursor.fetchall()
+                ]
+        except Exception as e:
+            raise Exception(f"Error retrieving collections: {str(e)}")
+    
+    def get_dedup_report(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, Any]:
+        """Space saved in a collection by storing near-duplicate chunks as references"""
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT COUNT(*),
+                           COALESCE(AVG(pg_column_size(d.embedding)), 0),
+                           COALESCE(SUM(pg_column_size(d.minhash)), 0) + COALESCE(SUM(pg_column_size(d.minhash_bands)), 0)
+                    FROM documents d
+                    JOIN document_catalog c ON c.id = d.document_id
+                    WHERE d.collection = %s AND c.status = 'active'
+                """, (collection,))
+                stored_chunks, embedding_bytes, signature_bytes = cursor.fetchone()
+                cursor.execute("""
+                    SELECT COUNT(*), COALESCE(SUM(r.content_bytes), 0)
+                    FROM chunk_refs r
+                    JOIN document_catalog c ON c.id = r.document_id
+                    WHERE r.collection = %s AND c.status = 'active'
+                """, (collection,))
+                duplicate_chunks, text_bytes_saved = cursor.fetchone()
+            return space_report(
+                self.dedup,
+                collection,
+                stored_chunks,
+                duplicate_chunks,
+                int(text_bytes_saved),
+                float(embedding_bytes),
+                int(signature_bytes)
+            )
+        except Exception as e:
+            raise Exception(f"Error building duplicate report: {str(e)}")
+    
+    def create_collection(self, collection: str):
+        """Create an empty collection with its own partition"""
+        validate_collection_name(collection)
+        try:
+            self._ensure_collection(collection)
+        except Exception as e:
+            raise Exception(f"Error creating collection '{collection}': {str(e)}")
+    
+    def drop_collection(self, collection: str) -> bool:
+        """Drop a collection: its partition is dropped, not deleted row by row"""
+        validate_collection_name(collection)
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT 1 FROM collections WHERE name = %s", (collection,))
+                if cursor.fetchone() is None:
+                    return False
+                
+                cursor.execute(
+                    sql.SQL("DROP TABLE IF EXISTS {}").format(sql.Identifier(partition_name(collection)))
+                )
+                
+                # Catalog rows go with the collection via ON DELETE CASCADE
+                cursor.execute("DELETE FROM collections WHERE name = %s", (collection,))
+                conn.commit()
+            
+            self._known_collections.discard(collection)
+            print(f"Successfully dropped collection: {collection}")
+            return True
+        except Exception as e:
+            raise Exception(f"Error dropping collection '{collection}': {str(e)}")
+    
+    def _stream_rows(self, conn, name: str, query: str, params: tuple) -> Iterator[tuple]:
+        """Iterate a query's rows through a named server-side cursor, a batch at a time"""
+        with conn.cursor(name=name) as cursor:
+            cursor.itersize = SNAPSHOT_BATCH_SIZE
+            cursor.execute(query, params)
+            yield from cursor
+    
+    def export_snapshot(self, fileobj: BinaryIO, collections: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Write collections (default: all) to a snapshot archive.
+        
+        Everything is read in one repeatable-read transaction, so the
+        archive is consistent even while documents are being ingested.
+        Only active documents are exported. Returns the manifest.
+        """
+        conn = self._get_connection()
+        try:
+            # register_vector() leaves a transaction open; end it first
+            conn.commit()
+            conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+            cursor = conn.cursor()
+            cursor.execute("SELECT name FROM collections ORDER BY name")
+            existing = [row[0] for row in cursor.fetchall()]
+            for collection in collections or []:
+                if collection not in existing:
+                    raise SnapshotError(f"Collection '{collection}' not found")
+            
+            writer = SnapshotWriter(fileobj, self.embeddings.model)
+            for collection in collections or existing:
+                cursor.execute("""
+                    SELECT id, filename, content_hash, page_count, chunk_count, byte_size, metadata, ingested_at
+                    FROM document_catalog
+                    WHERE collection = %s AND status = 'active'
+                    ORDER BY id
+                """, (collection,))
+                catalog = cursor.fetchall()
+                positions = {row[0]: index for index, row in enumerate(catalog)}
+                documents = [
+                    {
+                        "filename": filename,
+                        "content_hash": content_hash,
+                        "page_count": page_count,
+                        "chunk_count": chunk_count,
+                        "byte_size": byte_size,
+                        "metadata": metadata,
+                        "ingested_at": ingested_at.isoformat() if ingested_at else None
+                    }
+                    for _, filename, content_hash, page_count, chunk_count, byte_size, metadata, ingested_at in catalog
+                ]
+                
+                chunk_rows = """
+                    FROM documents d
+                    JOIN document_catalog c ON c.id = d.document_id
+                    WHERE d.collection = %s AND c.status = 'active'
+                """
+                cursor.execute(f"SELECT COUNT(*) {chunk_rows}", (collection,))
+                chunk_count = cursor.fetchone()[0]
+                
+                writer.write_collection(
+                    collection,
+                    documents,
+                    chunk_count,
+                    (
+                        {"document": positions[document_id], "chunk_id": chunk_id, "content": content, "metadata": metadata}
+                        for document_id, chunk_id, content, metadata in self._stream_rows(
+                            conn, "snapshot_chunks", f"SELECT d.document_id, d.chunk_id, d.content, d.metadata {chunk_rows} ORDER BY d.id", (collection,)
+                        )
+                    ),
+                    (
+                        # As real[], which reads the same whatever pgvector's Python version returns
+                        row[0] for row in self._stream_rows(
+                            conn, "snapshot_embeddings", f"SELECT d.embedding::real[] {chunk_rows} ORDER BY d.id", (collection,)
+                        )
+                    ),
+                    (
+                        {
+                            "document": positions[document_id],
+                            "chunk_id": chunk_id,
+                            "canonical_document": positions[canonical_document_id],
+                            "canonical_chunk_id": canonical_chunk_id,
+                            "similarity": similarity,
+                            "content_bytes": content_bytes,
+                            "metadata": metadata
+                        }
+                        for document_id, chunk_id, canonical_document_id, canonical_chunk_id, similarity, content_bytes, metadata
+                        in self._stream_rows(conn, "snapshot_references", """
+                            SELECT r.document_id, r.chunk_id, d.document_id, d.chunk_id,
+                                   r.similarity, r.content_bytes, r.metadata
+                            FROM chunk_refs r
+                            JOIN document_catalog c ON c.id = r.document_id
+                            JOIN documents d ON d.collection = r.collection AND d.id = r.canonical_id
+                            WHERE r.collection = %s AND c.status = 'active'
+                            ORDER BY r.id
+                        """, (collection,))
+                        if canonical_document_id in positions
+                    )
+                )
+            conn.commit()
+            return writer.close()
+        except SnapshotError:
+            raise
+        except Exception as e:
+            raise Exception(f"Error exporting snapshot: {str(e)}")
+        finally:
+            conn.close()
+    
+    def import_snapshot(self, fileobj: BinaryIO) -> Dict[str, Dict[str, int]]:
+        """Load every collection of a snapshot archive without calling the embedding API.
+        
+        Imported documents replace active documents with the same filename,
+        as an upload would; other documents are left alone. Each collection
+        loads in one transaction, with chunks streamed in through COPY.
+        """
+        reader = SnapshotReader(fileobj)
+        reader.check_model(self.embeddings.model)
+        for collection in reader.collections():
+            validate_collection_name(collection)
+        
+        imported = {}
+        for collection in reader.collections():
+            try:
+                imported[collection] = self._import_collection(reader, collection)
+            except SnapshotError:
+                raise
+            except Exception as e:
+                raise Exception(f"Error importing collection '{collection}': {str(e)}")
+            logger.info(f"Imported snapshot of '{collection}': {imported[collection]}")
+        return imported
+    
+    def _import_collection(self, reader: SnapshotReader, collection: str) -> Dict[str, int]:
+        documents = reader.documents(collection)
+        self._ensure_collection(collection)
+        
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("""
+                UPDATE document_catalog SET status = 'deleted', deleted_at = CURRENT_TIMESTAMP
+                WHERE collection = %s AND status = 'active' AND filename = ANY(%s)
+                RETURNING id
+            """, (collection, [document["filename"] for document in documents]))
+            previous_ids = [row[0] for row in cursor.fetchall()]
+            
+            document_ids = []
+            if documents:
+                inserted = execute_values(cursor, """
+                    INSERT INTO document_catalog
+                        (collection, filename, content_hash, page_count, chunk_count, byte_size, metadata, status, ingested_at)
+                    VALUES %s
+                    RETURNING filename, id
+                """, [
+                    (
+                        collection,
+                        document["filename"],
+                        document.get("content_hash"),
+                        document.get("page_count", 0),
+                        document.get("chunk_count", 0),
+                        document.get("byte_size"),
+                        json.dumps(document.get("metadata") or {}),
+                        "active",
+                        document.get("ingested_at")
+                    )
+                    for document in documents
+                ], template="(%s, %s, %s, %s, %s, %s, %s, %s, COALESCE(%s::timestamp, CURRENT_TIMESTAMP))", fetch=True)
+                ids_by_filename = dict(inserted)
+                document_ids = [ids_by_filename[document["filename"]] for document in documents]
+            
+            # Chunks go in with COPY, one batch of rows at a time
+            chunk_count = 0
+            for batch, vectors in reader.chunk_batches(collection):
+                buffer = io.StringIO()
+                for chunk, vector in zip(batch, vectors):
+                    signature = self.dedup.signature(chunk["content"]) if self.dedup.enabled else None
+                    buffer.write("\t".join([
+                        _copy_text(collection),
+                        str(document_ids[chunk["document"]]),
+                        str(chunk["chunk_id"]),
+                        _copy_text(chunk["content"]),
+                        "[" + ",".join(vector.astype(str)) + "]",
+                        _copy_text(json.dumps(chunk["metadata"])),
+                        "\\\\x" + signature.tobytes().hex() if signature is not None else "\\N",
+                        "{" + ",".join(map(str, self.dedup.band_keys(signature))) + "}" if signature is not None else "\\N"
+                    ]))
+                    buffer.write("\n")
+                buffer.seek(0)
+                cursor.copy_expert("""
+                    COPY documents (collection, document_id, chunk_id, content, embedding, metadata, minhash, minhash_bands)
+                    FROM STDIN
+                """, buffer)
+                chunk_count += len(batch)
+            
+            references = []
+            if document_ids:
+                cursor.execute(
+                    "SELECT document_id, chunk_id, id FROM documents WHERE collection = %s AND document_id = ANY(%s)",
+                    (collection, document_ids)
+                )
+                rows = {(document_id, chunk_id): row_id for document_id, chunk_id, row_id in cursor.fetchall()}
+                references = [
+                    (
+                        collection,
+                        document_ids[reference["document"]],
+                        reference["chunk_id"],
+                        canonical_row_id(rows, document_ids, reference, collection),
+                        reference["similarity"],
+                        reference["content_bytes"],
+                        json.dumps(reference["metadata"])
+                    )
+                    for reference in reader.references(collection)
+                ]
+            if references:
+                execute_values(cursor, """
+                    INSERT INTO chunk_refs
+                        (collection, document_id, chunk_id, canonical_id, similarity, content_bytes, metadata)
+                    VALUES %s
+                """, references)
+            
+            # References from other documents to the ones replaced keep a copy
+            self._promote_references(cursor, collection, previous_ids, [])
+            self._bump_collection_version(cursor, collection)
+            conn.commit()
+        
+        # Fit the partition's ivfflat lists to the bulk-loaded rows
+        with self._get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT COALESCE(SUM(chunk_count), 0) FROM document_catalog
+                WHERE collection = %s AND status = 'active'
+            """, (collection,))
+            (active_chunks,) = cursor.fetchone()
+            conn.commit()
+        if chunk_count and active_chunks >= self.ivfflat_min_chunks:
+            self._build_vector_indexes({collection: active_chunks})
+        
+        return {
+            "documents": len(documents),
+            "chunks": chunk_count,
+            "references": len(references),
+            "replaced": len(previous_ids)
+        }
+    
+    def _run_maintenance(self, statements: List[sql.Composable]):
+        """Run statements that cannot execute inside a transaction block"""
+        conn = self._get_connection()
+        try:
+            # register_vector() leaves a transaction open; end it first
+            conn.commit()
+            conn.autocommit = True
+            cursor = conn.cursor()
+            for statement in statements:
+                cursor.execute(statement)
+        finally:
+            conn.close()
+    
+    def compact(self) -> Dict[str, Any]:
+        """Purge tombstoned documents, then build or refresh partition indexes"""
+        stats = self._purge_tombstones()
+        stats["indexed"] = self.maintain_indexes()
+        return stats
+    
+    def _purge_tombstones(self) -> Dict[str, Any]:
+        """Physically purge tombstoned documents and maintain chunk partitions.
+        
+        Each collection is handled on its own partition: with no active
+        documents left the partition is truncated outright and its index
+        dropped, otherwise chunk rows are deleted in bounded batches.
+        Afterwards the partition's dead-row ratio decides whether to VACUUM
+        it and whether to rebuild its ivfflat index, whose lists go stale as
+        rows churn.
+        """
+        stats = {"purged_documents": 0, "purged_chunks": 0, "truncated": [], "vacuumed": [], "reindexed": []}
+        
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT collection,
+                           COUNT(*) FILTER (WHERE status = 'active'),
+                           COALESCE(SUM(chunk_count) FILTER (WHERE status = 'active'), 0)
+                    FROM document_catalog
+                    GROUP BY collection
+                    HAVING COUNT(*) FILTER (WHERE status = 'deleted') > 0
+                """)
+                pending = cursor.fetchall()
+                conn.commit()
+                
+                maintenance = []
+                stale = {}
+                for collection, active, live_chunks in pending:
+                    partition = sql.Identifier(partition_name(collection))
+                    purged_chunks = 0
+                    truncated = False
+                    
+                    if active == 0:
+                        # Re-check under lock so a concurrent ingest is never truncated away
+                        cursor.execute("LOCK TABLE document_catalog IN SHARE ROW EXCLUSIVE MODE")
+                        cursor.execute("""
+                            SELECT COUNT(*) FILTER (WHERE status = 'active'), COALESCE(SUM(chunk_count), 0)
+                            FROM document_catalog WHERE collection = %s
+                        """, (collection,))
+                        still_active, purged_chunks = cursor.fetchone()
+                        if still_active == 0:
+                            cursor.execute(sql.SQL("TRUNCATE {}").format(partition))
+                            # Rebuilt by maintain_indexes() once the partition refills
+                            cursor.execute(sql.SQL("DROP INDEX IF EXISTS {}").format(
+                                sql.Identifier(self._vector_index_name(collection))
+                            ))
+                            cursor.execute(
+                                "UPDATE collections SET indexed_rows = 0, index_lists = 0 WHERE name = %s",
+                                (collection,)
+                            )
+                            cursor.execute("DELETE FROM document_catalog WHERE collection = %s", (collection,))
+                            stats["purged_documents"] += cursor.rowcount
+                            stats["truncated"].append(collection)
+                            truncated = True
+                        conn.commit()
+                    
+                    if not truncated:
+                        purged_chunks = 0
+                        while True:
+                            cursor.execute(sql.SQL("""
+                                DELETE FROM {partition} WHERE id IN (
+                                    SELECT d.id FROM {partition} d
+                                    JOIN document_catalog c ON c.id = d.document_id
+                                    WHERE c.status = 'deleted'
+                                    LIMIT %s
+                                )
+                            """).format(partition=partition), (self.compaction_batch_size,))
+                            purged = cursor.rowcount
+                            conn.commit()
+                            purged_chunks += purged
+                            if purged < self.compaction_batch_size:
+                                break
+                        
+                        cursor.execute(
+                            "DELETE FROM document_catalog WHERE collection = %s AND status = 'deleted'",
+                            (collection,)
+                        )
+                        stats["purged_documents"] += cursor.rowcount
+                        conn.commit()
+                        
+                        cursor.execute("""
+                            SELECT COALESCE(n_dead_tup, 0) FROM pg_stat_user_tables
+                            WHERE relname = %s AND schemaname = current_schema()
+                        """, (partition_name(collection),))
+                        row = cursor.fetchone()
+                        conn.commit()
+                        dead = max(row[0] if row else 0, purged_chunks)
+                        dead_ratio = dead / max(dead + live_chunks, 1)
+                        
+                        if dead_ratio >= self.vacuum_dead_ratio:
+                            maintenance.append(sql.SQL("VACUUM (ANALYZE) {}").format(partition))
+                            stats["vacuumed"].append(collection)
+                        if dead_ratio >= self.reindex_dead_ratio and live_chunks >= self.ivfflat_min_chunks:
+                            stale[collection] = live_chunks
+                            stats["reindexed"].append(collection)
+                    
+                    stats["purged_chunks"] += purged_chunks
+            
+            if maintenance:
+                self._run_maintenance(maintenance)
+            if stale:
+                self._build_vector_indexes(stale)
+            
+            logger.info(f"Compaction complete: {stats}")
+            return stats
+            
+        except Exception as e:
+            raise Exception(f"Error compacting documents: {str(e)}")
+    
+    def maintain_indexes(self) -> List[str]:
+        """Build, rebuild or drop partition ivfflat indexes as collections change.
+        
+        A partition gets its index once its collection reaches
+        IVFFLAT_MIN_CHUNKS active chunks and loses it below half that. The
+        index is rebuilt, with lists refitted, whenever the collection has
+        grown or shrunk by IVFFLAT_REBUILD_FACTOR since it was built. Returns
+        the collections whose index was (re)built.
+        """
+        try:
+            with self._get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT col.name, col.indexed_rows, COALESCE(SUM(c.chunk_count), 0)
+                    FROM collections col
+                    LEFT JOIN document_catalog c ON c.collection = col.name AND c.status = 'active'
+                    GROUP BY col.name, col.indexed_rows
+                """)
+                counts = cursor.fetchall()
+                cursor.execute("SELECT indexname FROM pg_indexes WHERE schemaname = current_schema()")
+                indexes = {name for (name,) in cursor.fetchall()}
+                conn.commit()
+            
+            due = {}
+            dropped = []
+            for collection, indexed_rows, count in counts:
+                if self._vector_index_name(collection) not in indexes:
+                    if count >= self.ivfflat_min_chunks:
+                        due[collection] = count
+                elif count < self.ivfflat_min_chunks / 2:
+                    dropped.append(collection)
+                elif count >= indexed_rows * self.ivfflat_rebuild_factor or count * self.ivfflat_rebuild_factor <= indexed_rows:
+                    due[collection] = count
+            
+            if dropped:
+                self._drop_vector_indexes(dropped)
+                logger.info(f"Dropped ivfflat indexes of {dropped}: their chunks are searched exactly")
+            if due:
+                self._build_vector_indexes(due)
+                logger.info(f"Built ivfflat indexes for {sorted(due)}")
+            return sorted(due)
+            
+        except Exception as e:
+            raise Exception(f"Error maintaining indexes: {str(e)}")
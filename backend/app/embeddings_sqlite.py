@@ -1,10 +1,26 @@
 import os
 import json
+import logging
 import sqlite3
-from typing import List, Dict, Any
+import threading
+from itertools import islice
+from typing import List, Dict, Any, BinaryIO, Optional, Tuple
 from langchain_openai import OpenAIEmbeddings
+from openai import OpenAI
 import numpy as np
 from pathlib import Path
+from .embedding_batcher import EmbeddingBatcher
+from .pdf_loader import DOCUMENT_METADATA_KEYS, split_document_metadata
+from .collection_names import DEFAULT_COLLECTION, validate_collection_name
+from .single_flight import SingleFlight, normalize_question
+from .near_duplicates import Link, NearDuplicateDetector, dedup_stats, localize_links, space_report
+from .snapshot import SNAPSHOT_BATCH_SIZE, SnapshotError, SnapshotReader, SnapshotWriter, canonical_row_id
+from .ivf_index import (
+    IVF_ENABLED, IVF_KMEANS_ITERATIONS, IVF_MIN_CHUNKS, IVF_NLIST, IVF_NPROBE, IVF_RETRAIN_FACTOR,
+    IVF_TRAIN_POINTS_PER_LIST, IVFIndex, default_nlist, normalize_rows, recall_report, train_centroids
+)
+
+logger = logging.getLogger(__name__)
 
 class EmbeddingManager:
     def __init__(self):
@@ -13,111 +29,821 @@ class EmbeddingManager:
         if not self.openai_api_key:
             raise ValueError("OPENAI_API_KEY environment variable is required")
         
+        # Optional OpenAI-compatible endpoint, e.g. the local fake server for load tests
+        self.openai_base_url = os.environ.get("OPENAI_BASE_URL") or None
+        
         # Initialize OpenAI embeddings
         self.embeddings = OpenAIEmbeddings(
             api_key=self.openai_api_key,
-            model="text-embedding-3-small"  # Latest embedding model
+            base_url=self.openai_base_url,
+            model="text-embedding-3-small",  # Latest embedding model
+            # Chunks are far below the model's context length; skipping the
+            # tiktoken pre-check also keeps OpenAI-compatible servers working
+            check_embedding_ctx_length=False
+        )
+        
+        # Document embeddings go through token-packed, concurrent, rate-limit
+        # aware batches; the batcher does its own retries, so the client doesn't
+        self.batcher = EmbeddingBatcher(
+            OpenAI(api_key=self.openai_api_key, base_url=self.openai_base_url, max_retries=0),
+            model=self.embeddings.model
         )
         
+        # Deleted documents are tombstoned and purged later by compact()
+        self.compaction_batch_size = int(os.environ.get("COMPACTION_BATCH_SIZE", "5000"))
+        self.vacuum_dead_ratio = float(os.environ.get("VACUUM_DEAD_RATIO", "0.2"))
+        
+        # Normalized float32 embedding matrix per collection, rebuilt when
+        # the collection's version changes: {collection: (version, ids, matrix)}
+        self._matrices: Dict[str, Tuple[int, np.ndarray, np.ndarray]] = {}
+        self._matrices_lock = threading.Lock()
+        
+        # Concurrent identical queries share one query embedding call
+        self.query_flight = SingleFlight("query embedding")
+        
+        # Near-duplicate chunks are stored once and referenced by later copies
+        self.dedup = NearDuplicateDetector()
+        
         # Create local SQLite database
         self.db_path = Path("docuchatai.db")
         self._setup_database()
+        
+        # Large collections are searched through an IVF index, kept in
+        # memory and persisted next to the database: {collection: index}
+        self.index_dir = self.db_path.with_suffix(".ivf")
+        self.ivf_nprobe = IVF_NPROBE
+        self._indexes: Dict[str, IVFIndex] = {}
     
     def _setup_database(self):
         """Setup SQLite database and tables"""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             
-            # Create documents table
+            # Move chunks stored by filename over to the catalog layout
+            self._migrate_legacy_documents(cursor)
+            
+            self._create_tables(cursor)
+            
+            conn.commit()
+    
+    def _create_tables(self, cursor):
+        """Create collections, the document catalog and the chunk table"""
+        # One row per collection; version changes whenever its documents do
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS collections (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("INSERT OR IGNORE INTO collections (name) VALUES (?)", (DEFAULT_COLLECTION,))
+        
+        # One row per document; listing documents never touches chunk rows
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS document_catalog (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                collection TEXT NOT NULL DEFAULT 'default',
+                filename TEXT NOT NULL,
+                content_hash TEXT,
+                page_count INTEGER NOT NULL DEFAULT 0,
+                chunk_count INTEGER NOT NULL DEFAULT 0,
+                byte_size INTEGER,
+                metadata TEXT NOT NULL DEFAULT '{}',  -- Store as JSON string
+                status TEXT NOT NULL DEFAULT 'active',  -- 'active' or 'deleted' (tombstone)
+                ingested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                deleted_at TIMESTAMP
+            )
+        """)
+        self._add_missing_column(cursor, "document_catalog", "deleted_at", "TIMESTAMP")
+        self._add_missing_column(cursor, "document_catalog", "collection", "TEXT NOT NULL DEFAULT 'default'")
+        
+        # Each ingest is a new generation; only one may be active per filename
+        cursor.execute("DROP INDEX IF EXISTS idx_document_catalog_filename")
+        cursor.execute("DROP INDEX IF EXISTS idx_document_catalog_active_filename")
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_document_catalog_active_collection_filename 
+            ON document_catalog(collection, filename) WHERE status = 'active'
+        """)
+        
+        # Create documents table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                collection TEXT NOT NULL DEFAULT 'default',
+                document_id INTEGER NOT NULL REFERENCES document_catalog(id),
+                chunk_id INTEGER NOT NULL,
+                content TEXT NOT NULL,
+                embedding BLOB NOT NULL,  -- float32 bytes (older rows: JSON string)
+                metadata TEXT NOT NULL,   -- Store as JSON string
+                minhash BLOB,             -- MinHash signature, for near-duplicate detection
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        self._add_missing_column(cursor, "documents", "collection", "TEXT NOT NULL DEFAULT 'default'")
+        self._add_missing_column(cursor, "documents", "minhash", "BLOB")
+        
+        # Create index for per-document chunk lookups
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_documents_document_id 
+            ON documents(document_id)
+        """)
+        
+        # Create index for loading one collection's embeddings
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_documents_collection 
+            ON documents(collection)
+        """)
+        
+        # LSH band keys of each stored chunk's signature, to find chunks
+        # sharing a band with new ones at ingest
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS minhash_bands (
+                band_key INTEGER NOT NULL,
+                chunk_row INTEGER NOT NULL,  -- documents.id
+                PRIMARY KEY (band_key, chunk_row)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_minhash_bands_chunk_row 
+            ON minhash_bands(chunk_row)
+        """)
+        
+        # Near-duplicate chunks: each document keeps its own reference, with
+        # its page span, to one canonical chunk row in the same collection
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS chunk_refs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                collection TEXT NOT NULL,
+                document_id INTEGER NOT NULL REFERENCES document_catalog(id),
+                chunk_id INTEGER NOT NULL,
+                canonical_id INTEGER NOT NULL,  -- documents.id of the stored copy
+                similarity REAL NOT NULL,
+                content_bytes INTEGER NOT NULL,
+                metadata TEXT NOT NULL,  -- Store as JSON string
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_chunk_refs_canonical 
+            ON chunk_refs(canonical_id)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_chunk_refs_document_id 
+            ON chunk_refs(document_id)
+        """)
+    
+    def _add_missing_column(self, cursor, table: str, column: str, definition: str):
+        """Add a column to an existing table if an older schema lacks it"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column not in [row[1] for row in cursor.fetchall()]:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+    
+    def _migrate_legacy_documents(self, cursor):
+        """Convert a filename-keyed documents table into catalog + chunk tables"""
+        cursor.execute("PRAGMA table_info(documents)")
+        if "filename" not in [row[1] for row in cursor.fetchall()]:
+            return
+        
+        # Free the index name for the new table before recreating it
+        cursor.execute("ALTER TABLE documents RENAME TO documents_legacy")
+        cursor.execute("DROP INDEX IF EXISTS idx_documents_filename")
+        
+        self._create_tables(cursor)
+        
+        cursor.execute("""
+            INSERT INTO document_catalog (filename, page_count, chunk_count, metadata, ingested_at)
+            SELECT filename,
+                   COALESCE(MAX(json_extract(metadata, '$.total_pages')), 0),
+                   COUNT(*),
+                   json_object(
+                       'successful_pages', MAX(json_extract(metadata, '$.successful_pages')),
+                       'failed_pages', MAX(json_extract(metadata, '$.failed_pages'))
+                   ),
+                   MIN(created_at)
+            FROM documents_legacy
+            GROUP BY filename
+        """)
+        cursor.execute(f"""
+            INSERT INTO documents (document_id, chunk_id, content, embedding, metadata, created_at)
+            SELECT c.id, l.chunk_id, l.content, l.embedding,
+                   json_remove(l.metadata, {", ".join(f"'$.{key}'" for key in DOCUMENT_METADATA_KEYS)}),
+                   l.created_at
+            FROM documents_legacy l
+            JOIN document_catalog c ON c.filename = l.filename
+        """)
+        cursor.execute("DROP TABLE documents_legacy")
+    
+    def _bump_collection_version(self, cursor, collection: str):
+        """Create the collection if needed and mark its contents as changed"""
+        cursor.execute("INSERT OR IGNORE INTO collections (name) VALUES (?)", (collection,))
+        cursor.execute("UPDATE collections SET version = version + 1 WHERE name = ?", (collection,))
+    
+    def get_collection_version(self, collection: str = DEFAULT_COLLECTION) -> int:
+        """Current version of a collection's document set (0 if it doesn't exist)"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT version FROM collections WHERE name = ?", (collection,))
+                row = cursor.fetchone()
+                return row[0] if row else 0
+        except Exception as e:
+            raise Exception(f"Error reading collection version: {str(e)}")
+    
+    @staticmethod
+    def _decode_embedding(value) -> np.ndarray:
+        """Decode a stored embedding (float32 bytes, or JSON from older rows)"""
+        if isinstance(value, (bytes, memoryview)):
+            return np.frombuffer(value, dtype=np.float32)
+        return np.asarray(json.loads(value), dtype=np.float32)
+    
+    def _get_matrix(self, cursor, collection: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (chunk ids, normalized embedding matrix) for a collection.
+        
+        The matrix is cached in memory and only rebuilt from the database
+        when the collection's version has moved on, so a query costs one
+        matrix-vector product over its own collection rather than a scan
+        and JSON parse of every stored chunk.
+        """
+        cursor.execute("SELECT version FROM collections WHERE name = ?", (collection,))
+        row = cursor.fetchone()
+        if row is None:
+            return np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+        version = row[0]
+        
+        with self._matrices_lock:
+            cached = self._matrices.get(collection)
+            if cached is not None and cached[0] == version:
+                return cached[1], cached[2]
+            
+            cursor.execute("""
+                SELECT d.id, d.embedding
+                FROM documents d
+                JOIN document_catalog c ON c.id = d.document_id
+                WHERE d.collection = ? AND c.status = 'active'
+                ORDER BY d.id
+            """, (collection,))
+            rows = cursor.fetchall()
+            
+            ids = np.array([row[0] for row in rows], dtype=np.int64)
+            if rows:
+                matrix = np.vstack([self._decode_embedding(row[1]) for row in rows])
+                norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+                matrix /= np.where(norms == 0, 1, norms)
+            else:
+                matrix = np.empty((0, 0), dtype=np.float32)
+            
+            self._matrices[collection] = (version, ids, matrix)
+            return ids, matrix
+    
+    def _index_path(self, collection: str) -> Path:
+        return self.index_dir / f"{collection}.npz"
+    
+    def _drop_index(self, collection: str):
+        """Forget a collection's index in memory and on disk; caller holds _matrices_lock"""
+        self._indexes.pop(collection, None)
+        self._index_path(collection).unlink(missing_ok=True)
+    
+    def _load_index(self, cursor, collection: str) -> Optional[IVFIndex]:
+        """The collection's index from memory or disk, if it has one; caller holds _matrices_lock"""
+        index = self._indexes.get(collection)
+        path = self._index_path(collection)
+        if index is not None or not path.exists():
+            return index
+        
+        try:
+            index = IVFIndex.load(path)
+        except Exception as e:
+            logger.warning(f"Discarding unreadable index of '{collection}': {str(e)}")
+            self._drop_index(collection)
+            return None
+        
+        # An index from another database file has seen rows this one never had
+        cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'documents'")
+        if index.watermark > cursor.fetchone()[0]:
+            logger.warning(f"Discarding index of '{collection}' that doesn't match {self.db_path}")
+            self._drop_index(collection)
+            return None
+        
+        self._indexes[collection] = index
+        return index
+    
+    def _add_rows(self, index: IVFIndex, rows) -> int:
+        """Add (row id, document id, embedding) rows to an index in batches; returns the highest row id"""
+        watermark = 0
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, SNAPSHOT_BATCH_SIZE))
+            if not batch:
+                return watermark
+            index.add(
+                [row[0] for row in batch],
+                [row[1] for row in batch],
+                normalize_rows(np.vstack([self._decode_embedding(row[2]) for row in batch]))
+            )
+            watermark = batch[-1][0]
+    
+    def _get_index(self, cursor, collection: str) -> Optional[IVFIndex]:
+        """Return the collection's IVF index caught up with the database, or None without one.
+        
+        Catching up is incremental. Chunk row ids only grow, so chunks added
+        since the last sync are those above the index's watermark, and
+        documents tombstoned since then are the indexed ones no longer active.
+        """
+        if not IVF_ENABLED:
+            return None
+        cursor.execute("SELECT version FROM collections WHERE name = ?", (collection,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        version = row[0]
+        
+        with self._matrices_lock:
+            index = self._load_index(cursor, collection)
+            if index is None or index.version == version:
+                return index
+            
+            cursor.execute(
+                "SELECT id FROM document_catalog WHERE collection = ? AND status = 'active'",
+                (collection,)
+            )
+            active = {row[0] for row in cursor.fetchall()}
+            removed = index.remove_documents(index.document_ids - active)
+            
             cursor.execute("""
-                CREATE TABLE IF NOT EXISTS documents (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    filename TEXT NOT NULL,
-                    chunk_id INTEGER NOT NULL,
-                    content TEXT NOT NULL,
-                    embedding TEXT NOT NULL,  -- Store as JSON string
-                    metadata TEXT NOT NULL,   -- Store as JSON string
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                SELECT d.id, d.document_id, d.embedding
+                FROM documents d
+                JOIN document_catalog c ON c.id = d.document_id
+                WHERE d.collection = ? AND c.status = 'active' AND d.id > ?
+                ORDER BY d.id
+            """, (collection, index.watermark))
+            before = len(index)
+            index.watermark = max(index.watermark, self._add_rows(index, cursor))
+            index.version = version
+            logger.info(f"Index of '{collection}' caught up to version {version}: +{len(index) - before} -{removed} chunks")
+            return index
+    
+    def build_index(self, collection: str = DEFAULT_COLLECTION, nlist: Optional[int] = None) -> Dict[str, Any]:
+        """Train an IVF index on a collection's stored embeddings and persist it.
+        
+        k-means runs on a random sample of the chunks, then every chunk is
+        streamed into its list. Searches keep using the previous index, or
+        exact search, until the new one is ready.
+        """
+        validate_collection_name(collection)
+        try:
+            conn = sqlite3.connect(self.db_path, isolation_level=None)
+            try:
+                cursor = conn.cursor()
+                cursor.execute("BEGIN")
+                cursor.execute("SELECT version FROM collections WHERE name = ?", (collection,))
+                row = cursor.fetchone()
+                if row is None:
+                    raise ValueError(f"Collection '{collection}' not found")
+                version = row[0]
+                
+                active_rows = """
+                    FROM documents d
+                    JOIN document_catalog c ON c.id = d.document_id
+                    WHERE d.collection = ? AND c.status = 'active'
+                """
+                cursor.execute(f"SELECT d.id {active_rows}", (collection,))
+                ids = np.fromiter((row[0] for row in cursor.fetchall()), dtype=np.int64)
+                if len(ids) == 0:
+                    raise ValueError(f"Collection '{collection}' has no chunks to index")
+                
+                nlist = nlist or IVF_NLIST or default_nlist(len(ids))
+                sample_ids = np.random.default_rng(0).choice(
+                    ids, size=min(len(ids), nlist * IVF_TRAIN_POINTS_PER_LIST), replace=False
                 )
-            """)
+                sample = normalize_rows(np.vstack([
+                    self._decode_embedding(row[0]) for row in self._stream_rows(
+                        conn, "SELECT embedding FROM documents WHERE id IN (SELECT value FROM json_each(?))",
+                        (json.dumps(sample_ids.tolist()),)
+                    )
+                ]))
+                index = IVFIndex(train_centroids(sample, nlist, IVF_KMEANS_ITERATIONS))
+                
+                index.watermark = self._add_rows(index, self._stream_rows(
+                    conn, f"SELECT d.id, d.document_id, d.embedding {active_rows} ORDER BY d.id", (collection,)
+                ))
+                index.version = version
+                index.trained_size = len(ids)
+                cursor.execute("COMMIT")
+            finally:
+                conn.close()
+            
+            index.save(self._index_path(collection))
+            with self._matrices_lock:
+                self._indexes[collection] = index
+                self._matrices.pop(collection, None)
             
-            # Create index for filename lookups
+            stats = index.stats()
+            logger.info(f"Built index of '{collection}': {stats}")
+            return stats
+        except ValueError:
+            raise
+        except Exception as e:
+            raise Exception(f"Error building index of '{collection}': {str(e)}")
+    
+    def maintain_indexes(self) -> List[str]:
+        """Build, retrain, save or drop collection indexes as collections change.
+        
+        A collection gets an index once it reaches IVF_MIN_CHUNKS active
+        chunks and loses it below half that. An index is retrained when the
+        collection has grown or shrunk by IVF_RETRAIN_FACTOR since training,
+        and saved once 5% of it has changed since the last save; between
+        saves, a restarted process catches up from the database. Returns the
+        collections whose index was (re)built.
+        """
+        if not IVF_ENABLED:
+            return []
+        
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
             cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_documents_filename 
-                ON documents(filename)
+                SELECT d.collection, COUNT(*)
+                FROM documents d
+                JOIN document_catalog c ON c.id = d.document_id
+                WHERE c.status = 'active'
+                GROUP BY d.collection
             """)
+            counts = dict(cursor.fetchall())
+            indexed = {path.stem for path in self.index_dir.glob("*.npz")} | set(self._indexes)
+            
+            built = []
+            for collection in sorted(set(counts) | indexed):
+                count = counts.get(collection, 0)
+                try:
+                    index = self._get_index(cursor, collection)
+                    if index is None:
+                        if count >= IVF_MIN_CHUNKS:
+                            self.build_index(collection)
+                            built.append(collection)
+                    elif count < IVF_MIN_CHUNKS / 2:
+                        with self._matrices_lock:
+                            self._drop_index(collection)
+                        logger.info(f"Dropped index of '{collection}': {count} chunks are searched exactly")
+                    elif count >= index.trained_size * IVF_RETRAIN_FACTOR or count * IVF_RETRAIN_FACTOR <= index.trained_size:
+                        self.build_index(collection)
+                        built.append(collection)
+                    elif index.unsaved_changes * 20 >= len(index):
+                        index.save(self._index_path(collection))
+                except Exception as e:
+                    logger.error(f"Index maintenance of '{collection}' failed: {str(e)}")
+            return built
+    
+    def index_report(
+        self,
+        collection: str = DEFAULT_COLLECTION,
+        k: int = 10,
+        queries: int = 200,
+        nprobes: Tuple[int, ...] = (1, 2, 4, 8, 16, 32, 64)
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """Recall@k and latency of the collection's index per nprobe, against exact search.
+        
+        Queries are stored chunks of the collection, each excluded from its
+        own results. Builds the index first if the collection has none.
+        """
+        validate_collection_name(collection)
+        with sqlite3.connect(self.db_path) as conn:
+            index = self._get_index(conn.cursor(), collection)
+        if index is None:
+            self.build_index(collection)
+            index = self._indexes[collection]
+        query_ids, query_vectors = index.sample(queries, seed=1)
+        return recall_report(index, query_vectors, k, nprobes, exclude_ids=query_ids), index.stats()
+    
+    def _replace_document(
+        self,
+        filename: str,
+        text_chunks: List[Dict[str, Any]],
+        embedding_vectors: List[List[float]],
+        content_hash: Optional[str] = None,
+        byte_size: Optional[int] = None,
+        collection: str = DEFAULT_COLLECTION,
+        signatures: Optional[List[Optional[np.ndarray]]] = None,
+        links: Optional[List[Optional[Link]]] = None
+    ) -> Dict[int, int]:
+        """Replace a document's catalog entry and chunks in a single transaction.
+        
+        Chunks with a link are stored as references to their canonical chunk
+        rather than with their own text and embedding. Returns the row id of
+        each chunk stored in full, by its position in text_chunks.
+        """
+        validate_collection_name(collection)
+        document_metadata, chunk_metadata = split_document_metadata(text_chunks)
+        signatures = signatures or [None] * len(text_chunks)
+        links = links or [None] * len(text_chunks)
+        
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            self._bump_collection_version(cursor, collection)
+            
+            # Tombstone the previous generation; compact() purges its chunks
+            cursor.execute(
+                "SELECT id FROM document_catalog WHERE collection = ? AND filename = ? AND status = 'active'",
+                (collection, filename)
+            )
+            previous_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute("""
+                UPDATE document_catalog SET status = 'deleted', deleted_at = CURRENT_TIMESTAMP
+                WHERE collection = ? AND filename = ? AND status = 'active'
+            """, (collection, filename))
+            cursor.execute("""
+                INSERT INTO document_catalog
+                    (collection, filename, content_hash, page_count, chunk_count, byte_size, metadata, status)
+                VALUES (?, ?, ?, ?, ?, ?, ?, 'active')
+            """, (
+                collection,
+                filename,
+                content_hash,
+                document_metadata.get("total_pages", 0),
+                len(text_chunks),
+                byte_size,
+                json.dumps({
+                    key: document_metadata[key]
+                    for key in ("successful_pages", "failed_pages") if key in document_metadata
+                })
+            ))
+            document_id = cursor.lastrowid
+            
+            row_ids = {}
+            for index, link in enumerate(links):
+                if link is not None:
+                    continue
+                signature = signatures[index]
+                cursor.execute("""
+                    INSERT INTO documents (collection, document_id, chunk_id, content, embedding, metadata, minhash)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, (
+                    collection,
+                    document_id,
+                    text_chunks[index]["metadata"]["chunk_id"],
+                    text_chunks[index]["content"],
+                    np.asarray(embedding_vectors[index], dtype=np.float32).tobytes(),  # Store as float32 bytes
+                    json.dumps(chunk_metadata[index]),
+                    signature.tobytes() if signature is not None else None
+                ))
+                row_ids[index] = cursor.lastrowid
+                if signature is not None:
+                    cursor.executemany(
+                        "INSERT OR IGNORE INTO minhash_bands (band_key, chunk_row) VALUES (?, ?)",
+                        [(key, row_ids[index]) for key in self.dedup.band_keys(signature)]
+                    )
+            
+            cursor.executemany("""
+                INSERT INTO chunk_refs
+                    (collection, document_id, chunk_id, canonical_id, similarity, content_bytes, metadata)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (
+                    collection,
+                    document_id,
+                    text_chunks[index]["metadata"]["chunk_id"],
+                    row_ids[link[1]] if link[0] == "chunk" else link[1],
+                    link[2],
+                    len(text_chunks[index]["content"].encode("utf-8")),
+                    json.dumps(chunk_metadata[index])
+                )
+                for index, link in enumerate(links) if link is not None
+            ])
             
+            # Stored chunks this document links to may have been deleted since
+            # they were matched; the write lock now keeps them from changing
+            targets = sorted({link[1] for link in links if link is not None and link[0] == "row"})
+            if targets:
+                cursor.execute(
+                    "SELECT COUNT(*) FROM documents WHERE id IN (SELECT value FROM json_each(?))",
+                    (json.dumps(targets),)
+                )
+                if cursor.fetchone()[0] < len(targets):
+                    raise Exception("Chunks this document duplicates were purged during ingestion; upload it again")
+            self._promote_references(cursor, collection, previous_ids, targets)
             conn.commit()
+        
+        return row_ids
+    
+    def _promote_references(self, cursor, collection: str, document_ids: List[int], canonical_ids: List[int]):
+        """Give references whose canonical chunk was tombstoned a full row again.
+        
+        Covers canonical chunks of the given documents and the given chunk
+        rows. The oldest reference from a live document takes over the
+        canonical chunk's text, embedding and signature under its own page
+        span, and the remaining references are pointed at it.
+        """
+        if not document_ids and not canonical_ids:
+            return
+        
+        cursor.execute("""
+            SELECT id, canonical_id, document_id, chunk_id, metadata FROM chunk_refs
+            WHERE id IN (
+                SELECT MIN(r.id)
+                FROM chunk_refs r
+                JOIN documents d ON d.id = r.canonical_id
+                JOIN document_catalog canonical_doc ON canonical_doc.id = d.document_id
+                JOIN document_catalog reference_doc ON reference_doc.id = r.document_id
+                WHERE r.collection = ?
+                  AND (d.document_id IN (SELECT value FROM json_each(?))
+                       OR r.canonical_id IN (SELECT value FROM json_each(?)))
+                  AND canonical_doc.status = 'deleted' AND reference_doc.status = 'active'
+                GROUP BY r.canonical_id
+            )
+        """, (collection, json.dumps(list(document_ids)), json.dumps(list(canonical_ids))))
+        
+        for reference_id, canonical_id, document_id, chunk_id, metadata in cursor.fetchall():
+            cursor.execute("""
+                INSERT INTO documents (collection, document_id, chunk_id, content, embedding, metadata, minhash)
+                SELECT collection, ?, ?, content, embedding, ?, minhash FROM documents WHERE id = ?
+            """, (document_id, chunk_id, metadata, canonical_id))
+            promoted_id = cursor.lastrowid
+            cursor.execute(
+                "INSERT INTO minhash_bands (band_key, chunk_row) SELECT band_key, ? FROM minhash_bands WHERE chunk_row = ?",
+                (promoted_id, canonical_id)
+            )
+            cursor.execute("UPDATE chunk_refs SET canonical_id = ? WHERE canonical_id = ?", (promoted_id, canonical_id))
+            cursor.execute("DELETE FROM chunk_refs WHERE id = ?", (reference_id,))
     
-    def store_document_embeddings(self, text_chunks: List[Dict[str, Any]], filename: str):
-        """Generate embeddings for text chunks and store in SQLite database"""
+    def _link_duplicates(
+        self,
+        texts: List[str],
+        collection: str
+    ) -> Tuple[List[Optional[np.ndarray]], List[Optional[Link]]]:
+        """MinHash signatures of new chunks and their links to canonical chunks"""
+        if not self.dedup.enabled:
+            return [None] * len(texts), [None] * len(texts)
+        
+        signatures = [self.dedup.signature(text) for text in texts]
+        keys = sorted({key for signature in signatures for key in self.dedup.band_keys(signature)})
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT DISTINCT d.id, d.minhash FROM minhash_bands b
+                JOIN documents d ON d.id = b.chunk_row
+                JOIN document_catalog c ON c.id = d.document_id
+                WHERE b.band_key IN (SELECT value FROM json_each(?))
+                  AND d.collection = ? AND c.status = 'active'
+            """, (json.dumps(keys), collection))
+            existing = [(row_id, self.dedup.decode(minhash)) for row_id, minhash in cursor.fetchall()]
+        return signatures, self.dedup.link(signatures, existing)
+    
+    def store_document_embeddings(
+        self,
+        text_chunks: List[Dict[str, Any]],
+        filename: str,
+        content_hash: Optional[str] = None,
+        byte_size: Optional[int] = None,
+        collection: str = DEFAULT_COLLECTION
+    ) -> Dict[str, Any]:
+        """Generate embeddings for text chunks and store in SQLite database.
+        
+        Near-duplicates of stored chunks, or of earlier chunks in the same
+        document, are not embedded; they are stored as references.
+        """
         try:
-            # First, delete existing chunks for this document
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("DELETE FROM documents WHERE filename = ?", (filename,))
-                conn.commit()
+            texts = [chunk["content"] for chunk in text_chunks]
+            signatures, links = self._link_duplicates(texts, collection)
+            unique = [index for index, link in enumerate(links) if link is None]
             
-            # Process chunks in batches
-            batch_size = 10
-            for i in range(0, len(text_chunks), batch_size):
-                batch = text_chunks[i:i + batch_size]
-                
-                # Generate embeddings for batch
-                texts = [chunk["content"] for chunk in batch]
-                embedding_vectors = self.embeddings.embed_documents(texts)
-                
-                # Store in database
-                with sqlite3.connect(self.db_path) as conn:
-                    cursor = conn.cursor()
-                    for j, chunk in enumerate(batch):
-                        embedding_vector = embedding_vectors[j]
-                        
-                        # Store embedding as JSON string
-                        embedding_json = json.dumps(embedding_vector)
-                        metadata_json = json.dumps(chunk["metadata"])
-                        
-                        cursor.execute("""
-                            INSERT INTO documents (filename, chunk_id, content, embedding, metadata)
-                            VALUES (?, ?, ?, ?, ?)
-                        """, (
-                            filename,
-                            chunk["metadata"]["chunk_id"],
-                            chunk["content"],
-                            embedding_json,
-                            metadata_json
-                        ))
-                    conn.commit()
-                    
+            run = self.batcher.run([texts[index] for index in unique])
+            if run.errors:
+                raise Exception(next(iter(run.errors.values())))
+            embedding_vectors = [None] * len(texts)
+            for index, vector in zip(unique, run.vectors):
+                embedding_vectors[index] = vector
+            
+            self._replace_document(
+                filename, text_chunks, embedding_vectors, content_hash, byte_size, collection, signatures, links
+            )
+            return {**run.stats(), **dedup_stats(texts, links)}
         except Exception as e:
             raise Exception(f"Error storing embeddings: {str(e)}")
     
-    def similarity_search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+    def store_documents_embeddings(
+        self,
+        documents: List[Dict[str, Any]],
+        collection: str = DEFAULT_COLLECTION
+    ) -> List[Dict[str, Any]]:
+        """Embed several documents together and store each in its own transaction.
+        
+        Each document is a dict with "filename" and "text_chunks", plus optional
+        "content_hash" and "byte_size". Chunks from all documents are packed
+        into shared embedding batches so every API call is full, while a
+        failure only affects the documents whose chunks were in the failing
+        batch. Near-duplicate chunks, within the batch or of stored chunks,
+        are stored as references instead of being embedded again. Returns
+        one result per document.
+        """
+        texts = []
+        owners = []
+        for doc_index, document in enumerate(documents):
+            for chunk in document["text_chunks"]:
+                texts.append(chunk["content"])
+                owners.append(doc_index)
+        
+        try:
+            signatures, links = self._link_duplicates(texts, collection)
+        except Exception as e:
+            error = f"Error detecting duplicate chunks: {str(e)}"
+            return [{"filename": document["filename"], "status": "failed", "error": error} for document in documents]
+        unique = [index for index, link in enumerate(links) if link is None]
+        
+        run = self.batcher.run([texts[index] for index in unique])
+        embedding_vectors = [None] * len(texts)
+        errors = {}
+        for position, index in enumerate(unique):
+            embedding_vectors[index] = run.vectors[position]
+        for position, error in run.errors.items():
+            errors.setdefault(owners[unique[position]], error)
+        # A duplicate can't be stored if its canonical chunk failed to embed
+        for index, link in enumerate(links):
+            if link is not None and link[0] == "chunk" and embedding_vectors[link[1]] is None:
+                errors.setdefault(owners[index], errors[owners[link[1]]])
+        
+        results = []
+        stored_rows = {}  # chunk index in texts -> row id, for links across documents
+        offset = 0
+        for doc_index, document in enumerate(documents):
+            filename = document["filename"]
+            text_chunks = document["text_chunks"]
+            start, offset = offset, offset + len(text_chunks)
+            
+            if doc_index not in errors:
+                doc_links, doc_vectors = localize_links(links, embedding_vectors, start, offset, stored_rows)
+                try:
+                    row_ids = self._replace_document(
+                        filename,
+                        text_chunks,
+                        doc_vectors,
+                        document.get("content_hash"),
+                        document.get("byte_size"),
+                        collection,
+                        signatures[start:offset],
+                        doc_links
+                    )
+                    stored_rows.update({start + index: row_id for index, row_id in row_ids.items()})
+                except Exception as e:
+                    errors[doc_index] = f"Error storing embeddings: {str(e)}"
+            
+            if doc_index in errors:
+                results.append({"filename": filename, "status": "failed", "error": errors[doc_index]})
+            else:
+                results.append({
+                    "filename": filename,
+                    "status": "processed",
+                    "chunks_processed": len(text_chunks),
+                    "duplicate_chunks": sum(link is not None for link in doc_links)
+                })
+        
+        return results
+    
+    def similarity_search(self, query: str, k: int = 5, collection: str = DEFAULT_COLLECTION) -> List[Dict[str, Any]]:
         """Search for similar document chunks using vector similarity"""
         try:
-            # Generate embedding for query
-            query_embedding = self.embeddings.embed_query(query)
+            # Generate embedding for query, shared with identical in-flight queries
+            query_embedding = np.asarray(
+                self.query_flight.do(normalize_question(query), lambda: self.embeddings.embed_query(query)),
+                dtype=np.float32
+            )
+            norm = np.linalg.norm(query_embedding)
+            if norm > 0:
+                query_embedding /= norm
             
-            # Get all documents and calculate similarity
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT content, metadata, filename, embedding
-                    FROM documents
-                """)
                 
-                results = cursor.fetchall()
+                # Cosine similarity through the collection's IVF index if it
+                # has one, otherwise against its whole matrix
+                index = self._get_index(cursor, collection)
+                if index is not None:
+                    top_ids, top_scores = index.search(query_embedding, k, self.ivf_nprobe)
+                else:
+                    ids, matrix = self._get_matrix(cursor, collection)
+                    if len(ids) == 0:
+                        return []
+                    
+                    scores = matrix @ query_embedding
+                    top_k = min(k, len(ids))
+                    top = np.argpartition(-scores, top_k - 1)[:top_k]
+                    top = top[np.argsort(-scores[top])]
+                    top_ids, top_scores = ids[top], scores[top]
+                if len(top_ids) == 0:
+                    return []
+                
+                # Fetch the winning chunks only
+                top_ids = [int(chunk_id) for chunk_id in top_ids]
+                cursor.execute(f"""
+                    SELECT d.id, d.content, d.metadata, c.filename
+                    FROM documents d
+                    JOIN document_catalog c ON c.id = d.document_id
+                    WHERE d.id IN ({", ".join("?" * len(top_ids))})
+                """, top_ids)
+                rows = {row[0]: row for row in cursor.fetchall()}
                 
-                # Calculate similarities
                 similarities = []
-                for row in results:
-                    content, metadata_str, filename, embedding_str = row
-                    
-                    # Parse stored embedding
-                    stored_embedding = json.loads(embedding_str)
-                    
-                    # Calculate cosine similarity
-                    similarity = self._cosine_similarity(query_embedding, stored_embedding)
+                for chunk_id, score in zip(top_ids, top_scores):
+                    if chunk_id not in rows:
+                        continue
+                    _, content, metadata_str, filename = rows[chunk_id]
                     
                     # Parse metadata
                     try:
@@ -129,88 +855,526 @@ class EmbeddingManager:
                         "content": content,
                         "metadata": metadata,
                         "filename": filename,
-                        "similarity": similarity
+                        "similarity": float(score)
                     })
                 
-                # Sort by similarity and return top k
-                similarities.sort(key=lambda x: x["similarity"], reverse=True)
-                return similarities[:k]
+                return similarities
                 
         except Exception as e:
             raise Exception(f"Error during similarity search: {str(e)}")
     
-    def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Calculate cosine similarity between two vectors"""
+    def get_document_list(self, collection: str = DEFAULT_COLLECTION) -> List[str]:
+        """Get list of all processed documents in a collection"""
         try:
-            # Convert to numpy arrays
-            a = np.array(vec1)
-            b = np.array(vec2)
-            
-            # Calculate cosine similarity
-            dot_product = np.dot(a, b)
-            norm_a = np.linalg.norm(a)
-            norm_b = np.linalg.norm(b)
-            
-            if norm_a == 0 or norm_b == 0:
-                return 0.0
-            
-            return dot_product / (norm_a * norm_b)
-        except Exception:
-            return 0.0
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT filename FROM document_catalog
+                    WHERE collection = ? AND status = 'active'
+                    ORDER BY filename
+                """, (collection,))
+                return [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            raise Exception(f"Error retrieving document list: {str(e)}")
     
-    def get_document_list(self) -> List[str]:
-        """Get list of all processed documents"""
+    def list_documents(
+        self,
+        limit: Optional[int] = None,
+        offset: int = 0,
+        collection: str = DEFAULT_COLLECTION
+    ) -> Dict[str, Any]:
+        """Get a page of catalog entries and the total document count"""
         try:
             with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
                 cursor = conn.cursor()
-                cursor.execute("SELECT DISTINCT filename FROM documents ORDER BY filename")
-                return [row[0] for row in cursor.fetchall()]
+                cursor.execute("""
+                    SELECT COUNT(*) AS total FROM document_catalog
+                    WHERE collection = ? AND status = 'active'
+                """, (collection,))
+                total = cursor.fetchone()["total"]
+                
+                cursor.execute("""
+                    SELECT id, collection, filename, content_hash, page_count, chunk_count,
+                           byte_size, metadata, status, ingested_at
+                    FROM document_catalog
+                    WHERE collection = ? AND status = 'active'
+                    ORDER BY filename
+                    LIMIT ? OFFSET ?
+                """, (collection, -1 if limit is None else limit, offset))
+                
+                documents = []
+                for row in cursor.fetchall():
+                    row = dict(row)
+                    row["metadata"] = json.loads(row["metadata"])
+                    documents.append(row)
+                
+                return {"documents": documents, "total": total}
         except Exception as e:
             raise Exception(f"Error retrieving document list: {str(e)}")
     
-    def delete_document(self, filename: str) -> bool:
-        """Delete a document and all its embeddings from the database"""
+    def delete_document(self, filename: str, collection: str = DEFAULT_COLLECTION) -> bool:
+        """Delete a document: tombstone it now, purge its chunks in compact()"""
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 
                 # Check if document exists
-                cursor.execute("SELECT COUNT(*) FROM documents WHERE filename = ?", (filename,))
-                count = cursor.fetchone()[0]
+                cursor.execute("""
+                    SELECT id, chunk_count FROM document_catalog
+                    WHERE collection = ? AND filename = ? AND status = 'active'
+                """, (collection, filename))
+                row = cursor.fetchone()
                 
-                if count == 0:
+                if row is None:
                     return False  # Document not found
                 
-                # Delete all chunks for this document
-                cursor.execute("DELETE FROM documents WHERE filename = ?", (filename,))
+                self._bump_collection_version(cursor, collection)
+                cursor.execute("""
+                    UPDATE document_catalog SET status = 'deleted', deleted_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                """, (row[0],))
+                # Other documents' references to its chunks keep a copy
+                self._promote_references(cursor, collection, [row[0]], [])
                 conn.commit()
                 
-                # Check if any rows were deleted
-                if cursor.rowcount > 0:
-                    print(f"Successfully deleted {cursor.rowcount} chunks for document: {filename}")
-                    return True
-                else:
-                    return False
+                print(f"Successfully deleted {row[1]} chunks for document: {filename}")
+                return True
                     
         except Exception as e:
             raise Exception(f"Error deleting document '{filename}': {str(e)}")
     
-    def delete_all_documents(self) -> int:
-        """Delete all documents and embeddings from the database"""
+    def delete_all_documents(self, collection: str = DEFAULT_COLLECTION) -> int:
+        """Delete all documents in a collection: tombstone them, purge in compact()"""
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 
-                # Count documents before deletion
-                cursor.execute("SELECT COUNT(*) FROM documents")
+                # Count chunks from the catalog rather than scanning chunk rows
+                cursor.execute("""
+                    SELECT COALESCE(SUM(chunk_count), 0) FROM document_catalog
+                    WHERE collection = ? AND status = 'active'
+                """, (collection,))
                 count_before = cursor.fetchone()[0]
                 
-                # Delete all documents
-                cursor.execute("DELETE FROM documents")
+                self._bump_collection_version(cursor, collection)
+                cursor.execute("""
+                    UPDATE document_catalog SET status = 'deleted', deleted_at = CURRENT_TIMESTAMP
+                    WHERE collection = ? AND status = 'active'
+                """, (collection,))
                 conn.commit()
                 
                 print(f"Successfully deleted all documents ({count_before} chunks removed)")
                 return count_before
                 
         except Exception as e:
-            raise Exception(f"Error deleting all documents: {str(e)}")
\ No newline at end of file
+            raise Exception(f"Error deleting all documents: {str(e)}")
+    
+    def list_collections(self) -> List[Dict[str, Any]]:
+        """List collections with their active document and chunk counts"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT col.name, COUNT(c.id), COALESCE(SUM(c.chunk_count), 0), col.created_at
+                    FROM collections col
+                    LEFT JOIN document_catalog c
+                        ON c.collection = col.name AND c.status = 'active'
+                    GROUP BY col.name, col.created_at
+                    ORDER BY col.name
+                """)
+                return [
+                    {"name": name, "documents": documents, "chunks": chunks, "created_at": created_at}
+                    for name, documents, chunks, created_at in cursor.fetchall()
+                ]
+        except Exception as e:
+            raise Exception(f"Error retrieving collections: {str(e)}")
+    
+    def get_dedup_report(self, collection: str = DEFAULT_COLLECTION) -> Dict[str, Any]:
+        """Space saved in a collection by storing near-duplicate chunks as references"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    SELECT COUNT(*), COALESCE(AVG(LENGTH(d.embedding)), 0),
+                           COALESCE(SUM(LENGTH(d.minhash)), 0), COUNT(d.minhash)
+                    FROM documents d
+                    JOIN document_catalog c ON c.id = d.document_id
+                    WHERE d.collection = ? AND c.status = 'active'
+                """, (collection,))
+                stored_chunks, embedding_bytes, minhash_bytes, signed_chunks = cursor.fetchone()
+                cursor.execute("""
+                    SELECT COUNT(*), COALESCE(SUM(r.content_bytes), 0)
+                    FROM chunk_refs r
+                    JOIN document_catalog c ON c.id = r.document_id
+                    WHERE r.collection = ? AND c.status = 'active'
+                """, (collection,))
+                duplicate_chunks, text_bytes_saved = cursor.fetchone()
+            # Each band row holds two 64-bit integers
+            signature_bytes = minhash_bytes + signed_chunks * self.dedup.bands * 16
+            return space_report(
+                self.dedup,
+                collection,
+                stored_chunks,
+                duplicate_chunks,
+                text_bytes_saved,
+                embedding_bytes,
+                signature_bytes
+            )
+        except Exception as e:
+            raise Exception(f"Error building duplicate report: {str(e)}")
+    
+    def create_collection(self, collection: str):
+        """Create an empty collection"""
+        validate_collection_name(collection)
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute("INSERT OR IGNORE INTO collections (name) VALUES (?)", (collection,))
+                conn.commit()
+        except Exception as e:
+            raise Exception(f"Error creating collection '{collection}': {str(e)}")
+    
+    def drop_collection(self, collection: str) -> bool:
+        """Drop a collection: its documents are tombstoned and its matrix released"""
+        validate_collection_name(collection)
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM collections WHERE name = ?", (collection,))
+                if cursor.rowcount == 0:
+                    return False
+                
+                cursor.execute("""
+                    UPDATE document_catalog SET status = 'deleted', deleted_at = CURRENT_TIMESTAMP
+                    WHERE collection = ? AND status = 'active'
+                """, (collection,))
+                conn.commit()
+            
+            with self._matrices_lock:
+                self._matrices.pop(collection, None)
+                self._drop_index(collection)
+            print(f"Successfully dropped collection: {collection}")
+            return True
+        except Exception as e:
+            raise Exception(f"Error dropping collection '{collection}': {str(e)}")
+    
+    def _stream_rows(self, conn, query: str, params: tuple):
+        """Iterate a query's rows a batch at a time"""
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(SNAPSHOT_BATCH_SIZE)
+            if not rows:
+                return
+            yield from rows
+    
+    def export_snapshot(self, fileobj: BinaryIO, collections: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Write collections (default: all) to a snapshot archive.
+        
+        Everything is read in one transaction, so the archive is consistent
+        even while documents are being ingested. Only active documents are
+        exported. Returns the manifest.
+        """
+        conn = sqlite3.connect(self.db_path, isolation_level=None)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN")
+            cursor.execute("SELECT name FROM collections ORDER BY name")
+            existing = [row[0] for row in cursor.fetchall()]
+            for collection in collections or []:
+                if collection not in existing:
+                    raise SnapshotError(f"Collection '{collection}' not found")
+            
+            writer = SnapshotWriter(fileobj, self.embeddings.model)
+            for collection in collections or existing:
+                cursor.execute("""
+                    SELECT id, filename, content_hash, page_count, chunk_count, byte_size, metadata, ingested_at
+                    FROM document_catalog
+                    WHERE collection = ? AND status = 'active'
+                    ORDER BY id
+                """, (collection,))
+                catalog = cursor.fetchall()
+                positions = {row[0]: index for index, row in enumerate(catalog)}
+                documents = [
+                    {
+                        "filename": filename,
+                        "content_hash": content_hash,
+                        "page_count": page_count,
+                        "chunk_count": chunk_count,
+                        "byte_size": byte_size,
+                        "metadata": json.loads(metadata) if metadata else {},
+                        "ingested_at": ingested_at
+                    }
+                    for _, filename, content_hash, page_count, chunk_count, byte_size, metadata, ingested_at in catalog
+                ]
+                
+                chunk_rows = """
+                    FROM documents d
+                    JOIN document_catalog c ON c.id = d.document_id
+                    WHERE d.collection = ? AND c.status = 'active'
+                """
+                cursor.execute(f"SELECT COUNT(*) {chunk_rows}", (collection,))
+                chunk_count = cursor.fetchone()[0]
+                
+                writer.write_collection(
+                    collection,
+                    documents,
+                    chunk_count,
+                    (
+                        {"document": positions[document_id], "chunk_id": chunk_id, "content": content, "metadata": json.loads(metadata)}
+                        for document_id, chunk_id, content, metadata in self._stream_rows(
+                            conn, f"SELECT d.document_id, d.chunk_id, d.content, d.metadata {chunk_rows} ORDER BY d.id", (collection,)
+                        )
+                    ),
+                    (
+                        self._decode_embedding(row[0]) for row in self._stream_rows(
+                            conn, f"SELECT d.embedding {chunk_rows} ORDER BY d.id", (collection,)
+                        )
+                    ),
+                    (
+                        {
+                            "document": positions[document_id],
+                            "chunk_id": chunk_id,
+                            "canonical_document": positions[canonical_document_id],
+                            "canonical_chunk_id": canonical_chunk_id,
+                            "similarity": similarity,
+                            "content_bytes": content_bytes,
+                            "metadata": json.loads(metadata)
+                        }
+                        for document_id, chunk_id, canonical_document_id, canonical_chunk_id, similarity, content_bytes, metadata
+                        in self._stream_rows(conn, """
+                            SELECT r.document_id, r.chunk_id, d.document_id, d.chunk_id,
+                                   r.similarity, r.content_bytes, r.metadata
+                            FROM chunk_refs r
+                            JOIN document_catalog c ON c.id = r.document_id
+                            JOIN documents d ON d.id = r.canonical_id
+                            WHERE r.collection = ? AND c.status = 'active'
+                            ORDER BY r.id
+                        """, (collection,))
+                        if canonical_document_id in positions
+                    )
+                )
+            cursor.execute("COMMIT")
+            return writer.close()
+        except SnapshotError:
+            raise
+        except Exception as e:
+            raise Exception(f"Error exporting snapshot: {str(e)}")
+        finally:
+            conn.close()
+    
+    def import_snapshot(self, fileobj: BinaryIO) -> Dict[str, Dict[str, int]]:
+        """Load every collection of a snapshot archive without calling the embedding API.
+        
+        Imported documents replace active documents with the same filename,
+        as an upload would; other documents are left alone. Each collection
+        loads in one transaction.
+        """
+        reader = SnapshotReader(fileobj)
+        reader.check_model(self.embeddings.model)
+        for collection in reader.collections():
+            validate_collection_name(collection)
+        
+        imported = {}
+        for collection in reader.collections():
+            try:
+                imported[collection] = self._import_collection(reader, collection)
+            except SnapshotError:
+                raise
+            except Exception as e:
+                raise Exception(f"Error importing collection '{collection}': {str(e)}")
+            logger.info(f"Imported snapshot of '{collection}': {imported[collection]}")
+        return imported
+    
+    def _import_collection(self, reader: SnapshotReader, collection: str) -> Dict[str, int]:
+        documents = reader.documents(collection)
+        filenames = json.dumps([document["filename"] for document in documents])
+        
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            self._bump_collection_version(cursor, collection)
+            
+            cursor.execute("""
+                SELECT id FROM document_catalog
+                WHERE collection = ? AND status = 'active' AND filename IN (SELECT value FROM json_each(?))
+            """, (collection, filenames))
+            previous_ids = [row[0] for row in cursor.fetchall()]
+            cursor.execute("""
+                UPDATE document_catalog SET status = 'deleted', deleted_at = CURRENT_TIMESTAMP
+                WHERE collection = ? AND status = 'active' AND filename IN (SELECT value FROM json_each(?))
+            """, (collection, filenames))
+            
+            document_ids = []
+            for document in documents:
+                cursor.execute("""
+                    INSERT INTO document_catalog
+                        (collection, filename, content_hash, page_count, chunk_count, byte_size, metadata, status, ingested_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, 'active', COALESCE(?, CURRENT_TIMESTAMP))
+                """, (
+                    collection,
+                    document["filename"],
+                    document.get("content_hash"),
+                    document.get("page_count", 0),
+                    document.get("chunk_count", 0),
+                    document.get("byte_size"),
+                    json.dumps(document.get("metadata") or {}),
+                    document.get("ingested_at")
+                ))
+                document_ids.append(cursor.lastrowid)
+            
+            chunk_count = 0
+            for batch, vectors in reader.chunk_batches(collection):
+                signatures = [
+                    self.dedup.signature(chunk["content"]) if self.dedup.enabled else None
+                    for chunk in batch
+                ]
+                cursor.executemany("""
+                    INSERT INTO documents (collection, document_id, chunk_id, content, embedding, metadata, minhash)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, [
+                    (
+                        collection,
+                        document_ids[chunk["document"]],
+                        chunk["chunk_id"],
+                        chunk["content"],
+                        vector.tobytes(),
+                        json.dumps(chunk["metadata"]),
+                        signature.tobytes() if signature is not None else None
+                    )
+                    for chunk, vector, signature in zip(batch, vectors, signatures)
+                ])
+                chunk_count += len(batch)
+            
+            rows = {}
+            if document_ids:
+                cursor.execute(
+                    "SELECT document_id, chunk_id, id, minhash FROM documents WHERE document_id IN (SELECT value FROM json_each(?))",
+                    (json.dumps(document_ids),)
+                )
+                for document_id, chunk_id, row_id, minhash in cursor.fetchall():
+                    rows[(document_id, chunk_id)] = row_id
+                    if minhash is not None:
+                        cursor.executemany(
+                            "INSERT OR IGNORE INTO minhash_bands (band_key, chunk_row) VALUES (?, ?)",
+                            [(key, row_id) for key in self.dedup.band_keys(self.dedup.decode(minhash))]
+                        )
+            
+            references = [
+                (
+                    collection,
+                    document_ids[reference["document"]],
+                    reference["chunk_id"],
+                    canonical_row_id(rows, document_ids, reference, collection),
+                    reference["similarity"],
+                    reference["content_bytes"],
+                    json.dumps(reference["metadata"])
+                )
+                for reference in reader.references(collection)
+            ]
+            cursor.executemany("""
+                INSERT INTO chunk_refs
+                    (collection, document_id, chunk_id, canonical_id, similarity, content_bytes, metadata)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, references)
+            
+            # References from other documents to the ones replaced keep a copy
+            self._promote_references(cursor, collection, previous_ids, [])
+            conn.commit()
+        
+        return {
+            "documents": len(documents),
+            "chunks": chunk_count,
+            "references": len(references),
+            "replaced": len(previous_ids)
+        }
+    
+    def compact(self) -> Dict[str, Any]:
+        """Purge tombstoned documents, then build or refresh collection indexes"""
+        stats = self._purge_tombstones()
+        stats["indexed"] = self.maintain_indexes()
+        return stats
+    
+    def _purge_tombstones(self) -> Dict[str, Any]:
+        """Physically purge tombstoned documents and reclaim file space.
+        
+        With no active documents left both tables are emptied with a bare
+        DELETE, which SQLite executes as a truncate; otherwise chunk rows are
+        deleted in bounded batches. Only documents already tombstoned when
+        the pass starts are purged: SQLite doesn't cascade deletes, so one
+        tombstoned mid-pass must keep its catalog row until its chunks go.
+        VACUUM runs once the share of free pages in the database file
+        crosses the configured ratio.
+        """
+        stats = {"purged_documents": 0, "purged_chunks": 0, "truncated": False, "vacuumed": False}
+        
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                
+                # BEGIN IMMEDIATE keeps ingests out between the check and the purge
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute("""
+                    SELECT COALESCE(SUM(status = 'active'), 0), COALESCE(SUM(status = 'deleted'), 0)
+                    FROM document_catalog
+                """)
+                active, deleted = cursor.fetchone()
+                if deleted == 0:
+                    conn.commit()
+                    return stats
+                cursor.execute("SELECT id FROM document_catalog WHERE status = 'deleted'")
+                tombstoned = json.dumps([row[0] for row in cursor.fetchall()])
+                
+                if active == 0:
+                    cursor.execute("SELECT COALESCE(SUM(chunk_count), 0) FROM document_catalog")
+                    stats["purged_chunks"] = cursor.fetchone()[0]
+                    cursor.execute("DELETE FROM minhash_bands")
+                    cursor.execute("DELETE FROM chunk_refs")
+                    cursor.execute("DELETE FROM documents")
+                    cursor.execute("DELETE FROM document_catalog")
+                    stats["purged_documents"] = deleted
+                    stats["truncated"] = True
+                conn.commit()
+                
+                if not stats["truncated"]:
+                    while True:
+                        cursor.execute("""
+                            SELECT id FROM documents
+                            WHERE document_id IN (SELECT value FROM json_each(?))
+                            LIMIT ?
+                        """, (tombstoned, self.compaction_batch_size))
+                        purged_ids = json.dumps([row[0] for row in cursor.fetchall()])
+                        cursor.execute(
+                            "DELETE FROM minhash_bands WHERE chunk_row IN (SELECT value FROM json_each(?))",
+                            (purged_ids,)
+                        )
+                        cursor.execute("DELETE FROM documents WHERE id IN (SELECT value FROM json_each(?))", (purged_ids,))
+                        purged = cursor.rowcount
+                        conn.commit()
+                        stats["purged_chunks"] += purged
+                        if purged < self.compaction_batch_size:
+                            break
+                    
+                    cursor.execute(
+                        "DELETE FROM chunk_refs WHERE document_id IN (SELECT value FROM json_each(?))",
+                        (tombstoned,)
+                    )
+                    cursor.execute(
+                        "DELETE FROM document_catalog WHERE id IN (SELECT value FROM json_each(?))",
+                        (tombstoned,)
+                    )
+                    stats["purged_documents"] = cursor.rowcount
+                    conn.commit()
+                
+                cursor.execute("PRAGMA freelist_count")
+                free_pages = cursor.fetchone()[0]
+                cursor.execute("PRAGMA page_count")
+                total_pages = cursor.fetchone()[0]
+                if free_pages / max(total_pages, 1) >= self.vacuum_dead_ratio:
+                    cursor.execute("VACUUM")
+                    stats["vacuumed"] = True
+            
+            logger.info(f"Compaction complete: {stats}")
+            return stats
+            
+        except Exception as e:
+            raise Exception(f"Error compacting documents: {str(e)}")
@@ -0,0 +1,206 @@
+import os
+import zlib
+import hashlib
+import shutil
+import logging
+import tempfile
+import zipfile
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import BinaryIO, List, Dict, Any, Tuple
+
+from .pdf_loader import PDFLoader, PDF_HEADER
+from .collection_names import DEFAULT_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+ZIP_HEADER = b'PK\x03\x04'
+
+# What reading a damaged or unsupported ZIP member can raise: BadZipFile for
+# CRC errors, RuntimeError for encrypted entries, NotImplementedError for
+# unsupported compression, zlib.error and EOFError for corrupt data
+_ZIP_READ_ERRORS = (zipfile.BadZipFile, RuntimeError, NotImplementedError, zlib.error, EOFError)
+
+# Limits for bulk ingestion requests
+MAX_BULK_FILES = int(os.environ.get("MAX_BULK_FILES", "500"))
+# Whole bulk request; each file still gets the single-upload limit
+MAX_BULK_UPLOAD_SIZE = int(os.environ.get("MAX_BULK_UPLOAD_SIZE_MB", "2048")) * 1024 * 1024
+MAX_ARCHIVE_UNCOMPRESSED_SIZE = int(os.environ.get("MAX_ARCHIVE_UNCOMPRESSED_MB", "2048")) * 1024 * 1024
+
+# Worker processes used for PDF text extraction (pypdf is CPU bound)
+EXTRACTION_WORKERS = int(os.environ.get("EXTRACTION_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+def _extract_pdf_path(path: str, filename: str, chunk_size: int, chunk_overlap: int) -> Dict[str, Any]:
+    """Extract chunks from a PDF on disk; runs inside an extraction worker process"""
+    loader = PDFLoader(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    with open(path, "rb") as pdf_file:
+        # Hash in the worker too, so catalog entries match single-file uploads
+        hasher = hashlib.sha256()
+        for block in iter(lambda: pdf_file.read(1024 * 1024), b""):
+            hasher.update(block)
+        byte_size = pdf_file.tell()
+        
+        return {
+            "filename": filename,
+            "text_chunks": loader.extract_text_from_file(pdf_file, filename),
+            "content_hash": hasher.hexdigest(),
+            "byte_size": byte_size
+        }
+
+class BulkIngestor:
+    """Ingest many PDFs at once: parallel extraction, shared embedding batches.
+
+    Extraction runs in one worker process pool shared by all requests, so
+    concurrent uploads queue for the same workers instead of each starting
+    its own. start() and shutdown() tie the pool to the app's lifetime.
+    """
+
+    def __init__(self, pdf_loader: PDFLoader, embedding_manager, max_workers: int = EXTRACTION_WORKERS):
+        self.pdf_loader = pdf_loader
+        self.embedding_manager = embedding_manager
+        self.max_workers = max_workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def start(self) -> ProcessPoolExecutor:
+        """Start the extraction pool if it isn't running; returns it"""
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn avoids forking a threaded server
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    def shutdown(self):
+        """Stop the extraction pool, cancelling work that hasn't started"""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    def _submit(self, *args) -> Future:
+        pool = self.start()
+        try:
+            return pool.submit(*args)
+        except BrokenProcessPool:
+            # A worker died abruptly (e.g. out of memory); replace the pool
+            logger.warning("Extraction pool is broken; starting a new one")
+            with self._pool_lock:
+                if self._pool is pool:
+                    self._pool = None
+            pool.shutdown(wait=False)
+            return self.start().submit(*args)
+
+    def save_file(self, source: BinaryIO, work_dir: Path) -> Path:
+        """Copy an uploaded file into the work directory in fixed-size chunks"""
+        fd, target = tempfile.mkstemp(suffix=".pdf", dir=work_dir)
+        source.seek(0)
+        with os.fdopen(fd, "wb") as out:
+            shutil.copyfileobj(source, out)
+        return Path(target)
+
+    def expand_archive(self, archive: BinaryIO, archive_name: str, work_dir: Path) -> List[Tuple[str, Path]]:
+        """Extract the PDF members of a ZIP archive into the work directory.
+
+        Member names are flattened to their base name, the name the
+        document is cataloged under; members land in temporary files, so
+        entries such as '../x.pdf' can't escape the work directory. Callers
+        must reject repeated names.
+        """
+        try:
+            zf = zipfile.ZipFile(archive)
+        except (zipfile.BadZipFile, zipfile.LargeZipFile, OSError, EOFError) as e:
+            raise ValueError(f"Invalid ZIP archive: {archive_name}. Error: {str(e)}")
+
+        with zf:
+            members = [
+                info for info in zf.infolist()
+                if not info.is_dir() and info.filename.lower().endswith(".pdf")
+                and not Path(info.filename).name.startswith(".")
+            ]
+            if not members:
+                raise ValueError(f"ZIP archive contains no PDF files: {archive_name}")
+
+            total_size = sum(info.file_size for info in members)
+            if total_size > MAX_ARCHIVE_UNCOMPRESSED_SIZE:
+                raise ValueError(
+                    f"ZIP archive expands to more than {MAX_ARCHIVE_UNCOMPRESSED_SIZE // (1024 * 1024)} MB: {archive_name}"
+                )
+
+            extracted = []
+            for info in members:
+                filename = Path(info.filename).name
+                fd, target = tempfile.mkstemp(suffix=".pdf", dir=work_dir)
+                try:
+                    with zf.open(info) as source, os.fdopen(fd, "wb") as out:
+                        shutil.copyfileobj(source, out)
+                except _ZIP_READ_ERRORS as e:
+                    raise ValueError(f"Cannot read '{info.filename}' in ZIP archive {archive_name}: {str(e)}")
+                extracted.append((filename, Path(target)))
+            return extracted
+
+    def ingest_paths(
+        self,
+        items: List[Tuple[str, Path]],
+        collection: str = DEFAULT_COLLECTION
+    ) -> List[Dict[str, Any]]:
+        """Extract PDFs in parallel, then embed and store them in a collection"""
+        if len(items) > MAX_BULK_FILES:
+            raise ValueError(f"Too many files in one request ({len(items)}); the limit is {MAX_BULK_FILES}")
+
+        results: List[Dict[str, Any]] = [None] * len(items)
+        extracted = []
+
+        # Extract text in the shared worker processes
+        futures = [
+            self._submit(
+                _extract_pdf_path,
+                str(path),
+                filename,
+                self.pdf_loader.chunk_size,
+                self.pdf_loader.chunk_overlap
+            )
+            for filename, path in items
+        ]
+        for index, ((filename, _), future) in enumerate(zip(items, futures)):
+            try:
+                extracted.append((index, future.result()))
+            except Exception as e:
+                logger.error(f"Extraction failed for '{filename}': {str(e)}")
+                results[index] = {"filename": filename, "status": "failed", "error": str(e)}
+
+        # Embed across document boundaries, commit per document
+        if extracted:
+            stored = self.embedding_manager.store_documents_embeddings(
+                [document for _, document in extracted],
+                collection
+            )
+            for (index, _), result in zip(extracted, stored):
+                results[index] = result
+
+        return results
+
+def summarize_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Build the response body for a bulk ingestion request"""
+    processed = [r for r in results if r["status"] == "processed"]
+    return {
+        "message": f"Processed {len(processed)} of {len(results)} files",
+        "processed": len(processed),
+        "failed": len(results) - len(processed),
+        "chunks_processed": sum(r.get("chunks_processed", 0) for r in processed),
+        "duplicate_chunks": sum(r.get("duplicate_chunks", 0) for r in processed),
+        "results": results
+    }
+
+def detect_upload_kind(header: bytes) -> str:
+    """Return 'pdf' or 'zip' for a file header, raising ValueError otherwise"""
+    if header.startswith(PDF_HEADER):
+        return "pdf"
+    if header.startswith(ZIP_HEADER):
+        return "zip"
+    raise ValueError("File must be a PDF or a ZIP archive of PDFs")
@@ -0,0 +1,399 @@
+"""Inverted-file (IVF) approximate nearest-neighbor index in pure NumPy.
+
+A k-means coarse quantizer splits the embedding space into lists; each
+stored vector lives in the list of its nearest centroid. A query scores
+the centroids, then scans only the nprobe best lists instead of every
+vector, trading a little recall for a large cut in work. Vectors are
+normalized, so scores are cosine similarities as in exact search.
+
+Command line, from the backend directory (uses the local SQLite store):
+
+    python -m app.ivf_index build [--collection NAME ...]
+    python -m app.ivf_index report --collection NAME [--k 10] [--queries 200] [--nprobe 1 4 16 64]
+    python -m app.ivf_index report --synthetic 1000000 [--dimensions 256]
+"""
+import os
+import math
+import time
+import zipfile
+import argparse
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Collections index themselves once they hold this many active chunks;
+# smaller ones are searched exactly
+IVF_ENABLED = os.environ.get("IVF_ENABLED", "true").lower() in ("1", "true", "yes")
+IVF_MIN_CHUNKS = int(os.environ.get("IVF_MIN_CHUNKS", "50000"))
+
+# Lists in the coarse quantizer (0: about the square root of the chunk count)
+IVF_NLIST = int(os.environ.get("IVF_NLIST", "0"))
+
+# Lists scanned per query; more lists, better recall, slower search
+IVF_NPROBE = int(os.environ.get("IVF_NPROBE", "16"))
+
+# k-means training: sampled vectors per list and Lloyd iterations
+IVF_TRAIN_POINTS_PER_LIST = int(os.environ.get("IVF_TRAIN_POINTS_PER_LIST", "64"))
+IVF_KMEANS_ITERATIONS = int(os.environ.get("IVF_KMEANS_ITERATIONS", "10"))
+
+# Retrain once a collection has grown or shrunk by this factor since training
+IVF_RETRAIN_FACTOR = float(os.environ.get("IVF_RETRAIN_FACTOR", "4"))
+
+# Rows scored against the centroids at once when assigning vectors to lists
+_ASSIGN_BATCH = 4096
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """Rows scaled to unit length as float32 (zero rows stay zero)"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+def default_nlist(count: int) -> int:
+    """About sqrt(count) lists, with enough points per list to train them"""
+    return max(1, min(int(round(math.sqrt(count))), count // 39 or 1))
+
+def _nearest(vectors: np.ndarray, centroids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Index of and similarity to each vector's nearest centroid"""
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    scores = np.empty(len(vectors), dtype=np.float32)
+    for start in range(0, len(vectors), _ASSIGN_BATCH):
+        similarities = vectors[start:start + _ASSIGN_BATCH] @ centroids.T
+        assignments[start:start + _ASSIGN_BATCH] = similarities.argmax(axis=1)
+        scores[start:start + _ASSIGN_BATCH] = similarities.max(axis=1)
+    return assignments, scores
+
+def train_centroids(
+    sample: np.ndarray,
+    nlist: int,
+    iterations: int = IVF_KMEANS_ITERATIONS,
+    seed: int = 0
+) -> np.ndarray:
+    """Spherical k-means over normalized sample vectors.
+
+    Centroids start at random sample points. A list that ends up empty is
+    reseeded with the point worst served by its current centroid.
+    """
+    nlist = min(nlist, len(sample))
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assignments, scores = _nearest(sample, centroids)
+        counts = np.bincount(assignments, minlength=nlist)
+        order = np.argsort(assignments, kind="stable")
+        filled = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[filled]
+        centroids[filled] = np.add.reduceat(sample[order], starts, axis=0)
+
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            centroids[empty] = sample[np.argsort(scores)[:len(empty)]]
+        centroids = normalize_rows(centroids)
+    return centroids
+
+class _InvertedList:
+    """Ids, document ids and vectors of one list, with room to grow in place"""
+
+    def __init__(self, dimensions: int):
+        self.size = 0
+        self.ids = np.empty(0, dtype=np.int64)
+        self.documents = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, dimensions), dtype=np.float32)
+
+    def append(self, ids: np.ndarray, documents: np.ndarray, vectors: np.ndarray):
+        end = self.size + len(ids)
+        if end > len(self.ids):
+            # Grow by a quarter: amortized appends without doubling memory
+            capacity = max(end, len(self.ids) + len(self.ids) // 4 + 16)
+            for name in ("ids", "documents", "vectors"):
+                old = getattr(self, name)
+                new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+                new[:self.size] = old[:self.size]
+                setattr(self, name, new)
+        self.ids[self.size:end] = ids
+        self.documents[self.size:end] = documents
+        self.vectors[self.size:end] = vectors
+        self.size = end
+
+    def remove_documents(self, documents: np.ndarray) -> int:
+        keep = ~np.isin(self.documents[:self.size], documents)
+        kept = int(keep.sum())
+        removed = self.size - kept
+        if removed:
+            self.ids[:kept] = self.ids[:self.size][keep]
+            self.documents[:kept] = self.documents[:self.size][keep]
+            self.vectors[:kept] = self.vectors[:self.size][keep]
+            self.size = kept
+        return removed
+
+class IVFIndex:
+    """Inverted lists of normalized vectors under a trained coarse quantizer.
+
+    Vectors are added and removed incrementally, keyed by chunk row id and
+    removed by document. version and watermark record how far the index has
+    caught up with its collection: the collection version it reflects and
+    the highest chunk row id it has seen.
+    """
+
+    def __init__(self, centroids: np.ndarray):
+        self.centroids = np.ascontiguousarray(centroids, dtype=np.float32)
+        self.nlist, self.dimensions = self.centroids.shape
+        self._lists = [_InvertedList(self.dimensions) for _ in range(self.nlist)]
+        self._lock = threading.Lock()
+        self.document_ids: set = set()
+        self.version = 0
+        self.watermark = 0
+        self.trained_size = 0
+        self.unsaved_changes = 0
+
+    def __len__(self) -> int:
+        return sum(inverted.size for inverted in self._lists)
+
+    def add(self, ids: Sequence[int], documents: Sequence[int], vectors: np.ndarray):
+        """Add normalized vectors to the lists of their nearest centroids"""
+        if len(ids) == 0:
+            return
+        ids = np.asarray(ids, dtype=np.int64)
+        documents = np.asarray(documents, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32)
+        assignments, _ = _nearest(vectors, self.centroids)
+        order = np.argsort(assignments, kind="stable")
+        bounds = np.flatnonzero(np.diff(assignments[order])) + 1
+        with self._lock:
+            for group in np.split(order, bounds):
+                self._lists[assignments[group[0]]].append(ids[group], documents[group], vectors[group])
+            self.document_ids.update(int(document) for document in np.unique(documents))
+            self.unsaved_changes += len(ids)
+
+    def remove_documents(self, documents: Iterable[int]) -> int:
+        """Remove every vector of the given documents; returns how many were removed"""
+        documents = np.fromiter(documents, dtype=np.int64)
+        if len(documents) == 0:
+            return 0
+        with self._lock:
+            removed = sum(inverted.remove_documents(documents) for inverted in self._lists)
+            self.document_ids.difference_update(int(document) for document in documents)
+            self.unsaved_changes += removed
+        return removed
+
+    def _probe(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        if nprobe >= self.nlist:
+            return np.arange(self.nlist)
+        return np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+
+    def search(self, query: np.ndarray, k: int, nprobe: int = IVF_NPROBE) -> Tuple[np.ndarray, np.ndarray]:
+        """Row ids and scores of the k best vectors in the nprobe closest lists, best first"""
+        nprobe = max(1, nprobe)
+        ids, scores = [], []
+        with self._lock:
+            for list_number in self._probe(query, nprobe):
+                inverted = self._lists[list_number]
+                if inverted.size:
+                    ids.append(inverted.ids[:inverted.size])
+                    scores.append(inverted.vectors[:inverted.size] @ query)
+            if not ids:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            ids = np.concatenate(ids)
+        scores = np.concatenate(scores)
+
+        top_k = min(k, len(ids))
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+        return ids[top], scores[top]
+
+    def scanned_share(self, query: np.ndarray, nprobe: int) -> float:
+        """Share of the stored vectors a search with this nprobe scans"""
+        with self._lock:
+            sizes = np.array([inverted.size for inverted in self._lists])
+        total = sizes.sum()
+        return float(sizes[self._probe(query, max(1, nprobe))].sum() / total) if total else 0.0
+
+    def sample(self, count: int, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """Random stored (ids, vectors), e.g. to use as benchmark queries"""
+        with self._lock:
+            sizes = np.array([inverted.size for inverted in self._lists])
+            offsets = np.cumsum(sizes)
+            rng = np.random.default_rng(seed)
+            picks = rng.choice(offsets[-1], size=min(count, offsets[-1]), replace=False)
+            lists = np.searchsorted(offsets, picks, side="right")
+            positions = picks - (offsets[lists] - sizes[lists])
+            ids = np.array([self._lists[l].ids[p] for l, p in zip(lists, positions)], dtype=np.int64)
+            vectors = np.array([self._lists[l].vectors[p] for l, p in zip(lists, positions)], dtype=np.float32)
+        return ids, vectors.reshape(len(ids), self.dimensions)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            sizes = np.array([inverted.size for inverted in self._lists])
+            capacity = sum(len(inverted.ids) for inverted in self._lists)
+        return {
+            "chunks": int(sizes.sum()),
+            "lists": self.nlist,
+            "dimensions": self.dimensions,
+            "nprobe": IVF_NPROBE,
+            "list_size_mean": round(float(sizes.mean()), 1),
+            "list_size_max": int(sizes.max()),
+            "empty_lists": int((sizes == 0).sum()),
+            "trained_size": self.trained_size,
+            "memory_bytes": int(capacity * (self.dimensions * 4 + 16) + self.centroids.nbytes)
+        }
+
+    def save(self, path: Path):
+        """Write the index to one .npz file, replacing any previous one atomically.
+
+        Vectors are streamed list by list rather than concatenated first,
+        so saving doesn't need a second copy of them in memory.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_name(path.name + ".tmp")
+        with self._lock:
+            sizes = np.array([inverted.size for inverted in self._lists], dtype=np.int64)
+            arrays = {
+                "centroids": self.centroids,
+                "sizes": sizes,
+                "ids": np.concatenate([inverted.ids[:inverted.size] for inverted in self._lists]),
+                "documents": np.concatenate([inverted.documents[:inverted.size] for inverted in self._lists]),
+                "document_ids": np.array(sorted(self.document_ids), dtype=np.int64),
+                "state": np.array([self.version, self.watermark, self.trained_size], dtype=np.int64)
+            }
+            with zipfile.ZipFile(temporary, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+                for name, array in arrays.items():
+                    with archive.open(f"{name}.npy", "w", force_zip64=True) as out:
+                        np.lib.format.write_array(out, array, allow_pickle=False)
+                with archive.open("vectors.npy", "w", force_zip64=True) as out:
+                    np.lib.format.write_array_header_1_0(out, {
+                        "descr": np.lib.format.dtype_to_descr(np.dtype(np.float32)),
+                        "fortran_order": False,
+                        "shape": (int(sizes.sum()), self.dimensions)
+                    })
+                    for inverted in self._lists:
+                        out.write(inverted.vectors[:inverted.size].tobytes())
+            self.unsaved_changes = 0
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "IVFIndex":
+        with np.load(path, allow_pickle=False) as data:
+            index = cls(data["centroids"])
+            sizes = data["sizes"]
+            ids = data["ids"]
+            documents = data["documents"]
+            vectors = data["vectors"]
+            index.document_ids = set(int(document) for document in data["document_ids"])
+            index.version, index.watermark, index.trained_size = (int(value) for value in data["state"])
+
+        # Lists start as views of the loaded arrays and are copied once they grow
+        offsets = np.concatenate(([0], np.cumsum(sizes)))
+        for inverted, start, end in zip(index._lists, offsets[:-1], offsets[1:]):
+            inverted.ids = ids[start:end]
+            inverted.documents = documents[start:end]
+            inverted.vectors = vectors[start:end]
+            inverted.size = int(end - start)
+        return index
+
+def recall_report(
+    index: IVFIndex,
+    queries: np.ndarray,
+    k: int = 10,
+    nprobes: Sequence[int] = (1, 4, 16, 64),
+    exclude_ids: Optional[Sequence[int]] = None
+) -> List[Dict[str, object]]:
+    """Recall@k and latency per nprobe, measured against exact search.
+
+    Exact search scans every list of the same index, i.e. every stored
+    vector. When queries are stored vectors, pass their ids as exclude_ids
+    so a query doesn't count finding itself.
+    """
+    excluded = list(exclude_ids) if exclude_ids is not None else [None] * len(queries)
+
+    def run(query, exclude, nprobe):
+        started = time.perf_counter()
+        ids, _ = index.search(query, k + (exclude is not None), nprobe)
+        elapsed = time.perf_counter() - started
+        return [row_id for row_id in ids.tolist() if row_id != exclude][:k], elapsed
+
+    exact = [run(query, exclude, index.nlist) for query, exclude in zip(queries, excluded)]
+
+    def row(label, nprobe, results):
+        latencies = np.array([elapsed for _, elapsed in results]) * 1000
+        found = sum(len(set(ids) & set(truth)) for (ids, _), (truth, _) in zip(results, exact))
+        expected = sum(len(truth) for truth, _ in exact)
+        return {
+            "nprobe": label,
+            "recall_at_k": round(found / expected, 4) if expected else 1.0,
+            "scanned_share": round(float(np.mean([index.scanned_share(query, nprobe) for query in queries])), 4),
+            "mean_ms": round(float(latencies.mean()), 3),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 3)
+        }
+
+    report = [row("exact", index.nlist, exact)]
+    for nprobe in sorted(set(min(max(1, nprobe), index.nlist) for nprobe in nprobes)):
+        report.append(row(nprobe, nprobe, [run(query, exclude, nprobe) for query, exclude in zip(queries, excluded)]))
+    return report
+
+def print_report(report: List[Dict[str, object]], k: int, stats: Dict[str, object]):
+    print(f"\n{stats['chunks']} vectors in {stats['lists']} lists, recall@{k} against exact search\n")
+    header = f"{'nprobe':>8}{'recall':>10}{'scanned':>10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for row in report:
+        print(
+            f"{row['nprobe']:>8}{row['recall_at_k']:>10}{row['scanned_share']:>10}"
+            f"{row['mean_ms']:>10}{row['p50_ms']:>10}{row['p95_ms']:>10}"
+        )
+
+def synthetic_index(count: int, dimensions: int, clusters: int = 1000, seed: int = 0) -> IVFIndex:
+    """Index clustered random vectors, to benchmark sizes no collection has yet"""
+    rng = np.random.default_rng(seed)
+    centers = normalize_rows(rng.standard_normal((clusters, dimensions)))
+
+    def batch(size):
+        points = centers[rng.integers(0, clusters, size)] + rng.standard_normal((size, dimensions)) / math.sqrt(dimensions)
+        return normalize_rows(points)
+
+    nlist = IVF_NLIST or default_nlist(count)
+    index = IVFIndex(train_centroids(batch(min(count, nlist * IVF_TRAIN_POINTS_PER_LIST)), nlist))
+    for start in range(0, count, 100000):
+        size = min(100000, count - start)
+        index.add(np.arange(start, start + size), np.zeros(size, dtype=np.int64), batch(size))
+    index.trained_size = count
+    return index
+
+def main():
+    parser = argparse.ArgumentParser(description="Build IVF indexes and report their recall and latency")
+    parser.add_argument("action", choices=["build", "report"])
+    parser.add_argument("--collection", action="append", help="Collection to use (repeatable for build; default all)")
+    parser.add_argument("--k", type=int, default=10, help="Results per query")
+    parser.add_argument("--queries", type=int, default=200, help="Queries sampled for the report")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64], help="nprobe values to report")
+    parser.add_argument("--synthetic", type=int, help="Report on this many clustered random vectors instead of a collection")
+    parser.add_argument("--dimensions", type=int, default=1536, help="Dimensions of synthetic vectors")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        started = time.perf_counter()
+        index = synthetic_index(args.synthetic, args.dimensions)
+        print(f"Built synthetic index in {time.perf_counter() - started:.1f}s")
+        _, queries = index.sample(args.queries, seed=1)
+        noise = np.random.default_rng(2).standard_normal(queries.shape) * 0.3 / math.sqrt(args.dimensions)
+        print_report(recall_report(index, normalize_rows(queries + noise), args.k, args.nprobe), args.k, index.stats())
+        return
+
+    from .embeddings_sqlite import EmbeddingManager
+    manager = EmbeddingManager()
+    if args.action == "build":
+        for collection in args.collection or [c["name"] for c in manager.list_collections() if c["chunks"]]:
+            started = time.perf_counter()
+            stats = manager.build_index(collection)
+            print(f"Indexed '{collection}' in {time.perf_counter() - started:.1f}s: {stats}")
+    else:
+        if not args.collection or len(args.collection) != 1:
+            parser.error("report needs exactly one --collection, or --synthetic")
+        report, stats = manager.index_report(args.collection[0], args.k, args.queries, args.nprobe)
+        print_report(report, args.k, stats)
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,70 @@
 import os
-from fastapi import FastAPI, File, UploadFile, HTTPException
+import tempfile
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import List, Optional
+from fastapi import FastAPI, File, Form, Query, UploadFile, HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 import uvicorn
 
-from .pdf_loader import PDFLoader
+from .pdf_loader import PDFLoader, PDF_HEADER
 from .embeddings_postgres import EmbeddingManager
 from .chat import ChatManager
+from .admission import AdmissionController, AdmissionMiddleware, Lane
+from .compaction import BackgroundCompactor
+from .collection_names import DEFAULT_COLLECTION, validate_collection_name
+from .ingest import BulkIngestor, MAX_BULK_FILES, MAX_BULK_UPLOAD_SIZE, ZIP_HEADER, detect_upload_kind, summarize_results
+from .uploads import FORM_OVERHEAD, MAX_UPLOAD_SIZE, RequestSizeLimitMiddleware, UploadTooLargeError, spool_upload
+from .snapshot import MAX_SNAPSHOT_SIZE, SnapshotConflictError, SnapshotError
 
-app = FastAPI(title="RAG Chatbot API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Deletes only tombstone documents; the compactor purges them and builds
+    # vector indexes in the background
+    compactor.start()
+    # One PDF extraction pool for all bulk uploads
+    bulk_ingestor.start()
+    yield
+    bulk_ingestor.shutdown()
+    compactor.stop()
 
-# Add CORS middleware
+app = FastAPI(title="RAG Chatbot API", version="1.0.0", lifespan=lifespan)
+
+# Admission control: bounded concurrency and wait queues per endpoint, with
+# chat served ahead of ingestion. Overload gets a fast 429/503 + Retry-After.
+admission = AdmissionController({
+    "chat": Lane.from_env("chat", priority=1, max_active=8, max_queue=32, queue_timeout=10),
+    "ingest": Lane.from_env("ingest", priority=0, max_active=2, max_queue=8, queue_timeout=30, reserved=1),
+})
+app.add_middleware(
+    AdmissionMiddleware,
+    controller=admission,
+    routes={
+        ("POST", "/chat"): "chat",
+        ("POST", "/upload-pdf"): "ingest",
+        ("POST", "/upload-pdfs"): "ingest",
+        ("GET", "/snapshot"): "ingest",
+        ("POST", "/snapshot"): "ingest",
+    }
+)
+
+# Body size limits, enforced while the body streams in rather than after
+# FastAPI has spooled the whole form; outside admission, so an oversized
+# request never takes a slot
+app.add_middleware(
+    RequestSizeLimitMiddleware,
+    routes={
+        ("POST", "/upload-pdf"): MAX_UPLOAD_SIZE + FORM_OVERHEAD,
+        ("POST", "/upload-pdfs"): MAX_BULK_UPLOAD_SIZE + FORM_OVERHEAD,
+        ("POST", "/snapshot"): MAX_SNAPSHOT_SIZE + FORM_OVERHEAD,
+    }
+)
+
+# Add CORS middleware (added last so it also wraps admission and size rejections)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -23,61 +77,189 @@ app.add_middleware(
 pdf_loader = PDFLoader()
 embedding_manager = EmbeddingManager()
 chat_manager = ChatManager(embedding_manager)
+bulk_ingestor = BulkIngestor(pdf_loader, embedding_manager)
+compactor = BackgroundCompactor(embedding_manager)
 
 class ChatRequest(BaseModel):
     message: str
+    collection: str = DEFAULT_COLLECTION
+
+class CollectionRequest(BaseModel):
+    name: str
+
+def check_collection(collection: str) -> str:
+    """Validate a collection name from a request, answering 400 if it is invalid"""
+    try:
+        return validate_collection_name(collection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/")
 async def root():
     return {"message": "RAG Chatbot API is running"}
 
 @app.post("/upload-pdf")
-async def upload_pdf(file: UploadFile = File(...)):
-    """Upload and process a PDF file"""
+async def upload_pdf(
+    file: UploadFile = File(...),
+    collection: str = Form(DEFAULT_COLLECTION)
+):
+    """Upload and process a PDF file into a collection"""
     if not file.filename or not file.filename.endswith('.pdf'):
         raise HTTPException(status_code=400, detail="File must be a PDF")
+    check_collection(collection)
     
     try:
-        # Read file content
-        content = await file.read()
-        
-        # Extract text from PDF
-        text_chunks = pdf_loader.extract_text_from_pdf(content, file.filename)
+        # Stream the upload through size and header validation
+        upload = await spool_upload(
+            file,
+            validate_header=lambda header: pdf_loader.validate_pdf_header(header, file.filename),
+            header_size=len(PDF_HEADER)
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        # Extract text from PDF straight from the spooled file, off the event loop
+        text_chunks = await run_in_threadpool(pdf_loader.extract_text_from_file, upload.file, file.filename)
         
         # Generate and store embeddings
-        embedding_manager.store_document_embeddings(text_chunks, file.filename)
+        embedding_stats = await run_in_threadpool(
+            embedding_manager.store_document_embeddings,
+            text_chunks,
+            file.filename,
+            content_hash=upload.content_hash,
+            byte_size=upload.size,
+            collection=collection
+        )
         
+        # Builds the collection's vector index once it has enough chunks
+        compactor.trigger()
         return {
             "message": f"PDF '{file.filename}' processed successfully",
-            "chunks_processed": len(text_chunks)
+            "chunks_processed": len(text_chunks),
+            "duplicate_chunks": embedding_stats["duplicate_chunks"],
+            "embedding_chunks_per_second": embedding_stats["chunks_per_second"]
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
+    finally:
+        await file.close()
+
+@app.post("/upload-pdfs")
+async def upload_pdfs(
+    files: List[UploadFile] = File(...),
+    collection: str = Form(DEFAULT_COLLECTION)
+):
+    """Upload and process many PDFs, or ZIP archives of PDFs, in one request"""
+    if len(files) > MAX_BULK_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many files; the limit is {MAX_BULK_FILES}")
+    check_collection(collection)
+    
+    total_size = 0
+    results = []
+    items = []
+    positions = []
+    staged_names = set()
+    
+    with tempfile.TemporaryDirectory(prefix="bulk_ingest_") as work_dir:
+        # Validate each upload and stage its PDFs on disk for the extraction workers
+        for file in files:
+            name = file.filename or "unnamed"
+            try:
+                upload = await spool_upload(
+                    file,
+                    validate_header=detect_upload_kind,
+                    header_size=max(len(PDF_HEADER), len(ZIP_HEADER))
+                )
+                total_size += upload.size
+                if total_size > MAX_BULK_UPLOAD_SIZE:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"Bulk upload exceeds maximum size of {MAX_BULK_UPLOAD_SIZE // (1024 * 1024)} MB"
+                    )
+                if detect_upload_kind(upload.header) == "pdf":
+                    staged = [(name, bulk_ingestor.save_file(upload.file, Path(work_dir)))]
+                else:
+                    staged = bulk_ingestor.expand_archive(upload.file, name, Path(work_dir))
+                for item in staged:
+                    # Documents are cataloged by base name, so a second file with
+                    # the same name (e.g. a/report.pdf and b/report.pdf) would
+                    # silently replace the first one
+                    if item[0] in staged_names:
+                        results.append({
+                            "filename": item[0],
+                            "status": "failed",
+                            "error": f"Duplicate file name '{item[0]}' in this request (from {name}); only the first one is ingested"
+                        })
+                        continue
+                    staged_names.add(item[0])
+                    items.append(item)
+                    positions.append(len(results))
+                    results.append(None)
+            except ValueError as e:
+                results.append({"filename": name, "status": "failed", "error": str(e)})
+            finally:
+                await file.close()
+        
+        if items:
+            try:
+                ingested = await run_in_threadpool(bulk_ingestor.ingest_paths, items, collection)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Error processing PDFs: {str(e)}")
+            for position, result in zip(positions, ingested):
+                results[position] = result
+            compactor.trigger()
+    
+    return summarize_results(results)
 
 @app.post("/chat")
 async def chat(request: ChatRequest):
     """Chat with the RAG system"""
+    check_collection(request.collection)
     try:
-        response = chat_manager.get_response(request.message)
+        response = await run_in_threadpool(chat_manager.get_response, request.message, request.collection)
         return {"response": response}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating response: {str(e)}")
 
+@app.get("/admission")
+async def admission_status():
+    """Current admission state per lane: active and queued requests"""
+    return {"slots": admission.slots, "active": admission.active, "lanes": admission.status()}
+
 @app.get("/documents")
-async def list_documents():
-    """List all processed documents"""
+async def list_documents(
+    limit: Optional[int] = None,
+    offset: int = 0,
+    collection: str = DEFAULT_COLLECTION
+):
+    """List processed documents in a collection from the catalog, optionally paginated"""
+    if (limit is not None and limit < 0) or offset < 0:
+        raise HTTPException(status_code=400, detail="limit and offset must be non-negative")
+    check_collection(collection)
+    
     try:
-        documents = embedding_manager.get_document_list()
-        return {"documents": documents}
+        page = embedding_manager.list_documents(limit=limit, offset=offset, collection=collection)
+        return {
+            "documents": [document["filename"] for document in page["documents"]],
+            "details": page["documents"],
+            "total": page["total"]
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving documents: {str(e)}")
 
 @app.delete("/documents/{filename}")
-async def delete_document(filename: str):
+async def delete_document(filename: str, collection: str = DEFAULT_COLLECTION):
     """Delete a specific document and its embeddings"""
+    check_collection(collection)
     try:
-        success = embedding_manager.delete_document(filename)
+        success = embedding_manager.delete_document(filename, collection)
         if success:
+            compactor.trigger()
             return {"message": f"Document '{filename}' deleted successfully"}
         else:
             raise HTTPException(status_code=404, detail=f"Document '{filename}' not found")
@@ -85,13 +267,117 @@ async def delete_document(filename: str):
         raise HTTPException(status_code=500, detail=f"Error deleting document: {str(e)}")
 
 @app.delete("/documents")
-async def delete_all_documents():
-    """Delete all documents and their embeddings"""
+async def delete_all_documents(collection: str = DEFAULT_COLLECTION):
+    """Delete all documents in a collection and their embeddings"""
+    check_collection(collection)
     try:
-        deleted_count = embedding_manager.delete_all_documents()
+        deleted_count = embedding_manager.delete_all_documents(collection)
+        compactor.trigger()
         return {"message": f"All documents deleted successfully", "deleted_chunks": deleted_count}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error deleting all documents: {str(e)}")
 
+@app.get("/collections")
+async def list_collections():
+    """List collections with their document and chunk counts"""
+    try:
+        return {"collections": embedding_manager.list_collections()}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving collections: {str(e)}")
+
+@app.post("/collections")
+async def create_collection(request: CollectionRequest):
+    """Create an empty collection"""
+    check_collection(request.name)
+    try:
+        embedding_manager.create_collection(request.name)
+        return {"message": f"Collection '{request.name}' created successfully"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating collection: {str(e)}")
+
+@app.get("/collections/{name}/dedup")
+async def dedup_report(name: str):
+    """Space saved in a collection by storing near-duplicate chunks once"""
+    check_collection(name)
+    try:
+        return embedding_manager.get_dedup_report(name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error building duplicate report: {str(e)}")
+
+@app.delete("/collections/{name}")
+async def drop_collection(name: str):
+    """Drop a collection together with all of its documents"""
+    check_collection(name)
+    if name == DEFAULT_COLLECTION:
+        raise HTTPException(status_code=400, detail="The default collection cannot be dropped")
+    try:
+        success = embedding_manager.drop_collection(name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error dropping collection: {str(e)}")
+    if not success:
+        raise HTTPException(status_code=404, detail=f"Collection '{name}' not found")
+    compactor.trigger()
+    return {"message": f"Collection '{name}' dropped successfully"}
+
+@app.get("/snapshot")
+async def export_snapshot(collection: Optional[List[str]] = Query(None)):
+    """Download collections (default: all) as a snapshot archive with their embeddings"""
+    for name in collection or []:
+        check_collection(name)
+    
+    out = tempfile.NamedTemporaryFile(prefix="snapshot_", suffix=".zip", delete=False)
+    try:
+        with out:
+            await run_in_threadpool(embedding_manager.export_snapshot, out, collection)
+    except SnapshotConflictError as e:
+        # Documents changed mid-export; the client can simply retry
+        os.unlink(out.name)
+        raise HTTPException(status_code=409, detail=str(e))
+    except SnapshotError as e:
+        os.unlink(out.name)
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        os.unlink(out.name)
+        raise HTTPException(status_code=500, detail=f"Error exporting snapshot: {str(e)}")
+    
+    return FileResponse(
+        out.name,
+        media_type="application/zip",
+        filename="snapshot.zip",
+        background=BackgroundTask(os.unlink, out.name)
+    )
+
+@app.post("/snapshot")
+async def import_snapshot(file: UploadFile = File(...)):
+    """Restore collections from a snapshot archive without re-embedding them"""
+    def validate_header(header: bytes):
+        if not header.startswith(ZIP_HEADER):
+            raise ValueError("File must be a snapshot ZIP archive")
+    
+    try:
+        upload = await spool_upload(
+            file,
+            max_size=MAX_SNAPSHOT_SIZE,
+            validate_header=validate_header,
+            header_size=len(ZIP_HEADER)
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        imported = await run_in_threadpool(embedding_manager.import_snapshot, upload.file)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error importing snapshot: {str(e)}")
+    finally:
+        await file.close()
+    
+    # Replaced documents are tombstoned; purge them in the background
+    compactor.trigger()
+    return {"message": "Snapshot imported successfully", "collections": imported}
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
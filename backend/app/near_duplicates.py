@@ -0,0 +1,211 @@
+import os
+import re
+import zlib
+import hashlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Near-duplicate chunks are stored once; later copies become references
+DEDUP_ENABLED = os.environ.get("DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Estimated Jaccard similarity of word shingles at which a chunk counts as a duplicate
+DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", "0.9"))
+
+# MinHash signature length and LSH bands; bands must divide the signature.
+# 128 permutations in 16 bands of 8 find pairs above ~0.8 similarity with
+# near certainty while rarely proposing pairs below ~0.5.
+MINHASH_PERMUTATIONS = int(os.environ.get("MINHASH_PERMUTATIONS", "128"))
+MINHASH_BANDS = int(os.environ.get("MINHASH_BANDS", "16"))
+MINHASH_SHINGLE_WORDS = int(os.environ.get("MINHASH_SHINGLE_WORDS", "3"))
+
+# Fixed so signatures stored by one process match those of the next
+_MINHASH_SEED = 1
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_WORD = re.compile(r"\w+")
+
+# A link says where a duplicate chunk's canonical copy is:
+# ("row", chunk row id, similarity) for a stored chunk, or
+# ("chunk", index, similarity) for an earlier chunk in the same batch
+Link = Tuple[str, int, float]
+
+class NearDuplicateDetector:
+    """MinHash signatures and LSH banding over chunk text.
+
+    Each chunk is reduced to the set of its lowercased word shingles and
+    summarized by a MinHash signature, whose share of equal positions
+    estimates the Jaccard similarity of two chunks. Signatures are cut into
+    bands; chunks sharing any band hash are candidates, and a candidate is
+    a duplicate when its estimated similarity reaches the threshold.
+    """
+
+    def __init__(
+        self,
+        threshold: float = DEDUP_THRESHOLD,
+        num_perm: int = MINHASH_PERMUTATIONS,
+        bands: int = MINHASH_BANDS,
+        shingle_words: int = MINHASH_SHINGLE_WORDS,
+        enabled: bool = DEDUP_ENABLED
+    ):
+        if not 0 < threshold <= 1:
+            raise ValueError("Duplicate threshold must be in (0, 1]")
+        if num_perm % bands != 0:
+            raise ValueError("MinHash permutations must be a multiple of the band count")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_words = shingle_words
+        self.enabled = enabled
+
+        rng = np.random.default_rng(_MINHASH_SEED)
+        self._a = rng.integers(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+    def _shingles(self, text: str) -> np.ndarray:
+        """32-bit hashes of the text's word shingles"""
+        words = _WORD.findall(text.lower())
+        if len(words) <= self.shingle_words:
+            shingles = {" ".join(words) or text.strip()}
+        else:
+            shingles = {
+                " ".join(words[i:i + self.shingle_words])
+                for i in range(len(words) - self.shingle_words + 1)
+            }
+        return np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        """MinHash signature of a chunk's text as uint32 values"""
+        hashes = self._shingles(text)
+        # Universal hashing (a*x + b) mod p; uint64 products wrap like the
+        # reference implementation, which keeps the hashes well mixed
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def band_keys(self, signature: np.ndarray) -> List[int]:
+        """One signed 64-bit key per band, distinct across bands"""
+        keys = []
+        for band in range(self.bands):
+            digest = hashlib.blake2b(
+                band.to_bytes(2, "little") + signature[band * self.rows:(band + 1) * self.rows].tobytes(),
+                digest_size=8
+            ).digest()
+            keys.append(int.from_bytes(digest, "little", signed=True))
+        return keys
+
+    @staticmethod
+    def similarity(a: np.ndarray, b: np.ndarray) -> float:
+        """Estimated Jaccard similarity of two signatures"""
+        return float(np.mean(a == b))
+
+    @staticmethod
+    def decode(value) -> np.ndarray:
+        return np.frombuffer(value, dtype=np.uint32)
+
+    def link(
+        self,
+        signatures: List[np.ndarray],
+        existing: Iterable[Tuple[int, np.ndarray]]
+    ) -> List[Optional[Link]]:
+        """Match each new chunk to the most similar canonical chunk, if any.
+
+        existing holds (row id, signature) of stored canonical chunks that
+        share a band with the new ones. New chunks without a match become
+        canonical themselves, so later chunks in the batch can link to them.
+        """
+        buckets: Dict[int, List[Tuple[str, int]]] = {}
+        known: Dict[Tuple[str, int], np.ndarray] = {}
+
+        def add(target: Tuple[str, int], signature: np.ndarray, keys: List[int]):
+            known[target] = signature
+            for key in keys:
+                buckets.setdefault(key, []).append(target)
+
+        for row_id, signature in existing:
+            if len(signature) == self.num_perm:  # skip signatures from other settings
+                add(("row", row_id), signature, self.band_keys(signature))
+
+        links: List[Optional[Link]] = []
+        for index, signature in enumerate(signatures):
+            keys = self.band_keys(signature)
+            candidates = {target for key in keys for target in buckets.get(key, ())}
+            best = None
+            for target in sorted(candidates):
+                score = self.similarity(signature, known[target])
+                if score >= self.threshold and (best is None or score > best[2]):
+                    best = (target[0], target[1], score)
+            if best is None:
+                add(("chunk", index), signature, keys)
+            links.append(best)
+        return links
+
+def localize_links(
+    links: List[Optional[Link]],
+    vectors: List[Optional[List[float]]],
+    start: int,
+    end: int,
+    stored_rows: Dict[int, int]
+) -> Tuple[List[Optional[Link]], List[Optional[List[float]]]]:
+    """Links and vectors for one document out of a multi-document batch.
+
+    Links to chunks of the same document become document-local indices.
+    Links to an earlier document's chunk point at its stored row; if that
+    document wasn't stored, the chunk is kept as canonical and reuses the
+    other chunk's embedding instead.
+    """
+    doc_links = []
+    doc_vectors = list(vectors[start:end])
+    for index in range(start, end):
+        link = links[index]
+        if link is not None and link[0] == "chunk":
+            kind, target, score = link
+            if target >= start:
+                link = ("chunk", target - start, score)
+            elif target in stored_rows:
+                link = ("row", stored_rows[target], score)
+            else:
+                doc_vectors[index - start] = vectors[target]
+                link = None
+        doc_links.append(link)
+    return doc_links, doc_vectors
+
+def dedup_stats(texts: List[str], links: List[Optional[Link]]) -> Dict[str, int]:
+    """What deduplication saved for one ingest"""
+    duplicates = [text for text, link in zip(texts, links) if link is not None]
+    return {
+        "duplicate_chunks": len(duplicates),
+        "embedded_chunks": len(texts) - len(duplicates),
+        "text_bytes_saved": sum(len(text.encode("utf-8")) for text in duplicates)
+    }
+
+def space_report(
+    detector: NearDuplicateDetector,
+    collection: str,
+    stored_chunks: int,
+    duplicate_chunks: int,
+    text_bytes_saved: int,
+    embedding_bytes: float,
+    signature_bytes: int
+) -> Dict[str, object]:
+    """Space a collection saves by storing near-duplicates as references.
+
+    embedding_bytes is the average stored size of one embedding; the
+    signatures kept for detection are counted against the savings. Vector
+    index entries, also saved, are not included.
+    """
+    chunks = stored_chunks + duplicate_chunks
+    embedding_bytes_saved = int(round(duplicate_chunks * embedding_bytes))
+    return {
+        "collection": collection,
+        "enabled": detector.enabled,
+        "threshold": detector.threshold,
+        "chunks": chunks,
+        "stored_chunks": stored_chunks,
+        "duplicate_chunks": duplicate_chunks,
+        "duplicate_ratio": round(duplicate_chunks / chunks, 4) if chunks else 0.0,
+        "text_bytes_saved": text_bytes_saved,
+        "embedding_bytes_saved": embedding_bytes_saved,
+        "signature_bytes": signature_bytes,
+        "net_bytes_saved": text_bytes_saved + embedding_bytes_saved - signature_bytes
+    }
@@ -1,34 +1,82 @@
 import io
+import os
 import logging
-from typing import List, Optional
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
 from pypdf import PdfReader
 from pypdf.errors import PdfReadError, FileNotDecryptedError
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from .chunking import CHUNK_OVERLAP_TOKENS, CHUNK_SIZE_TOKENS, PageSpanChunker
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+PDF_HEADER = b'%PDF-'
+MIN_PDF_SIZE = 100  # PDFs are typically much larger
+
+# Per-document statistics attached to every chunk's metadata by the loader
+DOCUMENT_METADATA_KEYS = ("filename", "total_chunks", "successful_pages", "failed_pages", "total_pages")
+
+def split_document_metadata(text_chunks: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Separate per-document statistics from per-chunk metadata.
+    
+    Returns the document-level stats (taken from the first chunk) and a copy
+    of the chunk metadata with those keys removed, so storage keeps them once
+    per document instead of once per chunk.
+    """
+    document_metadata = {}
+    if text_chunks:
+        first = text_chunks[0]["metadata"]
+        document_metadata = {key: first[key] for key in DOCUMENT_METADATA_KEYS if key in first}
+    
+    chunk_metadata = [
+        {key: value for key, value in chunk["metadata"].items() if key not in DOCUMENT_METADATA_KEYS}
+        for chunk in text_chunks
+    ]
+    return document_metadata, chunk_metadata
+
 class PDFLoader:
-    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 200):
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            separators=["\n\n", "\n", " ", ""]
-        )
+    def __init__(self, chunk_size: int = CHUNK_SIZE_TOKENS, chunk_overlap: int = CHUNK_OVERLAP_TOKENS):
+        # Sizes are in tokens of the embedding model's tokenizer
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.chunker = PageSpanChunker(chunk_tokens=chunk_size, overlap_tokens=chunk_overlap)
         self.min_text_length = 50  # Minimum text length to consider valid
     
+    def validate_pdf_header(self, header: bytes, filename: str) -> None:
+        """Validate the leading bytes of a PDF; usable before the full file has arrived"""
+        if not header:
+            raise ValueError(f"Empty PDF content for file: {filename}")
+        
+        # Check for PDF header
+        if not header.startswith(PDF_HEADER):
+            raise ValueError(f"Invalid PDF format - missing PDF header: {filename}")
+    
     def _validate_pdf_content(self, pdf_content: bytes, filename: str) -> None:
         """Validate PDF content before processing"""
         if not pdf_content:
             raise ValueError(f"Empty PDF content for file: {filename}")
         
-        if len(pdf_content) < 100:  # PDFs are typically much larger
+        if len(pdf_content) < MIN_PDF_SIZE:
             raise ValueError(f"PDF file appears to be too small or corrupted: {filename}")
         
-        # Check for PDF header
-        if not pdf_content.startswith(b'%PDF-'):
-            raise ValueError(f"Invalid PDF format - missing PDF header: {filename}")
+        self.validate_pdf_header(pdf_content[:len(PDF_HEADER)], filename)
+    
+    def _validate_pdf_stream(self, pdf_file: BinaryIO, filename: str) -> None:
+        """Validate a seekable PDF file object without reading it into memory"""
+        pdf_file.seek(0, os.SEEK_END)
+        size = pdf_file.tell()
+        pdf_file.seek(0)
+        
+        if size == 0:
+            raise ValueError(f"Empty PDF content for file: {filename}")
+        
+        if size < MIN_PDF_SIZE:
+            raise ValueError(f"PDF file appears to be too small or corrupted: {filename}")
+        
+        header = pdf_file.read(len(PDF_HEADER))
+        pdf_file.seek(0)
+        self.validate_pdf_header(header, filename)
     
     def _extract_page_text_robust(self, page, page_num: int) -> Optional[str]:
         """Robustly extract text from a single page with multiple fallback methods"""
@@ -73,13 +121,23 @@ class PDFLoader:
             return None
     
     def extract_text_from_pdf(self, pdf_content: bytes, filename: str) -> List[dict]:
-        """Extract text from PDF and split into chunks with robust error handling"""
+        """Extract text from in-memory PDF bytes and split into chunks"""
+        # Validate PDF content
+        self._validate_pdf_content(pdf_content, filename)
+        
+        # Create a file-like object from bytes
+        return self.extract_text_from_file(io.BytesIO(pdf_content), filename)
+    
+    def extract_text_from_file(self, pdf_file: BinaryIO, filename: str) -> List[dict]:
+        """Extract text from a seekable PDF file object and split into chunks.
+        
+        pypdf reads objects lazily from the stream, so a disk-backed file keeps
+        memory use roughly independent of the PDF size. Passing a path would
+        not: PdfReader slurps paths into a BytesIO.
+        """
         try:
             # Validate PDF content
-            self._validate_pdf_content(pdf_content, filename)
-            
-            # Create a file-like object from bytes
-            pdf_file = io.BytesIO(pdf_content)
+            self._validate_pdf_stream(pdf_file, filename)
             
             # Read PDF using pypdf with error handling
             try:
@@ -96,7 +154,7 @@ class PDFLoader:
             logger.info(f"Processing PDF '{filename}' with {len(reader.pages)} pages")
             
             # Extract text from all pages with robust handling
-            full_text = ""
+            pages = []
             successful_pages = 0
             failed_pages = 0
             
@@ -105,56 +163,49 @@ class PDFLoader:
                     page_text = self._extract_page_text_robust(page, page_num)
                     
                     if page_text is not None:
-                        # Only add page separator if we have text
+                        # Only keep pages that have text
                         if page_text.strip():
-                            full_text += f"\n--- Page {page_num + 1} ---\n{page_text}"
+                            pages.append((page_num + 1, page_text))
                             successful_pages += 1
                         else:
                             logger.warning(f"Page {page_num + 1}: Contains only whitespace")
                     else:
                         failed_pages += 1
                         logger.warning(f"Page {page_num + 1}: Failed to extract any text")
-                        # Add a placeholder for failed pages
-                        full_text += f"\n--- Page {page_num + 1} ---\n[Text extraction failed for this page]"
                         
                 except Exception as e:
                     failed_pages += 1
                     logger.error(f"Error processing page {page_num + 1}: {str(e)}")
-                    full_text += f"\n--- Page {page_num + 1} ---\n[Error processing this page: {str(e)}]"
             
             logger.info(f"PDF processing complete: {successful_pages} successful, {failed_pages} failed pages")
             
             # Validate that we extracted some meaningful text
-            clean_text = full_text.strip()
-            if not clean_text or len(clean_text) < self.min_text_length:
-                if failed_pages == len(reader.pages):
-                    raise ValueError(f"Could not extract any readable text from PDF: {filename}")
-                else:
-                    logger.warning(f"Extracted text is very short ({len(clean_text)} chars) from PDF: {filename}")
-            
-            # Split text into chunks
-            try:
-                chunks = self.text_splitter.split_text(full_text)
-            except Exception as e:
-                logger.error(f"Error splitting text into chunks: {str(e)}")
-                # Fallback: create a single chunk
-                chunks = [full_text]
+            text_length = sum(len(text.strip()) for _, text in pages)
+            if not pages:
+                raise ValueError(f"Could not extract any readable text from PDF: {filename}")
+            if text_length < self.min_text_length:
+                logger.warning(f"Extracted text is very short ({text_length} chars) from PDF: {filename}")
             
-            # Filter out empty chunks
-            valid_chunks = [chunk for chunk in chunks if chunk.strip()]
+            # Split the page stream into token-sized chunks with page spans
+            chunks = self.chunker.split_pages(pages)
             
-            if not valid_chunks:
+            if not chunks:
                 raise ValueError(f"No valid text chunks could be created from PDF: {filename}")
             
             # Create chunk objects with metadata
             text_chunks = []
-            for i, chunk in enumerate(valid_chunks):
+            for i, chunk in enumerate(chunks):
                 text_chunks.append({
-                    "content": chunk,
+                    "content": chunk["content"],
                     "metadata": {
                         "filename": filename,
                         "chunk_id": i,
-                        "total_chunks": len(valid_chunks),
+                        "start_page": chunk["start_page"],
+                        "start_offset": chunk["start_offset"],
+                        "end_page": chunk["end_page"],
+                        "end_offset": chunk["end_offset"],
+                        "token_count": chunk["token_count"],
+                        "total_chunks": len(chunks),
                         "successful_pages": successful_pages,
                         "failed_pages": failed_pages,
                         "total_pages": len(reader.pages)
@@ -0,0 +1,334 @@
+"""Snapshot archives of collections, for restore and warm start without re-embedding.
+
+A snapshot is a ZIP archive with, per collection:
+
+    collections/<name>/catalog.jsonl     one active document per line
+    collections/<name>/chunks.jsonl      one stored chunk per line: document, chunk id, text, metadata
+    collections/<name>/embeddings.npy    float32 matrix, row i belongs to line i of chunks.jsonl
+    collections/<name>/references.jsonl  near-duplicate chunks stored as references
+
+plus manifest.json naming the format version and embedding model. Chunks
+refer to documents by their line number in catalog.jsonl, so snapshots
+don't depend on database ids. Embeddings are written and read in batches,
+so neither side holds a whole collection in memory.
+
+Command line, from the backend directory:
+
+    python -m app.snapshot export snapshot.zip [--collection NAME ...] [--sqlite]
+    python -m app.snapshot import snapshot.zip [--sqlite]
+"""
+import io
+import os
+import json
+import zipfile
+import argparse
+from datetime import datetime, timezone
+from itertools import chain, islice
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+SNAPSHOT_FORMAT = "docuchatai-snapshot"
+SNAPSHOT_VERSION = 1
+
+# Chunks per batch when streaming a snapshot into a database
+SNAPSHOT_BATCH_SIZE = 2000
+
+# Largest snapshot accepted for import over the API
+MAX_SNAPSHOT_SIZE = int(os.environ.get("MAX_SNAPSHOT_SIZE_MB", "10240")) * 1024 * 1024
+
+_EMBEDDING_DTYPE = np.dtype("<f4")
+
+# Row fields the importers rely on, with their accepted JSON types
+_DOCUMENT_FIELDS = {"filename": (str,)}
+_CHUNK_FIELDS = {"document": (int,), "chunk_id": (int,), "content": (str,), "metadata": (dict,)}
+_REFERENCE_FIELDS = {
+    "document": (int,),
+    "chunk_id": (int,),
+    "canonical_document": (int,),
+    "canonical_chunk_id": (int,),
+    "similarity": (int, float),
+    "content_bytes": (int,),
+    "metadata": (dict,)
+}
+
+# Catalog fields that may be left out
+_DOCUMENT_OPTIONAL_FIELDS = {
+    "content_hash": (str, type(None)),
+    "page_count": (int,),
+    "chunk_count": (int,),
+    "byte_size": (int, type(None)),
+    "metadata": (dict, type(None)),
+    "ingested_at": (str, type(None))
+}
+
+class SnapshotError(ValueError):
+    """Raised for archives that aren't valid snapshots or don't fit this deployment"""
+
+class SnapshotConflictError(SnapshotError):
+    """Raised when a collection changes while it is being exported; retrying can succeed"""
+
+def _member(collection: str, name: str) -> str:
+    return f"collections/{collection}/{name}"
+
+def _check_row(row: Any, where: str, fields: Dict[str, tuple], optional: Optional[Dict[str, tuple]] = None) -> Dict[str, Any]:
+    """Raise SnapshotError unless row is an object with the given fields"""
+    if not isinstance(row, dict):
+        raise SnapshotError(f"{where} is not a JSON object")
+    for key, types in chain(fields.items(), (optional or {}).items()):
+        if key not in row:
+            if key in fields:
+                raise SnapshotError(f"{where} is missing '{key}'")
+        elif isinstance(row[key], bool) or not isinstance(row[key], types):
+            raise SnapshotError(f"{where} has an invalid '{key}'")
+    return row
+
+def _check_index(row: Dict[str, Any], key: str, count: int, where: str) -> Dict[str, Any]:
+    """Raise SnapshotError unless row[key] is a line number of the catalog"""
+    if not 0 <= row[key] < count:
+        raise SnapshotError(f"{where} refers to document {row[key]}, but the catalog has {count}")
+    return row
+
+def canonical_row_id(
+    rows: Dict[Tuple[int, int], int],
+    document_ids: List[int],
+    reference: Dict[str, Any],
+    collection: str
+) -> int:
+    """Row id of a reference's canonical chunk among the rows just imported"""
+    key = (document_ids[reference["canonical_document"]], reference["canonical_chunk_id"])
+    if key not in rows:
+        raise SnapshotError(
+            f"Snapshot of '{collection}' references chunk {reference['canonical_chunk_id']} "
+            f"of document {reference['canonical_document']}, which it does not contain"
+        )
+    return rows[key]
+
+class SnapshotWriter:
+    """Write collections into a snapshot archive, one after another"""
+
+    def __init__(self, fileobj: BinaryIO, embedding_model: str):
+        self.zip = zipfile.ZipFile(fileobj, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True)
+        self.manifest: Dict[str, Any] = {
+            "format": SNAPSHOT_FORMAT,
+            "version": SNAPSHOT_VERSION,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "embedding_model": embedding_model,
+            "collections": {}
+        }
+
+    @staticmethod
+    def _entry(name: str, compress_type: int) -> zipfile.ZipInfo:
+        info = zipfile.ZipInfo(name, date_time=datetime.now().timetuple()[:6])
+        info.compress_type = compress_type
+        return info
+
+    def _write_jsonl(self, name: str, rows: Iterable[Dict[str, Any]]) -> int:
+        count = 0
+        with self.zip.open(self._entry(name, zipfile.ZIP_DEFLATED), "w", force_zip64=True) as raw:
+            with io.TextIOWrapper(raw, encoding="utf-8", newline="\n") as out:
+                for row in rows:
+                    out.write(json.dumps(row, ensure_ascii=False, default=str))
+                    out.write("\n")
+                    count += 1
+        return count
+
+    def _write_embeddings(self, name: str, count: int, vectors: Iterable[np.ndarray]) -> int:
+        """Stream vectors into an NPY file whose row count is known up front"""
+        vectors = iter(vectors)
+        first = next(vectors, None)
+        dimensions = len(first) if first is not None else 0
+
+        # Floats barely compress; store them as-is
+        written = 0
+        with self.zip.open(self._entry(name, zipfile.ZIP_STORED), "w", force_zip64=True) as out:
+            np.lib.format.write_array_header_1_0(out, {
+                "descr": np.lib.format.dtype_to_descr(_EMBEDDING_DTYPE),
+                "fortran_order": False,
+                "shape": (count, dimensions)
+            })
+            if first is not None:
+                for vector in chain([first], vectors):
+                    out.write(np.asarray(vector, dtype=_EMBEDDING_DTYPE).tobytes())
+                    written += 1
+        if written != count:
+            raise SnapshotConflictError(f"Expected {count} embeddings for {name}, read {written}; the data changed during export")
+        return dimensions
+
+    def write_collection(
+        self,
+        collection: str,
+        documents: List[Dict[str, Any]],
+        chunk_count: int,
+        chunks: Iterable[Dict[str, Any]],
+        vectors: Iterable[np.ndarray],
+        references: Iterable[Dict[str, Any]]
+    ):
+        """Write one collection.
+
+        chunks and vectors must yield the same stored chunks in the same
+        order; chunks are consumed before vectors is started.
+        """
+        self._write_jsonl(_member(collection, "catalog.jsonl"), documents)
+        written = self._write_jsonl(_member(collection, "chunks.jsonl"), chunks)
+        if written != chunk_count:
+            raise SnapshotConflictError(f"Expected {chunk_count} chunks in '{collection}', read {written}; the data changed during export")
+        dimensions = self._write_embeddings(_member(collection, "embeddings.npy"), chunk_count, vectors)
+        reference_count = self._write_jsonl(_member(collection, "references.jsonl"), references)
+        self.manifest["collections"][collection] = {
+            "documents": len(documents),
+            "chunks": chunk_count,
+            "references": reference_count,
+            "dimensions": dimensions
+        }
+
+    def close(self) -> Dict[str, Any]:
+        self.zip.writestr("manifest.json", json.dumps(self.manifest, indent=2))
+        self.zip.close()
+        return self.manifest
+
+class SnapshotReader:
+    """Read collections back out of a snapshot archive"""
+
+    def __init__(self, fileobj: BinaryIO):
+        try:
+            self.zip = zipfile.ZipFile(fileobj)
+            self.manifest = json.loads(self.zip.read("manifest.json"))
+        except (zipfile.BadZipFile, KeyError, json.JSONDecodeError) as e:
+            raise SnapshotError(f"Not a snapshot archive: {str(e)}")
+        if self.manifest.get("format") != SNAPSHOT_FORMAT:
+            raise SnapshotError("Not a snapshot archive: unknown format")
+        if self.manifest.get("version") != SNAPSHOT_VERSION:
+            raise SnapshotError(f"Unsupported snapshot version {self.manifest.get('version')}")
+        self._document_counts: Dict[str, int] = {}
+
+    def check_model(self, embedding_model: str):
+        """Refuse to mix embeddings from a different model into this index"""
+        if self.manifest.get("embedding_model") != embedding_model:
+            raise SnapshotError(
+                f"Snapshot embeddings come from '{self.manifest.get('embedding_model')}', "
+                f"but this deployment uses '{embedding_model}'"
+            )
+
+    def collections(self) -> List[str]:
+        collections = self.manifest.get("collections")
+        if not isinstance(collections, dict):
+            raise SnapshotError("Snapshot manifest does not list its collections")
+        return list(collections)
+
+    def _read_jsonl(self, name: str) -> Iterator[Tuple[str, Any]]:
+        """Yield (location, row) for each line, the location naming it in errors"""
+        try:
+            raw = self.zip.open(name)
+        except KeyError:
+            raise SnapshotError(f"Snapshot is missing {name}")
+        with raw:
+            for number, line in enumerate(io.TextIOWrapper(raw, encoding="utf-8"), 1):
+                if line.strip():
+                    try:
+                        yield f"{name} line {number}", json.loads(line)
+                    except json.JSONDecodeError as e:
+                        raise SnapshotError(f"{name} line {number} is not valid JSON: {str(e)}")
+
+    def documents(self, collection: str) -> List[Dict[str, Any]]:
+        """Catalog rows, checked for the fields the importers use and unique filenames"""
+        documents = []
+        filenames = set()
+        for where, row in self._read_jsonl(_member(collection, "catalog.jsonl")):
+            document = _check_row(row, where, _DOCUMENT_FIELDS, _DOCUMENT_OPTIONAL_FIELDS)
+            if document["filename"] in filenames:
+                raise SnapshotError(f"{where} repeats document '{document['filename']}'")
+            if document.get("ingested_at") is not None:
+                try:
+                    datetime.fromisoformat(document["ingested_at"])
+                except ValueError:
+                    raise SnapshotError(f"{where} has an invalid 'ingested_at'")
+            filenames.add(document["filename"])
+            documents.append(document)
+        self._document_counts[collection] = len(documents)
+        return documents
+
+    def _document_count(self, collection: str) -> int:
+        if collection not in self._document_counts:
+            self.documents(collection)
+        return self._document_counts[collection]
+
+    def references(self, collection: str) -> Iterator[Dict[str, Any]]:
+        """Reference rows; their document indexes are checked against the catalog.
+
+        Whether the canonical chunk exists is only known to the database,
+        so importers check that themselves.
+        """
+        count = self._document_count(collection)
+        for where, row in self._read_jsonl(_member(collection, "references.jsonl")):
+            reference = _check_row(row, where, _REFERENCE_FIELDS)
+            _check_index(reference, "document", count, where)
+            yield _check_index(reference, "canonical_document", count, where)
+
+    def chunk_batches(
+        self,
+        collection: str,
+        batch_size: int = SNAPSHOT_BATCH_SIZE
+    ) -> Iterator[Tuple[List[Dict[str, Any]], np.ndarray]]:
+        """Yield (chunks, embedding matrix) batches, reading both files in step"""
+        count = self._document_count(collection)
+        chunks = (
+            _check_index(_check_row(row, where, _CHUNK_FIELDS), "document", count, where)
+            for where, row in self._read_jsonl(_member(collection, "chunks.jsonl"))
+        )
+        try:
+            raw = self.zip.open(_member(collection, "embeddings.npy"))
+        except KeyError:
+            raise SnapshotError(f"Snapshot is missing {_member(collection, 'embeddings.npy')}")
+        with raw:
+            version = np.lib.format.read_magic(raw)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(raw)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(raw)
+            if dtype != _EMBEDDING_DTYPE or fortran_order or len(shape) != 2:
+                raise SnapshotError(f"Embeddings of '{collection}' must be a row-major float32 matrix")
+            rows, dimensions = shape
+
+            read = 0
+            while True:
+                batch = list(islice(chunks, batch_size))
+                if not batch:
+                    break
+                data = raw.read(len(batch) * dimensions * _EMBEDDING_DTYPE.itemsize)
+                if len(data) != len(batch) * dimensions * _EMBEDDING_DTYPE.itemsize:
+                    raise SnapshotError(f"Snapshot of '{collection}' has fewer embeddings than chunks")
+                read += len(batch)
+                yield batch, np.frombuffer(data, dtype=_EMBEDDING_DTYPE).reshape(len(batch), dimensions)
+            if read != rows:
+                raise SnapshotError(f"Snapshot of '{collection}' has {rows} embeddings for {read} chunks")
+
+def _make_manager(use_sqlite: bool):
+    if use_sqlite:
+        from .embeddings_sqlite import EmbeddingManager
+    else:
+        from .embeddings_postgres import EmbeddingManager
+    return EmbeddingManager()
+
+def main():
+    parser = argparse.ArgumentParser(description="Export or import collection snapshots")
+    parser.add_argument("action", choices=["export", "import"])
+    parser.add_argument("path", help="Snapshot archive to write or read")
+    parser.add_argument("--collection", action="append", help="Collection to export (repeatable; default all)")
+    parser.add_argument("--sqlite", action="store_true", help="Use the local SQLite store instead of PostgreSQL")
+    args = parser.parse_args()
+
+    manager = _make_manager(args.sqlite)
+    if args.action == "export":
+        with open(args.path, "wb") as out:
+            manifest = manager.export_snapshot(out, args.collection)
+        for name, counts in manifest["collections"].items():
+            print(f"Exported '{name}': {counts['documents']} documents, {counts['chunks']} chunks, {counts['references']} references")
+    else:
+        with open(args.path, "rb") as source:
+            imported = manager.import_snapshot(source)
+        for name, counts in imported.items():
+            print(f"Imported '{name}': {counts['documents']} documents, {counts['chunks']} chunks, {counts['references']} references")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import os
+import logging
+from functools import lru_cache
+
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+# Embedding model whose tokenizer sizes chunks and embedding batches
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str = EMBEDDING_MODEL):
+    """Return the tiktoken encoding for a model, or None if it can't be loaded.
+
+    tiktoken downloads its BPE files on first use, so without network access
+    loading fails unless TIKTOKEN_CACHE_DIR holds them (the Docker image
+    preloads it). Callers then fall back to estimate_tokens(), which sizes
+    chunks and batches only roughly.
+    """
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.error(
+            f"tiktoken encoding for '{model}' unavailable; chunk and batch sizes will be "
+            f"estimated from character counts. Preload it into TIKTOKEN_CACHE_DIR "
+            f"(currently {os.environ.get('TIKTOKEN_CACHE_DIR') or 'unset'}) to fix this: {str(e)}"
+        )
+        return None
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for when no tokenizer is available"""
+    return len(text) // 3 + 1
@@ -0,0 +1,133 @@
+import os
+import hashlib
+import logging
+from typing import BinaryIO, Callable, Dict, Optional, Tuple
+from fastapi import UploadFile
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+
+logger = logging.getLogger(__name__)
+
+# Size of each read from the incoming upload
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+# Largest upload accepted, configurable per deployment
+MAX_UPLOAD_SIZE = int(os.environ.get("MAX_UPLOAD_SIZE_MB", "200")) * 1024 * 1024
+
+# Request body allowance on top of the file limit for multipart boundaries,
+# part headers and form fields
+FORM_OVERHEAD = 1024 * 1024  # 1 MB
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds the configured size limit"""
+
+class SpooledUpload:
+    """A validated upload backed by a spooled temporary file"""
+
+    def __init__(self, file: BinaryIO, filename: str, size: int, content_hash: str, header: bytes):
+        self.file = file
+        self.filename = filename
+        self.size = size
+        self.content_hash = content_hash
+        self.header = header
+
+class RequestSizeLimitMiddleware:
+    """ASGI middleware that caps the request body on the routes given.
+
+    FastAPI parses a multipart form, spooling every file to disk, before the
+    route handler runs, so the limit has to be enforced here: a declared
+    Content-Length over it is refused before any of the body is received,
+    and a body that turns out larger (e.g. with chunked transfer encoding)
+    is cut off as soon as the running byte count passes it.
+    """
+
+    def __init__(self, app, routes: Dict[Tuple[str, str], int]):
+        self.app = app
+        self.routes = routes  # (method, path) -> largest body in bytes
+
+    async def __call__(self, scope, receive, send):
+        max_size = self.routes.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+        if max_size is None:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request exceeds maximum size of {(max_size - FORM_OVERHEAD) // (1024 * 1024)} MB"
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > max_size:
+            logger.warning(f"Rejected {scope['method']} {scope['path']} with 413: Content-Length {int(content_length)}")
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_size:
+                    # FastAPI passes HTTPExceptions from body parsing through
+                    # to its exception handler, which answers with the 413
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except HTTPException as e:
+            if e.status_code != 413 or response_started:
+                raise
+            await JSONResponse({"detail": e.detail}, status_code=413)(scope, receive, send)
+
+async def spool_upload(
+    upload: UploadFile,
+    max_size: int = MAX_UPLOAD_SIZE,
+    validate_header: Optional[Callable[[bytes], None]] = None,
+    header_size: int = 8
+) -> SpooledUpload:
+    """Validate an upload chunk by chunk without buffering it in memory.
+
+    Starlette spools multipart file parts into a SpooledTemporaryFile (kept in
+    memory up to 1 MB, on disk beyond that). This reads it back in fixed-size
+    chunks, enforcing the size limit and header check as it goes and hashing
+    the content, then rewinds the file so it can be handed on as a stream.
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    header = b""
+    header_checked = False
+
+    await upload.seek(0)
+    while True:
+        chunk = await upload.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+
+        size += len(chunk)
+        if size > max_size:
+            raise UploadTooLargeError(
+                f"Upload '{upload.filename}' exceeds maximum size of {max_size // (1024 * 1024)} MB"
+            )
+
+        # Validate the header as soon as enough bytes have arrived
+        if not header_checked:
+            header += chunk[:header_size - len(header)]
+            if len(header) >= header_size:
+                if validate_header:
+                    validate_header(header)
+                header_checked = True
+
+        hasher.update(chunk)
+
+    # Files shorter than the header still get checked
+    if not header_checked and validate_header:
+        validate_header(header)
+
+    await upload.seek(0)
+    return SpooledUpload(upload.file, upload.filename, size, hasher.hexdigest(), header)
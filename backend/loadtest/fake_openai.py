@@ -0,0 +1,268 @@
+"""Local stand-in for the OpenAI API, for load tests without real API calls.
+
+Serves /v1/embeddings and /v1/chat/completions (including streaming) with
+deterministic fake output. Latency, throughput and error injection are set
+through FAKE_OPENAI_* environment variables or at runtime via
+PUT /fake/config. Point the backend at it with
+
+    OPENAI_BASE_URL=http://localhost:8100/v1 OPENAI_API_KEY=fake
+
+Run from the backend directory: python -m loadtest.fake_openai --port 8100
+"""
+import os
+import json
+import time
+import uuid
+import random
+import asyncio
+import base64
+import hashlib
+import argparse
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Injected behaviour; every value can be changed at runtime via PUT /fake/config
+config: Dict[str, float] = {
+    "latency_ms": float(os.environ.get("FAKE_OPENAI_LATENCY_MS", "50")),  # per request
+    "jitter_ms": float(os.environ.get("FAKE_OPENAI_JITTER_MS", "20")),
+    "embedding_tokens_per_second": float(os.environ.get("FAKE_OPENAI_EMBEDDING_TPS", "200000")),
+    "chat_tokens_per_second": float(os.environ.get("FAKE_OPENAI_CHAT_TPS", "100")),
+    "chat_output_tokens": float(os.environ.get("FAKE_OPENAI_CHAT_OUTPUT_TOKENS", "60")),
+    "error_rate": float(os.environ.get("FAKE_OPENAI_ERROR_RATE", "0")),  # share of 500s
+    "rate_limit_rate": float(os.environ.get("FAKE_OPENAI_RATE_LIMIT_RATE", "0")),  # share of 429s
+    "max_concurrency": float(os.environ.get("FAKE_OPENAI_MAX_CONCURRENCY", "0")),  # 0 = unlimited; above it, 429
+    "tokens_per_minute": float(os.environ.get("FAKE_OPENAI_TPM", "0")),  # 0 = unlimited; above it, 429
+    "embedding_dimensions": float(os.environ.get("FAKE_OPENAI_EMBEDDING_DIMENSIONS", "1536")),
+}
+
+app = FastAPI(title="Fake OpenAI API")
+
+class _TokenWindow:
+    """Tokens used in the current one-minute window, for TPM rate limiting"""
+
+    def __init__(self):
+        self.window_start = time.monotonic()
+        self.used = 0
+
+    def take(self, tokens: int, limit: float) -> Optional[float]:
+        """Record usage; return seconds until reset if the limit is exceeded"""
+        now = time.monotonic()
+        if now - self.window_start >= 60:
+            self.window_start, self.used = now, 0
+        if limit and self.used + tokens > limit:
+            return 60 - (now - self.window_start)
+        self.used += tokens
+        return None
+
+    def headers(self, limit: float) -> Dict[str, str]:
+        if not limit:
+            return {}
+        reset = max(0.0, 60 - (time.monotonic() - self.window_start))
+        return {
+            "x-ratelimit-limit-tokens": str(int(limit)),
+            "x-ratelimit-remaining-tokens": str(max(0, int(limit - self.used))),
+            "x-ratelimit-reset-tokens": f"{reset:.3f}s",
+        }
+
+token_window = _TokenWindow()
+stats = {"in_flight": 0, "requests": 0, "errors": 0, "rate_limited": 0}
+
+def _count_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+def _error(status: int, message: str, error_type: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    return JSONResponse(
+        status_code=status,
+        content={"error": {"message": message, "type": error_type, "param": None, "code": None}},
+        headers=headers
+    )
+
+async def _admit(tokens: int) -> Optional[JSONResponse]:
+    """Apply injected latency and errors; return an error response or None"""
+    stats["requests"] += 1
+    delay = config["latency_ms"] + random.uniform(-1, 1) * config["jitter_ms"]
+    await asyncio.sleep(max(0.0, delay) / 1000)
+
+    if config["max_concurrency"] and stats["in_flight"] > config["max_concurrency"]:
+        stats["rate_limited"] += 1
+        return _error(429, "Too many concurrent requests", "requests", {"retry-after-ms": "200"})
+    if random.random() < config["rate_limit_rate"]:
+        stats["rate_limited"] += 1
+        return _error(429, "Rate limit reached (injected)", "requests", {"retry-after-ms": "500"})
+    reset = token_window.take(tokens, config["tokens_per_minute"])
+    if reset is not None:
+        stats["rate_limited"] += 1
+        return _error(
+            429, "Rate limit reached for tokens per minute", "tokens",
+            {"retry-after": f"{reset:.0f}", **token_window.headers(config["tokens_per_minute"])}
+        )
+    if random.random() < config["error_rate"]:
+        stats["errors"] += 1
+        return _error(500, "The server had an error (injected)", "server_error")
+    return None
+
+def _fake_vector(text: str, dimensions: int) -> np.ndarray:
+    """Deterministic unit vector for a text, so repeated inputs embed identically"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(dimensions).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+def _normalize_inputs(value: Any) -> List[str]:
+    """Embedding input may be a string, strings, token ids or lists of token ids"""
+    if isinstance(value, str):
+        return [value]
+    if value and all(isinstance(item, int) for item in value):
+        return [" ".join(map(str, value))]
+    return [item if isinstance(item, str) else " ".join(map(str, item)) for item in value]
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    texts = _normalize_inputs(body.get("input", []))
+    tokens = sum(_count_tokens(text) for text in texts)
+
+    stats["in_flight"] += 1
+    try:
+        error = await _admit(tokens)
+        if error:
+            return error
+        await asyncio.sleep(tokens / config["embedding_tokens_per_second"])
+
+        dimensions = int(body.get("dimensions") or config["embedding_dimensions"])
+        data = []
+        for index, text in enumerate(texts):
+            vector = _fake_vector(text, dimensions)
+            if body.get("encoding_format") == "base64":
+                embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+
+        return JSONResponse(
+            {
+                "object": "list",
+                "data": data,
+                "model": body.get("model", "text-embedding-3-small"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            },
+            headers=token_window.headers(config["tokens_per_minute"])
+        )
+    finally:
+        stats["in_flight"] -= 1
+
+def _fake_answer(messages: List[Dict[str, Any]]) -> List[str]:
+    """Answer words: echo the question, then filler up to the output token budget"""
+    question = next(
+        (m.get("content") for m in reversed(messages) if m.get("role") == "user" and isinstance(m.get("content"), str)),
+        ""
+    )
+    words = f"This is a fake answer to: {question}".split()
+    filler = "lorem ipsum dolor sit amet consectetur adipiscing elit".split()
+    while len(words) < config["chat_output_tokens"]:
+        words.append(filler[len(words) % len(filler)])
+    return [word + " " for word in words[:int(config["chat_output_tokens"])]]
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    messages = body.get("messages", [])
+    prompt_tokens = sum(_count_tokens(str(m.get("content", ""))) for m in messages)
+    model = body.get("model", "gpt-4o-mini")
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    created = int(time.time())
+
+    stats["in_flight"] += 1
+    try:
+        error = await _admit(prompt_tokens)
+    except BaseException:
+        stats["in_flight"] -= 1
+        raise
+    if error:
+        stats["in_flight"] -= 1
+        return error
+
+    pieces = _fake_answer(messages)
+    usage = {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": len(pieces),
+        "total_tokens": prompt_tokens + len(pieces),
+    }
+    token_delay = 1 / config["chat_tokens_per_second"]
+
+    if not body.get("stream"):
+        try:
+            await asyncio.sleep(len(pieces) * token_delay)
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(pieces).strip()},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            })
+        finally:
+            stats["in_flight"] -= 1
+
+    async def stream():
+        try:
+            def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+                payload = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }
+                return f"data: {json.dumps(payload)}\n\n"
+
+            yield chunk({"role": "assistant", "content": ""})
+            for piece in pieces:
+                await asyncio.sleep(token_delay)
+                yield chunk({"content": piece})
+            yield chunk({}, "stop")
+            if (body.get("stream_options") or {}).get("include_usage"):
+                yield f"data: {json.dumps({'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model, 'choices': [], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+        finally:
+            stats["in_flight"] -= 1
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+@app.get("/v1/models")
+async def models():
+    return {
+        "object": "list",
+        "data": [
+            {"id": name, "object": "model", "created": 0, "owned_by": "fake"}
+            for name in ("gpt-4o-mini", "text-embedding-3-small")
+        ],
+    }
+
+@app.get("/fake/config")
+async def get_config():
+    return {"config": config, "stats": stats}
+
+@app.put("/fake/config")
+async def update_config(request: Request):
+    """Change injected behaviour mid-test, e.g. {"rate_limit_rate": 0.2}"""
+    updates = await request.json()
+    unknown = set(updates) - set(config)
+    if unknown:
+        return _error(400, f"Unknown settings: {', '.join(sorted(unknown))}", "invalid_request_error")
+    config.update({key: float(value) for key, value in updates.items()})
+    return {"config": config}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local fake OpenAI API")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8100)
+    args = parser.parse_args()
+    uvicorn.run(app, host=args.host, port=args.port)
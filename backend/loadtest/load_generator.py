@@ -0,0 +1,240 @@
+"""Concurrent mixed upload/chat load against the FastAPI backend.
+
+Needs httpx, declared in the project's "loadtest" extra (uv sync --extra
+loadtest). Run from the backend directory, with the backend pointed at
+the fake OpenAI server so no real API calls are made:
+
+    python -m loadtest.load_generator --url http://localhost:8000 \
+        --concurrency 16 --duration 60 --chat-share 0.8
+
+Reports throughput and p50/p95/p99 latency per endpoint.
+"""
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+QUESTIONS = [
+    "What is this document about?",
+    "Summarize the main findings.",
+    "Which methods are described?",
+    "What are the key risks mentioned?",
+    "List the recommendations in the document.",
+    "Who is the intended audience?",
+]
+
+WORDS = (
+    "system data model result analysis method performance report value process "
+    "design network storage request latency throughput index query answer"
+).split()
+
+def build_pdf(pages: List[str]) -> bytes:
+    """Build a minimal text PDF, one string per page, without extra dependencies"""
+    objects = {
+        1: "<< /Type /Catalog /Pages 2 0 R >>",
+        2: "<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            " ".join(f"{4 + 2 * i} 0 R" for i in range(len(pages))), len(pages)
+        ),
+        3: "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    for i, text in enumerate(pages):
+        lines = [line.replace("(", "").replace(")", "").replace("\\", "") for line in text.split("\n")]
+        stream = "BT /F1 10 Tf 40 750 Td 12 TL " + " ".join(f"({line}) '" for line in lines) + " ET"
+        objects[4 + 2 * i] = (
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + 2 * i} 0 R >>"
+        )
+        objects[5 + 2 * i] = f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream"
+
+    out = b"%PDF-1.4\n"
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(out)
+        out += f"{number} 0 obj\n{objects[number]}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    size = max(objects) + 1
+    out += f"xref\n0 {size}\n0000000000 65535 f \n".encode()
+    out += b"".join(f"{offsets[n]:010d} 00000 n \n".encode() for n in range(1, size))
+    out += f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+def random_pdf(pages: int, lines_per_page: int = 50) -> bytes:
+    """A PDF of random prose, so every upload has distinct content"""
+    return build_pdf([
+        "\n".join(" ".join(random.choices(WORDS, k=12)) + "." for _ in range(lines_per_page))
+        for _ in range(pages)
+    ])
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+class LoadGenerator:
+    """Drives concurrent workers that mix chat and upload requests"""
+
+    def __init__(
+        self,
+        url: str,
+        concurrency: int,
+        duration: float,
+        chat_share: float,
+        pages: int,
+        collection: str,
+        pdf_files: Optional[List[Path]] = None,
+        timeout: float = 300,
+        respect_retry_after: bool = True
+    ):
+        self.url = url.rstrip("/")
+        self.concurrency = concurrency
+        self.duration = duration
+        self.chat_share = chat_share
+        self.pages = pages
+        self.collection = collection
+        self.pdf_files = [(path.name, path.read_bytes()) for path in pdf_files or []]
+        self.timeout = timeout
+        self.respect_retry_after = respect_retry_after
+        self.results: Dict[str, List[tuple]] = {}  # endpoint -> [(latency seconds, status)]
+        self._uploads = 0
+
+    def _record(self, endpoint: str, latency: float, status: int):
+        self.results.setdefault(endpoint, []).append((latency, status))
+
+    async def _back_off(self, response: Optional[httpx.Response]):
+        """On 429/503, wait as long as Retry-After asks, like a well-behaved client"""
+        if not self.respect_retry_after or response is None or response.status_code not in (429, 503):
+            return
+        try:
+            delay = float(response.headers.get("Retry-After", "1"))
+        except ValueError:
+            delay = 1.0
+        await asyncio.sleep(delay)
+
+    async def _chat(self, client: httpx.AsyncClient):
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await client.post(
+                "/chat",
+                json={"message": random.choice(QUESTIONS), "collection": self.collection}
+            )
+            status = response.status_code
+        except httpx.HTTPError:
+            status = 0  # transport error or timeout
+        self._record("POST /chat", time.perf_counter() - started, status)
+        await self._back_off(response)
+
+    async def _upload(self, client: httpx.AsyncClient):
+        self._uploads += 1
+        if self.pdf_files:
+            name, content = random.choice(self.pdf_files)
+            name = f"{self._uploads}-{name}"
+        else:
+            name, content = f"loadtest-{self._uploads}.pdf", random_pdf(self.pages)
+
+        started = time.perf_counter()
+        response = None
+        try:
+            response = await client.post(
+                "/upload-pdf",
+                files={"file": (name, content, "application/pdf")},
+                data={"collection": self.collection}
+            )
+            status = response.status_code
+        except httpx.HTTPError:
+            status = 0
+        self._record("POST /upload-pdf", time.perf_counter() - started, status)
+        await self._back_off(response)
+
+    async def _worker(self, client: httpx.AsyncClient, deadline: float):
+        while time.perf_counter() < deadline:
+            if random.random() < self.chat_share:
+                await self._chat(client)
+            else:
+                await self._upload(client)
+
+    async def run(self) -> float:
+        """Run the load for the configured duration; returns elapsed seconds"""
+        limits = httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency)
+        async with httpx.AsyncClient(base_url=self.url, timeout=self.timeout, limits=limits) as client:
+            await client.post("/collections", json={"name": self.collection})
+
+            # Seed one document so chat has something to retrieve from the start
+            await self._upload(client)
+
+            started = time.perf_counter()
+            deadline = started + self.duration
+            await asyncio.gather(*(self._worker(client, deadline) for _ in range(self.concurrency)))
+            return time.perf_counter() - started
+
+    def report(self, elapsed: float) -> Dict[str, Dict[str, float]]:
+        """Throughput and latency percentiles per endpoint"""
+        summary = {}
+        for endpoint, samples in sorted(self.results.items()):
+            latencies = sorted(latency for latency, _ in samples)
+            statuses: Dict[str, int] = {}
+            for _, status in samples:
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+            ok = sum(count for status, count in statuses.items() if status.startswith("2"))
+            summary[endpoint] = {
+                "requests": len(samples),
+                "ok": ok,
+                "throughput_rps": round(ok / elapsed, 2) if elapsed > 0 else 0.0,
+                "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+                "max_ms": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+                "statuses": statuses,
+            }
+        return summary
+
+def print_report(summary: Dict[str, Dict[str, float]], elapsed: float):
+    print(f"\nLoad test ran for {elapsed:.1f}s\n")
+    header = f"{'endpoint':<20}{'requests':>10}{'ok':>8}{'ok/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}  statuses"
+    print(header)
+    print("-" * len(header))
+    for endpoint, row in summary.items():
+        print(
+            f"{endpoint:<20}{row['requests']:>10}{row['ok']:>8}{row['throughput_rps']:>9}"
+            f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}  {row['statuses']}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent mixed upload/chat load test")
+    parser.add_argument("--url", default="http://localhost:8000", help="Backend base URL")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent workers")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of load")
+    parser.add_argument("--chat-share", type=float, default=0.8, help="Share of requests that are chats")
+    parser.add_argument("--pages", type=int, default=5, help="Pages per generated PDF")
+    parser.add_argument("--pdf", type=Path, action="append", help="Upload this PDF instead of generated ones (repeatable)")
+    parser.add_argument("--collection", default="loadtest", help="Collection the test writes to")
+    parser.add_argument("--json", type=Path, help="Also write the report to this JSON file")
+    parser.add_argument("--ignore-retry-after", action="store_true", help="Retry immediately after 429/503")
+    args = parser.parse_args()
+
+    generator = LoadGenerator(
+        url=args.url,
+        concurrency=args.concurrency,
+        duration=args.duration,
+        chat_share=args.chat_share,
+        pages=args.pages,
+        collection=args.collection,
+        pdf_files=args.pdf,
+        respect_retry_after=not args.ignore_retry_after
+    )
+    elapsed = asyncio.run(generator.run())
+    summary = generator.report(elapsed)
+    print_report(summary, elapsed)
+    if args.json:
+        args.json.write_text(json.dumps({"elapsed_seconds": elapsed, "endpoints": summary}, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import zlib
+from types import SimpleNamespace
+from typing import List
+
+import numpy as np
+import pytest
+
+from app.embedding_batcher import EmbeddingBatcher
+
+DIMENSIONS = 16
+
+def fake_embedding(text: str) -> List[float]:
+    """Deterministic unit vector for a text"""
+    vector = np.random.default_rng(zlib.crc32(text.encode("utf-8"))).standard_normal(DIMENSIONS)
+    return (vector / np.linalg.norm(vector)).tolist()
+
+class FakeEmbeddingsClient:
+    """Stands in for openai.OpenAI in EmbeddingBatcher: client.embeddings.with_raw_response.create.
+
+    refuse(batch) may return an exception to raise instead of answering.
+    """
+
+    def __init__(self, refuse=None):
+        self.refuse = refuse
+        self.batches: List[List[str]] = []
+        self.embeddings = SimpleNamespace(with_raw_response=SimpleNamespace(create=self.create))
+
+    def create(self, model: str, input: List[str], timeout: float):
+        self.batches.append(list(input))
+        error = self.refuse(input) if self.refuse else None
+        if error is not None:
+            raise error
+        data = [SimpleNamespace(index=index, embedding=fake_embedding(text)) for index, text in enumerate(input)]
+        return SimpleNamespace(headers={}, parse=lambda: SimpleNamespace(data=data))
+
+def make_manager(directory, monkeypatch):
+    """SQLite EmbeddingManager storing in directory, embedding without the API"""
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.chdir(directory)
+    from app.embeddings_sqlite import EmbeddingManager
+
+    manager = EmbeddingManager()
+    manager.batcher = EmbeddingBatcher(FakeEmbeddingsClient(), model=manager.embeddings.model)
+    manager.embeddings = SimpleNamespace(model=manager.embeddings.model, embed_query=fake_embedding)
+    return manager
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    return make_manager(tmp_path, monkeypatch)
+
+def make_chunks(filename: str, texts: List[str]):
+    """Chunks as the PDF loader produces them"""
+    return [
+        {
+            "content": text,
+            "metadata": {"chunk_id": index, "filename": filename, "start_page": 1, "end_page": 1, "total_pages": 1}
+        }
+        for index, text in enumerate(texts)
+    ]
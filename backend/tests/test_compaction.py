@@ -0,0 +1,92 @@
+import sqlite3
+from types import SimpleNamespace
+
+import app.embeddings_sqlite as embeddings_sqlite
+from conftest import make_chunks
+
+def store(manager, filename: str, count: int = 6):
+    texts = [f"{filename} chunk {index}: " + " ".join(f"{filename}-{index}-{word}" for word in range(40)) for index in range(count)]
+    manager.store_document_embeddings(make_chunks(filename, texts), filename)
+
+def orphaned_chunks(manager) -> int:
+    with sqlite3.connect(manager.db_path) as conn:
+        return conn.execute("""
+            SELECT COUNT(*) FROM documents d
+            LEFT JOIN document_catalog c ON c.id = d.document_id
+            WHERE c.id IS NULL
+        """).fetchone()[0]
+
+def delete_on_commit(patch, commit: int, action):
+    """Run action right after the given commit of any connection"""
+    connect = sqlite3.connect
+    commits = {"count": 0}
+
+    class Connection:
+        def __init__(self, conn):
+            self.conn = conn
+
+        def __getattr__(self, name):
+            return getattr(self.conn, name)
+
+        def __enter__(self):
+            self.conn.__enter__()
+            return self
+
+        def __exit__(self, *exc):
+            return self.conn.__exit__(*exc)
+
+        def commit(self):
+            self.conn.commit()
+            commits["count"] += 1
+            if commits["count"] == commit:
+                action()
+
+    patch.setattr(embeddings_sqlite, "sqlite3", SimpleNamespace(
+        connect=lambda *args, **kwargs: Connection(connect(*args, **kwargs)),
+        Row=sqlite3.Row
+    ))
+
+def test_compact_purges_tombstoned_documents(manager):
+    for filename in ("a.pdf", "b.pdf"):
+        store(manager, filename)
+    manager.delete_document("a.pdf")
+
+    stats = manager.compact()
+
+    assert stats["purged_documents"] == 1
+    assert stats["purged_chunks"] == 6
+    assert not stats["truncated"]
+    assert manager.get_document_list() == ["b.pdf"]
+    assert orphaned_chunks(manager) == 0
+
+def test_compact_truncates_when_nothing_is_active(manager):
+    store(manager, "a.pdf")
+    manager.delete_document("a.pdf")
+
+    stats = manager.compact()
+
+    assert stats["truncated"]
+    assert stats["purged_chunks"] == 6
+    assert orphaned_chunks(manager) == 0
+
+def test_delete_during_compaction_leaves_no_orphans(manager, monkeypatch):
+    for filename in ("a.pdf", "b.pdf", "c.pdf"):
+        store(manager, filename)
+    manager.delete_document("a.pdf")
+    manager.compaction_batch_size = 2
+
+    # Tombstone b.pdf between two purge batches of a.pdf
+    with monkeypatch.context() as patch:
+        delete_on_commit(patch, 3, lambda: manager.delete_document("b.pdf"))
+        stats = manager._purge_tombstones()
+
+    assert stats["purged_documents"] == 1
+    assert stats["purged_chunks"] == 6
+    assert orphaned_chunks(manager) == 0
+
+    # b.pdf is purged by the next pass
+    stats = manager.compact()
+    assert stats["purged_documents"] == 1
+    assert stats["purged_chunks"] == 6
+    assert manager.get_document_list() == ["c.pdf"]
+    assert orphaned_chunks(manager) == 0
@@ -0,0 +1,57 @@
+import httpx
+import openai
+
+from app.embedding_batcher import EmbeddingBatcher, is_token_limit_error
+from conftest import FakeEmbeddingsClient, fake_embedding
+
+def bad_request(message: str, code: str = None) -> openai.BadRequestError:
+    response = httpx.Response(400, request=httpx.Request("POST", "https://api.openai.com/v1/embeddings"))
+    return openai.BadRequestError(message, response=response, body={"message": message, "code": code})
+
+def token_limit(max_inputs: int):
+    """Refuse batches of more than max_inputs texts as the provider does over its token limit"""
+    def refuse(batch):
+        if len(batch) > max_inputs:
+            return bad_request("Requested 310000 tokens, max 300000 tokens per request", "max_tokens_per_request")
+    return refuse
+
+def batcher(client: FakeEmbeddingsClient) -> EmbeddingBatcher:
+    return EmbeddingBatcher(client, "text-embedding-3-small", max_batch_tokens=10**9, max_retries=0)
+
+def test_token_limit_errors_are_recognized():
+    assert is_token_limit_error(bad_request("Too many tokens", "max_tokens_per_request"))
+    assert is_token_limit_error(bad_request("This model's maximum context length is 8192 tokens"))
+    assert not is_token_limit_error(bad_request("Invalid input", "invalid_value"))
+    assert not is_token_limit_error(ValueError("max tokens"))
+
+def test_batch_over_token_limit_is_split_until_it_fits():
+    texts = [f"text {index}" for index in range(10)]
+    client = FakeEmbeddingsClient(token_limit(3))
+
+    run = batcher(client).run(texts)
+
+    assert run.errors == {}
+    assert run.vectors == [fake_embedding(text) for text in texts]
+    assert max(len(batch) for batch in client.batches) == 10
+    answered = [batch for batch in client.batches if len(batch) <= 3]
+    assert sorted(text for batch in answered for text in batch) == sorted(texts)
+
+def test_single_text_over_token_limit_fails_alone():
+    texts = ["fits", "far too long", "fits too"]
+    client = FakeEmbeddingsClient(
+        lambda batch: bad_request("Too many tokens", "max_tokens_per_request") if "far too long" in batch else None
+    )
+
+    run = batcher(client).run(texts)
+
+    assert set(run.errors) == {1}
+    assert run.vectors[0] == fake_embedding("fits")
+    assert run.vectors[2] == fake_embedding("fits too")
+
+def test_other_bad_requests_are_not_split():
+    client = FakeEmbeddingsClient(lambda batch: bad_request("Invalid input", "invalid_value"))
+
+    run = batcher(client).run(["a", "b", "c", "d"])
+
+    assert len(client.batches) == 1
+    assert set(run.errors) == {0, 1, 2, 3}
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+import app.embeddings_sqlite as embeddings_sqlite
+from app.ivf_index import IVFIndex, default_nlist, normalize_rows, recall_report, train_centroids
+from conftest import make_chunks
+
+def clustered(count: int, dimensions: int = 32, clusters: int = 40, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = normalize_rows(rng.standard_normal((clusters, dimensions)))
+    points = centers[rng.integers(0, clusters, count)] + rng.standard_normal((count, dimensions)) * 0.3 / np.sqrt(dimensions)
+    return normalize_rows(points)
+
+def build(vectors: np.ndarray, documents=None) -> IVFIndex:
+    index = IVFIndex(train_centroids(vectors, default_nlist(len(vectors))))
+    documents = documents if documents is not None else np.arange(len(vectors)) // 10
+    index.add(np.arange(len(vectors)), documents, vectors)
+    return index
+
+def exact_top(vectors: np.ndarray, query: np.ndarray, k: int) -> set:
+    return set(np.argsort(-(vectors @ query))[:k].tolist())
+
+@pytest.fixture(scope="module")
+def vectors():
+    return clustered(5000)
+
+@pytest.fixture(scope="module")
+def index(vectors):
+    return build(vectors)
+
+def test_default_nlist():
+    assert default_nlist(10) == 1
+    assert default_nlist(10_000) == 100
+    assert default_nlist(1000) == 25  # capped so lists keep enough points to train
+
+def test_probing_every_list_is_exact(index, vectors):
+    queries = clustered(20, seed=1)
+    for query in queries:
+        ids, scores = index.search(query, 10, nprobe=index.nlist)
+        assert set(ids.tolist()) == exact_top(vectors, query, 10)
+        assert np.all(np.diff(scores) <= 0)
+
+def test_recall_against_exact_search(index):
+    queries = clustered(100, seed=2)
+
+    report = recall_report(index, queries, k=10, nprobes=(1, 8, index.nlist))
+    recall = {row["nprobe"]: row["recall_at_k"] for row in report}
+
+    assert recall["exact"] == 1.0
+    assert recall[index.nlist] == 1.0
+    assert recall[8] >= 0.9
+    assert recall[1] <= recall[8]
+    assert report[1]["scanned_share"] < report[2]["scanned_share"] < 0.5
+
+def test_recall_excludes_the_query_itself(index):
+    ids, queries = index.sample(20, seed=3)
+
+    report = recall_report(index, queries, k=5, nprobes=(index.nlist,), exclude_ids=ids)
+
+    assert report[-1]["recall_at_k"] == 1.0
+    for query, query_id in zip(queries, ids):
+        found, _ = index.search(query, 1, nprobe=index.nlist)
+        assert found[0] == query_id
+
+def test_remove_documents_and_reload(vectors, tmp_path):
+    index = build(vectors)
+    removed = index.remove_documents([0, 1])
+
+    assert removed == 20
+    assert len(index) == len(vectors) - 20
+    ids, _ = index.search(vectors[5], 5, nprobe=index.nlist)
+    assert not set(ids.tolist()) & set(range(20))
+
+    index.save(tmp_path / "index.npz")
+    loaded = IVFIndex.load(tmp_path / "index.npz")
+    assert len(loaded) == len(index)
+    assert loaded.document_ids == index.document_ids
+    assert np.array_equal(loaded.search(vectors[100], 5, 4)[0], index.search(vectors[100], 5, 4)[0])
+
+    loaded.add([len(vectors)], [999], vectors[:1])
+    assert 999 in loaded.document_ids
+
+def test_manager_indexes_large_collections(manager, monkeypatch):
+    monkeypatch.setattr(embeddings_sqlite, "IVF_MIN_CHUNKS", 200)
+    for number in range(30):
+        texts = [f"document {number} section {index} " + "filler " * index for index in range(10)]
+        manager.store_document_embeddings(make_chunks(f"{number}.pdf", texts), f"{number}.pdf")
+    query = "document 3 section 4"
+    exact = manager.similarity_search(query, k=10)
+
+    assert manager.compact()["indexed"] == ["default"]
+    nlist = manager._indexes["default"].nlist
+    manager.ivf_nprobe = nlist
+    assert manager.similarity_search(query, k=10) == exact
+
+    report, stats = manager.index_report(k=5, queries=50, nprobes=(1, nlist))
+    assert stats["chunks"] == 300
+    assert report[-1]["nprobe"] == nlist
+    assert report[-1]["recall_at_k"] == 1.0
+
+    # Deletes reach the index before the next search; shrinking drops it
+    for number in range(30):
+        if number != 3:
+            manager.delete_document(f"{number}.pdf")
+    assert {result["filename"] for result in manager.similarity_search(query, k=10)} == {"3.pdf"}
+    manager.compact()
+    assert "default" not in manager._indexes
+    assert not manager._index_path("default").exists()
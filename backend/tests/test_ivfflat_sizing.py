@@ -0,0 +1,34 @@
+import pytest
+
+from app.embeddings_postgres import EmbeddingManager
+
+def sizing(lists: int = 0, probes: int = 0) -> EmbeddingManager:
+    """Manager with only the ivfflat settings, no database connection"""
+    manager = EmbeddingManager.__new__(EmbeddingManager)
+    manager.ivfflat_lists = lists
+    manager.ivfflat_probes = probes
+    return manager
+
+@pytest.mark.parametrize("rows, lists", [
+    (100, 1),
+    (10_000, 10),
+    (250_000, 250),
+    (1_000_000, 1000),
+    (4_000_000, 2000),
+])
+def test_lists_follow_row_count(rows, lists):
+    assert sizing()._ivfflat_lists_for(rows) == lists
+
+def test_configured_lists_win():
+    assert sizing(lists=64)._ivfflat_lists_for(10_000_000) == 64
+
+@pytest.mark.parametrize("lists, probes", [(1, 1), (10, 4), (100, 10), (2000, 45)])
+def test_probes_are_square_root_of_lists(lists, probes):
+    assert sizing()._ivfflat_probes_for(lists) == probes
+
+def test_configured_probes_capped_at_lists():
+    assert sizing(probes=8)._ivfflat_probes_for(100) == 8
+    assert sizing(probes=8)._ivfflat_probes_for(5) == 5
+
+def test_index_name_fits_postgres_identifier():
+    assert len(EmbeddingManager._vector_index_name("c" * 48)) == 63
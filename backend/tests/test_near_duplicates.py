@@ -0,0 +1,105 @@
+import random
+
+import pytest
+
+from app.near_duplicates import NearDuplicateDetector, localize_links
+from conftest import make_chunks
+
+def words(count: int, seed: int):
+    rng = random.Random(seed)
+    return [f"word{rng.randrange(10**6)}" for _ in range(count)]
+
+def edited(text_words, changes: int, seed: int) -> str:
+    """The text with changes words replaced, spread evenly"""
+    text_words = list(text_words)
+    step = len(text_words) // changes
+    for position, replacement in zip(range(0, len(text_words), step), words(changes, seed)):
+        text_words[position] = replacement
+    return " ".join(text_words)
+
+def jaccard(detector: NearDuplicateDetector, a: str, b: str) -> float:
+    shingles_a, shingles_b = set(detector._shingles(a).tolist()), set(detector._shingles(b).tolist())
+    return len(shingles_a & shingles_b) / len(shingles_a | shingles_b)
+
+@pytest.fixture
+def detector():
+    return NearDuplicateDetector(threshold=0.9, enabled=True)
+
+def test_signature_estimates_jaccard_similarity(detector):
+    base = words(300, seed=1)
+    for changes in (2, 10, 30, 60):
+        other = edited(base, changes, seed=changes)
+        estimate = detector.similarity(detector.signature(" ".join(base)), detector.signature(other))
+        assert estimate == pytest.approx(jaccard(detector, " ".join(base), other), abs=0.12)
+
+def test_links_only_chunks_at_or_above_threshold(detector):
+    base = words(300, seed=1)
+    close = edited(base, 2, seed=2)  # Jaccard ~0.96
+    distant = edited(base, 40, seed=3)  # Jaccard ~0.4
+    assert jaccard(detector, " ".join(base), close) > 0.95
+    assert jaccard(detector, " ".join(base), distant) < 0.5
+
+    signatures = [detector.signature(text) for text in (" ".join(base), close, distant)]
+    links = detector.link(signatures, [])
+
+    assert links[0] is None
+    assert links[1][:2] == ("chunk", 0) and links[1][2] >= 0.9
+    assert links[2] is None
+
+def test_threshold_decides_borderline_pairs():
+    base = words(300, seed=1)
+    other = edited(base, 12, seed=4)  # Jaccard ~0.78
+    strict = NearDuplicateDetector(threshold=0.95, enabled=True)
+    loose = NearDuplicateDetector(threshold=0.6, enabled=True)
+    assert 0.7 < jaccard(strict, " ".join(base), other) < 0.85
+
+    for detector, expect_link in ((strict, False), (loose, True)):
+        signatures = [detector.signature(" ".join(base)), detector.signature(other)]
+        assert (detector.link(signatures, [])[1] is not None) == expect_link
+
+def test_links_to_most_similar_stored_chunk(detector):
+    base = words(300, seed=1)
+    stored = [(7, detector.signature(edited(base, 3, seed=5))), (9, detector.signature(" ".join(base)))]
+
+    links = detector.link([detector.signature(" ".join(base))], stored)
+
+    assert links == [("row", 9, 1.0)]
+
+def test_ignores_signatures_of_other_settings(detector):
+    other = NearDuplicateDetector(num_perm=64, bands=8, enabled=True)
+    text = " ".join(words(100, seed=1))
+
+    assert detector.link([detector.signature(text)], [(1, other.signature(text))]) == [None]
+
+def test_rejects_invalid_settings():
+    with pytest.raises(ValueError):
+        NearDuplicateDetector(threshold=0)
+    with pytest.raises(ValueError):
+        NearDuplicateDetector(num_perm=100, bands=16)
+
+def test_localize_links_across_documents():
+    links = [None, ("chunk", 0, 1.0), ("chunk", 0, 1.0), ("chunk", 2, 1.0)]
+    vectors = [[1.0], None, None, None]
+
+    # Second document: chunks 2-3, linking to stored chunk 0 and to its own chunk
+    doc_links, _ = localize_links(links, vectors, 2, 4, {0: 42})
+    assert doc_links == [("row", 42, 1.0), ("chunk", 0, 1.0)]
+
+    # Without chunk 0 stored, the chunk becomes canonical and reuses its vector
+    doc_links, doc_vectors = localize_links(links, vectors, 2, 4, {})
+    assert doc_links == [None, ("chunk", 0, 1.0)]
+    assert doc_vectors == [[1.0], None]
+
+def test_store_keeps_near_duplicates_as_references(manager):
+    base = words(300, seed=1)
+    manager.store_document_embeddings(make_chunks("a.pdf", [" ".join(base)]), "a.pdf")
+
+    stats = manager.store_document_embeddings(
+        make_chunks("b.pdf", [edited(base, 2, seed=2), " ".join(words(300, seed=6))]), "b.pdf"
+    )
+
+    assert stats["duplicate_chunks"] == 1
+    assert stats["embedded_chunks"] == 1
+    report = manager.get_dedup_report()
+    assert report["duplicate_chunks"] == 1
+    assert report["stored_chunks"] == 2
@@ -0,0 +1,185 @@
+import io
+import json
+import zipfile
+
+import numpy as np
+import pytest
+
+from app.snapshot import (
+    SnapshotConflictError, SnapshotError, SnapshotReader, SnapshotWriter, canonical_row_id
+)
+from conftest import make_chunks, make_manager
+
+MODEL = "text-embedding-3-small"
+
+def chunk(document: int, chunk_id: int):
+    return {"document": document, "chunk_id": chunk_id, "content": f"chunk {chunk_id}", "metadata": {}}
+
+def reference(document: int, canonical_document: int):
+    return {
+        "document": document,
+        "chunk_id": 1,
+        "canonical_document": canonical_document,
+        "canonical_chunk_id": 0,
+        "similarity": 0.95,
+        "content_bytes": 7,
+        "metadata": {}
+    }
+
+def archive(documents=None, chunks=None, vectors=None, references=(), **members) -> io.BytesIO:
+    """A snapshot of one collection 'docs'; members replace or add archive files"""
+    documents = documents if documents is not None else [{"filename": "a.pdf"}]
+    chunks = chunks if chunks is not None else [chunk(0, 0)]
+    vectors = vectors if vectors is not None else np.ones((len(chunks), 4), dtype=np.float32)
+
+    written = io.BytesIO()
+    writer = SnapshotWriter(written, MODEL)
+    writer.write_collection("docs", documents, len(chunks), chunks, vectors, references)
+    writer.close()
+    if not members:
+        written.seek(0)
+        return written
+
+    result = io.BytesIO()
+    with zipfile.ZipFile(written) as source, zipfile.ZipFile(result, "w") as out:
+        for name in source.namelist():
+            if name not in members:
+                out.writestr(name, source.read(name))
+        for name, data in members.items():
+            if data is not None:
+                out.writestr(name, data)
+    result.seek(0)
+    return result
+
+def jsonl(*rows) -> str:
+    return "".join(json.dumps(row) + "\n" for row in rows)
+
+def npy(array: np.ndarray) -> bytes:
+    out = io.BytesIO()
+    np.save(out, array)
+    return out.getvalue()
+
+def read_all(snapshot: io.BytesIO):
+    reader = SnapshotReader(snapshot)
+    for collection in reader.collections():
+        reader.documents(collection)
+        list(reader.chunk_batches(collection))
+        list(reader.references(collection))
+
+def test_round_trip():
+    reader = SnapshotReader(archive(
+        documents=[{"filename": "a.pdf"}, {"filename": "b.pdf", "ingested_at": "2025-01-02T03:04:05+00:00"}],
+        chunks=[chunk(0, 0), chunk(1, 0)],
+        vectors=np.arange(8, dtype=np.float32).reshape(2, 4),
+        references=[reference(1, 0)]
+    ))
+    reader.check_model(MODEL)
+
+    assert reader.collections() == ["docs"]
+    assert [document["filename"] for document in reader.documents("docs")] == ["a.pdf", "b.pdf"]
+    batches = list(reader.chunk_batches("docs", batch_size=1))
+    assert [batch[0]["document"] for batch, _ in batches] == [0, 1]
+    assert np.array_equal(np.vstack([vectors for _, vectors in batches]), np.arange(8).reshape(2, 4))
+    assert list(reader.references("docs")) == [reference(1, 0)]
+
+@pytest.mark.parametrize("data, message", [
+    (b"not a zip", "Not a snapshot archive"),
+    (None, "unknown format"),
+])
+def test_rejects_non_snapshots(data, message):
+    if data is None:
+        snapshot = archive(**{"manifest.json": json.dumps({"format": "other"})})
+    else:
+        snapshot = io.BytesIO(data)
+    with pytest.raises(SnapshotError, match=message):
+        SnapshotReader(snapshot)
+
+def test_rejects_other_version_and_model():
+    snapshot = archive()
+    manifest = json.loads(zipfile.ZipFile(snapshot).read("manifest.json"))
+    with pytest.raises(SnapshotError, match="Unsupported snapshot version"):
+        SnapshotReader(archive(**{"manifest.json": json.dumps({**manifest, "version": 99})}))
+    with pytest.raises(SnapshotError, match="this deployment uses 'other-model'"):
+        SnapshotReader(snapshot).check_model("other-model")
+
+@pytest.mark.parametrize("rows, message", [
+    ([["a.pdf"]], "is not a JSON object"),
+    ([{}], "is missing 'filename'"),
+    ([{"filename": 1}], "invalid 'filename'"),
+    ([{"filename": "a.pdf", "chunk_count": True}], "invalid 'chunk_count'"),
+    ([{"filename": "a.pdf", "ingested_at": "yesterday"}], "invalid 'ingested_at'"),
+    ([{"filename": "a.pdf"}, {"filename": "a.pdf"}], "repeats document 'a.pdf'"),
+])
+def test_rejects_invalid_catalog_rows(rows, message):
+    snapshot = archive(**{"collections/docs/catalog.jsonl": jsonl(*rows)})
+    with pytest.raises(SnapshotError, match=message):
+        read_all(snapshot)
+
+def test_rejects_invalid_json_line():
+    snapshot = archive(**{"collections/docs/chunks.jsonl": "{\n"})
+    with pytest.raises(SnapshotError, match="chunks.jsonl line 1 is not valid JSON"):
+        read_all(snapshot)
+
+def test_rejects_missing_member():
+    snapshot = archive(**{"collections/docs/embeddings.npy": None})
+    with pytest.raises(SnapshotError, match="missing collections/docs/embeddings.npy"):
+        read_all(snapshot)
+
+def test_rejects_chunk_of_unknown_document():
+    snapshot = archive(**{"collections/docs/chunks.jsonl": jsonl(chunk(3, 0))})
+    with pytest.raises(SnapshotError, match="refers to document 3, but the catalog has 1"):
+        read_all(snapshot)
+
+def test_rejects_reference_to_unknown_document():
+    snapshot = archive(references=[reference(0, 2)])
+    with pytest.raises(SnapshotError, match="refers to document 2"):
+        read_all(snapshot)
+
+@pytest.mark.parametrize("embeddings, message", [
+    (np.ones((0, 4), dtype=np.float32), "fewer embeddings than chunks"),
+    (np.ones((2, 4), dtype=np.float32), "has 2 embeddings for 1 chunks"),
+    (np.ones((1, 4), dtype=np.float64), "row-major float32 matrix"),
+    (np.ones(4, dtype=np.float32), "row-major float32 matrix"),
+])
+def test_rejects_embeddings_not_matching_chunks(embeddings, message):
+    snapshot = archive(**{"collections/docs/embeddings.npy": npy(embeddings)})
+    with pytest.raises(SnapshotError, match=message):
+        read_all(snapshot)
+
+def test_canonical_row_id():
+    rows = {(10, 0): 100}
+    assert canonical_row_id(rows, [10], reference(0, 0), "docs") == 100
+    with pytest.raises(SnapshotError, match="which it does not contain"):
+        canonical_row_id(rows, [11], reference(0, 0), "docs")
+
+def test_writer_reports_data_changed_during_export():
+    writer = SnapshotWriter(io.BytesIO(), MODEL)
+    with pytest.raises(SnapshotConflictError, match="Expected 2 chunks"):
+        writer.write_collection("docs", [{"filename": "a.pdf"}], 2, [chunk(0, 0)], [], [])
+
+    writer = SnapshotWriter(io.BytesIO(), MODEL)
+    with pytest.raises(SnapshotConflictError, match="Expected 1 embeddings"):
+        writer.write_collection("docs", [{"filename": "a.pdf"}], 1, [chunk(0, 0)], [], [])
+
+def test_export_and_import_between_stores(manager, tmp_path, monkeypatch):
+    manager.store_document_embeddings(make_chunks("a.pdf", ["first chunk", "second chunk"]), "a.pdf")
+    manager.store_document_embeddings(make_chunks("b.pdf", ["other text"]), "b.pdf", collection="other")
+    expected = manager.similarity_search("second chunk", k=2)
+
+    with pytest.raises(SnapshotError, match="Collection 'missing' not found") as error:
+        manager.export_snapshot(io.BytesIO(), ["missing"])
+    assert not isinstance(error.value, SnapshotConflictError)
+
+    snapshot = io.BytesIO()
+    manifest = manager.export_snapshot(snapshot)
+    assert manifest["collections"]["default"]["chunks"] == 2
+    assert manifest["collections"]["other"]["documents"] == 1
+
+    (tmp_path / "restored").mkdir()
+    restored = make_manager(tmp_path / "restored", monkeypatch)
+    snapshot.seek(0)
+    imported = restored.import_snapshot(snapshot)
+
+    assert imported["default"]["chunks"] == 2
+    assert restored.get_document_list("other") == ["b.pdf"]
+    assert restored.similarity_search("second chunk", k=2) == expected
@@ -1,6 +1,7 @@
 import streamlit as st
 import requests
 import os
+import time
 
 # Configure Streamlit page
 st.set_page_config(
@@ -12,45 +13,173 @@ st.set_page_config(
 # Get backend URL from environment or use default
 BACKEND_URL = os.environ.get("BACKEND_URL", "http://localhost:8000")
 
+# Request timeouts in seconds: (connect, read). Uploads get a longer read
+# timeout because the backend extracts and embeds the PDF before replying.
+CONNECT_TIMEOUT = float(os.environ.get("BACKEND_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.environ.get("BACKEND_READ_TIMEOUT", "60"))
+UPLOAD_READ_TIMEOUT = float(os.environ.get("BACKEND_UPLOAD_TIMEOUT", "600"))
+
+# How long the document list is cached between Streamlit reruns
+DOCUMENTS_CACHE_TTL = int(os.environ.get("DOCUMENTS_CACHE_TTL", "30"))
+
+# Retries when the backend sheds load with 429/503, honouring Retry-After
+BUSY_RETRIES = int(os.environ.get("BACKEND_BUSY_RETRIES", "4"))
+BUSY_MAX_WAIT = float(os.environ.get("BACKEND_BUSY_MAX_WAIT", "30"))
+BUSY_STATUS_CODES = (429, 503)
+
+# Collection selected when the app starts
+DEFAULT_COLLECTION = "default"
+
 # Add debug info
 st.sidebar.write(f"🔗 Backend URL: {BACKEND_URL}")
 
-def upload_pdf(file):
+@st.cache_resource
+def get_session():
+    """Shared keep-alive HTTP session, reused across reruns and users"""
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def send_with_busy_retry(send):
+    """Call send() and retry while the backend reports it is busy.
+    
+    Shows a "busy, retrying" notice while waiting, so overload shows up as
+    a short delay rather than an error.
+    """
+    notice = st.empty()
+    try:
+        for attempt in range(BUSY_RETRIES + 1):
+            response = send()
+            if response.status_code not in BUSY_STATUS_CODES or attempt == BUSY_RETRIES:
+                return response
+            try:
+                delay = min(BUSY_MAX_WAIT, max(1.0, float(response.headers.get("Retry-After", "2"))))
+            except ValueError:
+                delay = 2.0
+            notice.info(f"⏳ Server busy, retrying in {delay:.0f}s (attempt {attempt + 1} of {BUSY_RETRIES})")
+            time.sleep(delay)
+    finally:
+        notice.empty()
+
+def error_message(response):
+    """User-facing message for a failed backend response"""
+    if response.status_code in BUSY_STATUS_CODES:
+        return "The server is busy right now. Please try again in a moment."
+    return f"Error: {response.text}"
+
+def upload_pdf(file, collection):
     """Upload PDF to backend"""
-    files = {"file": (file.name, file, "application/pdf")}
-    response = requests.post(f"{BACKEND_URL}/upload-pdf", files=files)
+    def send():
+        file.seek(0)  # rewind for retries
+        return get_session().post(
+            f"{BACKEND_URL}/upload-pdf",
+            files={"file": (file.name, file, "application/pdf")},
+            data={"collection": collection},
+            timeout=(CONNECT_TIMEOUT, UPLOAD_READ_TIMEOUT)
+        )
+    response = send_with_busy_retry(send)
+    if response.status_code == 200:
+        _fetch_documents.clear()
+    return response
+
+def upload_pdfs(uploaded_files, collection):
+    """Upload several PDFs or ZIP archives to the bulk ingestion endpoint"""
+    def send():
+        for f in uploaded_files:
+            f.seek(0)  # rewind for retries
+        files = [
+            ("files", (f.name, f, "application/zip" if f.name.lower().endswith(".zip") else "application/pdf"))
+            for f in uploaded_files
+        ]
+        return get_session().post(
+            f"{BACKEND_URL}/upload-pdfs",
+            files=files,
+            data={"collection": collection},
+            timeout=(CONNECT_TIMEOUT, UPLOAD_READ_TIMEOUT)
+        )
+    response = send_with_busy_retry(send)
+    if response.status_code == 200:
+        _fetch_documents.clear()
     return response
 
-def send_chat_message(message):
+def send_chat_message(message, collection):
     """Send chat message to backend"""
-    response = requests.post(
+    return send_with_busy_retry(lambda: get_session().post(
         f"{BACKEND_URL}/chat",
-        json={"message": message}
+        json={"message": message, "collection": collection},
+        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+    ))
+
+@st.cache_data(ttl=DOCUMENTS_CACHE_TTL, show_spinner=False)
+def _fetch_documents(collection):
+    """Fetch a collection's document list; failures raise so they are never cached"""
+    response = get_session().get(
+        f"{BACKEND_URL}/documents",
+        params={"collection": collection},
+        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
     )
-    return response
+    response.raise_for_status()
+    return response.json().get("documents", [])
+
+def get_documents(collection):
+    """Get list of uploaded documents (cached, cleared on upload and delete)"""
+    try:
+        return _fetch_documents(collection)
+    except Exception:
+        return []
+
+@st.cache_data(ttl=DOCUMENTS_CACHE_TTL, show_spinner=False)
+def _fetch_collections():
+    """Fetch collection names; failures raise so they are never cached"""
+    response = get_session().get(
+        f"{BACKEND_URL}/collections",
+        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+    )
+    response.raise_for_status()
+    return [c["name"] for c in response.json().get("collections", [])]
 
-def get_documents():
-    """Get list of uploaded documents"""
+def get_collections():
+    """Get collection names, always including the default collection"""
     try:
-        response = requests.get(f"{BACKEND_URL}/documents")
-        if response.status_code == 200:
-            return response.json().get("documents", [])
-    except:
-        pass
-    return []
-
-def delete_document(filename):
+        names = _fetch_collections()
+    except Exception:
+        names = []
+    return names if DEFAULT_COLLECTION in names else [DEFAULT_COLLECTION] + names
+
+def create_collection(name):
+    """Create a new collection"""
+    response = get_session().post(
+        f"{BACKEND_URL}/collections",
+        json={"name": name},
+        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+    )
+    _fetch_collections.clear()
+    return response
+
+def delete_document(filename, collection):
     """Delete a specific document"""
     try:
-        response = requests.delete(f"{BACKEND_URL}/documents/{filename}")
+        response = get_session().delete(
+            f"{BACKEND_URL}/documents/{filename}",
+            params={"collection": collection},
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+        )
+        _fetch_documents.clear()
         return response
     except Exception as e:
         return None
 
-def delete_all_documents():
+def delete_all_documents(collection):
     """Delete all documents"""
     try:
-        response = requests.delete(f"{BACKEND_URL}/documents")
+        response = get_session().delete(
+            f"{BACKEND_URL}/documents",
+            params={"collection": collection},
+            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+        )
+        _fetch_documents.clear()
         return response
     except Exception as e:
         return None
@@ -64,37 +193,80 @@ def main():
     with st.sidebar:
         st.header("📄 Document Management")
         
+        # Collection selection; uploads, listing and chat all use it
+        collections = get_collections()
+        selected = st.session_state.get("collection", DEFAULT_COLLECTION)
+        collection = st.selectbox(
+            "Collection",
+            collections,
+            index=collections.index(selected) if selected in collections else 0
+        )
+        st.session_state.collection = collection
+        
+        with st.expander("➕ New collection"):
+            new_collection = st.text_input(
+                "Collection name",
+                help="Lowercase letters, digits and underscores"
+            )
+            if st.button("Create collection") and new_collection:
+                try:
+                    response = create_collection(new_collection)
+                    if response.status_code == 200:
+                        st.session_state.collection = new_collection
+                        st.rerun()
+                    else:
+                        st.error(f"❌ Error: {response.text}")
+                except Exception as e:
+                    st.error(f"❌ Error creating collection: {str(e)}")
+        
         # File upload
-        uploaded_file = st.file_uploader(
-            "Upload a PDF file",
-            type="pdf",
-            help="Select a PDF file to upload and process"
+        uploaded_files = st.file_uploader(
+            "Upload PDF files",
+            type=["pdf", "zip"],
+            accept_multiple_files=True,
+            help="Select one or more PDF files, or ZIP archives of PDFs, to upload and process"
         )
         
-        if uploaded_file is not None:
-            if st.button("Process PDF", type="primary"):
-                with st.spinner("Processing PDF..."):
+        if uploaded_files:
+            if st.button("Process PDFs", type="primary"):
+                with st.spinner(f"Processing {len(uploaded_files)} file(s)..."):
                     try:
-                        response = upload_pdf(uploaded_file)
+                        # A single PDF keeps using the single-file endpoint
+                        if len(uploaded_files) == 1 and uploaded_files[0].name.lower().endswith(".pdf"):
+                            response = upload_pdf(uploaded_files[0], collection)
+                        else:
+                            response = upload_pdfs(uploaded_files, collection)
                         if response.status_code == 200:
-                            result = response.json()
-                            st.success(f"✅ {result['message']}")
-                            st.info(f"Processed {result['chunks_processed']} text chunks")
+                            st.session_state.last_upload_result = response.json()
+                            _fetch_collections.clear()
                             st.rerun()  # Refresh to update document list
                         else:
-                            st.error(f"❌ Error: {response.text}")
+                            st.error(f"❌ {error_message(response)}")
                     except Exception as e:
-                        st.error(f"❌ Error uploading file: {str(e)}")
+                        st.error(f"❌ Error uploading files: {str(e)}")
+        
+        # Show the outcome of the last upload, which survives the rerun above
+        result = st.session_state.pop("last_upload_result", None)
+        if result:
+            st.success(f"✅ {result['message']}")
+            st.info(f"Processed {result['chunks_processed']} text chunks")
+            if result.get("duplicate_chunks"):
+                st.caption(f"♻️ {result['duplicate_chunks']} near-duplicate chunks were linked to existing ones instead of stored again")
+            failed = [r for r in result.get("results", []) if r["status"] == "failed"]
+            if failed:
+                with st.expander(f"⚠️ {len(failed)} file(s) failed"):
+                    for r in failed:
+                        st.write(f"📄 {r['filename']}: {r['error']}")
         
         # Document list
         st.subheader("📋 Uploaded Documents")
-        documents = get_documents()
+        documents = get_documents(collection)
         if documents:
             # Delete All button
             if st.button("🗑️ Delete All Documents", type="secondary", help="Delete all uploaded documents and their embeddings"):
                 if st.session_state.get("confirm_delete_all", False):
                     with st.spinner("Deleting all documents..."):
-                        response = delete_all_documents()
+                        response = delete_all_documents(collection)
                         if response and response.status_code == 200:
                             result = response.json()
                             st.success(f"✅ {result['message']}")
@@ -117,7 +289,7 @@ def main():
                     if st.button("🗑️", key=f"delete_{doc}", help=f"Delete {doc}"):
                         if st.session_state.get(f"confirm_delete_{doc}", False):
                             with st.spinner(f"Deleting {doc}..."):
-                                response = delete_document(doc)
+                                response = delete_document(doc, collection)
                                 if response and response.status_code == 200:
                                     result = response.json()
                                     st.success(f"✅ {result['message']}")
@@ -150,7 +322,7 @@ def main():
         # Chat input
         if prompt := st.chat_input("Ask a question about your documents..."):
             # Check if any documents are uploaded
-            if not get_documents():
+            if not get_documents(collection):
                 st.warning("⚠️ Please upload a PDF document first before asking questions.")
             else:
                 # Add user message to chat history
@@ -162,14 +334,14 @@ def main():
                 with st.chat_message("assistant"):
                     with st.spinner("Thinking..."):
                         try:
-                            response = send_chat_message(prompt)
+                            response = send_chat_message(prompt, collection)
                             if response.status_code == 200:
                                 ai_response = response.json()["response"]
                                 st.markdown(ai_response)
                                 # Add assistant response to chat history
                                 st.session_state.messages.append({"role": "assistant", "content": ai_response})
                             else:
-                                error_msg = f"Error: {response.text}"
+                                error_msg = error_message(response)
                                 st.error(error_msg)
                                 st.session_state.messages.append({"role": "assistant", "content": error_msg})
                         except Exception as e:
@@ -180,8 +352,8 @@ def main():
     with col2:
         st.header("ℹ️ How to Use")
         st.markdown("""
-        1. **Upload PDF**: Use the sidebar to upload a PDF document
-        2. **Process**: Click 'Process PDF' to extract and index the content
+        1. **Upload PDFs**: Use the sidebar to upload one or more PDFs, or a ZIP archive of PDFs
+        2. **Process**: Click 'Process PDFs' to extract and index the content
         3. **Chat**: Ask questions about your document in the chat interface
         4. **Get Answers**: The AI will provide answers based on your document content
         """)
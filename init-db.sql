@@ -4,25 +4,82 @@
 -- Enable pgvector extension
 CREATE EXTENSION IF NOT EXISTS vector;
 
--- Create the documents table
-CREATE TABLE IF NOT EXISTS documents (
+-- Create collections (each owns a partition of the documents table)
+CREATE TABLE IF NOT EXISTS collections (
+    name TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,  -- bumped whenever the collection's documents change
+    indexed_rows BIGINT NOT NULL DEFAULT 0,  -- chunk count the partition's ivfflat index was built at
+    index_lists INTEGER NOT NULL DEFAULT 0,  -- lists of that index (0 without one)
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO collections (name) VALUES ('default') ON CONFLICT (name) DO NOTHING;
+
+-- Create the document catalog (one row per document)
+CREATE TABLE IF NOT EXISTS document_catalog (
     id SERIAL PRIMARY KEY,
+    collection TEXT NOT NULL DEFAULT 'default' REFERENCES collections(name) ON DELETE CASCADE,
     filename TEXT NOT NULL,
+    content_hash TEXT,
+    page_count INTEGER NOT NULL DEFAULT 0,
+    chunk_count INTEGER NOT NULL DEFAULT 0,
+    byte_size BIGINT,
+    metadata JSONB NOT NULL DEFAULT '{}'::jsonb,
+    status TEXT NOT NULL DEFAULT 'active',  -- 'active' or 'deleted' (tombstone)
+    ingested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    deleted_at TIMESTAMP
+);
+
+-- Each ingest is a new generation; only one may be active per filename in a collection
+CREATE UNIQUE INDEX IF NOT EXISTS idx_document_catalog_active_collection_filename 
+ON document_catalog(collection, filename) WHERE status = 'active';
+
+-- Create the documents table (one row per chunk), partitioned by collection
+CREATE TABLE IF NOT EXISTS documents (
+    id SERIAL,
+    collection TEXT NOT NULL,
+    document_id INTEGER NOT NULL REFERENCES document_catalog(id) ON DELETE CASCADE,
     chunk_id INTEGER NOT NULL,
     content TEXT NOT NULL,
     embedding vector(1536),  -- OpenAI text-embedding-3-small has 1536 dimensions
     metadata JSONB NOT NULL,
+    minhash BYTEA,            -- MinHash signature, for near-duplicate detection
+    minhash_bands BIGINT[],   -- LSH band keys of the signature
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (collection, id)
+) PARTITION BY LIST (collection);
+
+-- Create indexes for better performance
+CREATE INDEX IF NOT EXISTS idx_documents_document_id 
+ON documents(document_id);
+
+CREATE INDEX IF NOT EXISTS idx_documents_minhash_bands 
+ON documents USING gin (minhash_bands);
+
+-- Near-duplicate chunks are stored once; each document keeps a reference
+CREATE TABLE IF NOT EXISTS chunk_refs (
+    id SERIAL PRIMARY KEY,
+    collection TEXT NOT NULL REFERENCES collections(name) ON DELETE CASCADE,
+    document_id INTEGER NOT NULL REFERENCES document_catalog(id) ON DELETE CASCADE,
+    chunk_id INTEGER NOT NULL,
+    canonical_id INTEGER NOT NULL,  -- documents.id of the stored copy
+    similarity REAL NOT NULL,
+    content_bytes INTEGER NOT NULL,
+    metadata JSONB NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
--- Create indexes for better performance
-CREATE INDEX IF NOT EXISTS idx_documents_filename 
-ON documents(filename);
+CREATE INDEX IF NOT EXISTS idx_chunk_refs_canonical 
+ON chunk_refs(collection, canonical_id);
+
+CREATE INDEX IF NOT EXISTS idx_chunk_refs_document_id 
+ON chunk_refs(document_id);
+
+-- Partition for the default collection; the backend creates the others
+CREATE TABLE IF NOT EXISTS documents_c_default PARTITION OF documents FOR VALUES IN ('default');
 
--- Create vector similarity index for fast similarity search
-CREATE INDEX IF NOT EXISTS idx_documents_embedding 
-ON documents USING ivfflat (embedding vector_cosine_ops)
-WITH (lists = 100);
+-- The partition's ivfflat index is built by the backend once it holds data,
+-- so its lists are trained on real embeddings rather than an empty table
 
 -- Create a function to get database info
 CREATE OR REPLACE FUNCTION get_database_info()
@@ -34,9 +91,11 @@ RETURNS TABLE(
 BEGIN
     RETURN QUERY
     SELECT 
-        COUNT(DISTINCT filename) as total_documents,
-        COUNT(*) as total_chunks,
-        pg_size_pretty(pg_database_size(current_database())) as database_size;
+        COUNT(*) as total_documents,
+        COALESCE(SUM(chunk_count), 0) as total_chunks,
+        pg_size_pretty(pg_database_size(current_database())) as database_size
+    FROM document_catalog
+    WHERE status = 'active';
 END;
 $$ LANGUAGE plpgsql;
 